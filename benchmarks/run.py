@@ -0,0 +1,266 @@
+"""
+Throughput benchmarks for flavorl.
+
+Measures env construction, reset and step throughput (scalar and vectorized),
+dataset load/sample throughput and directions preprocessing throughput on
+synthetic MealRec+-shaped data, for several dataset sizes. Every case runs in
+a fresh process so that its peak RSS can be reported.
+
+Usage:
+    python -m benchmarks.run --scales 1000,10000 --out results.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json --threshold 0.15
+    python -m benchmarks.run --out benchmarks/baseline.json  # store a new baseline
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks import synthetic
+
+DEFAULT_SCALES = (1_000, 10_000, 100_000, 1_000_000)
+
+
+def _lower_is_better(metric: str) -> bool:
+    # Durations (*_s) and memory (*_kb); throughputs are *_per_s
+    return metric.endswith(("_s", "_kb")) and not metric.endswith("_per_s")
+
+
+def _rate(n: int, fn) -> float:
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return n / (time.perf_counter() - start)
+
+
+def _peak_rss_kb() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def bench_dataset(user_csv: str, meal_csv: str, n_ops: int) -> dict:
+    from flavorl.dataclasses import UserDataset
+
+    start = time.perf_counter()
+    users = UserDataset(user_csv, cache=False)
+    load_csv = time.perf_counter() - start
+
+    UserDataset(user_csv)  # build the binary cache
+    start = time.perf_counter()
+    users = UserDataset(user_csv)
+    load_cached = time.perf_counter() - start
+
+    users.sample()
+    return {
+        "dataset_load_csv_s": load_csv,
+        "dataset_load_cached_s": load_cached,
+        "dataset_sample_per_s": _rate(n_ops, users.sample),
+        "dataset_sample_filtered_per_s": _rate(n_ops, lambda: users.sample(vegan=True)),
+        "peak_rss_kb": _peak_rss_kb(),
+    }
+
+
+def bench_env(user_csv: str, meal_csv: str, n_ops: int) -> dict:
+    from flavorl.dataclasses import MealDataset, UserDataset
+    from flavorl.envs import MealRec
+
+    # Warm the binary caches so construction time is not dominated by CSV parsing
+    UserDataset(user_csv), MealDataset(meal_csv)
+
+    # Datasets are loaded on the first reset, so it is part of construction
+    start = time.perf_counter()
+    env = MealRec(user_csv, meal_csv, obs_mode="flat")
+    env.reset(seed=0)
+    construct = time.perf_counter() - start
+
+    resets = _rate(n_ops, env.reset)
+
+    rng = np.random.default_rng(0)
+    actions = rng.integers(env.action_space.n, size=n_ops)
+
+    env.reset(seed=0)
+    start = time.perf_counter()
+    for a in actions:
+        _, _, terminated, truncated, _ = env.step(int(a))
+        if terminated or truncated:
+            env.reset()
+    steps = n_ops / (time.perf_counter() - start)
+
+    return {
+        "env_construct_s": construct,
+        "env_resets_per_s": resets,
+        "env_steps_per_s": steps,
+        "peak_rss_kb": _peak_rss_kb(),
+    }
+
+
+def bench_vec_env(user_csv: str, meal_csv: str, n_ops: int, num_envs: int = 64) -> dict:
+    from flavorl.envs import MealRecVec
+
+    start = time.perf_counter()
+    env = MealRecVec(num_envs, user_csv, meal_csv, obs_mode="flat")
+    construct = time.perf_counter() - start
+
+    env.reset(seed=0)
+    rng = np.random.default_rng(0)
+    n_batches = max(1, n_ops // num_envs)
+    actions = rng.integers(env.single_action_space.n, size=(n_batches, num_envs))
+
+    start = time.perf_counter()
+    for a in actions:
+        env.step(a)
+    steps = n_batches * num_envs / (time.perf_counter() - start)
+
+    return {
+        "vec_env_construct_s": construct,
+        "vec_env_steps_per_s": steps,
+        "peak_rss_kb": _peak_rss_kb(),
+    }
+
+
+def bench_preprocessing(n_rows: int) -> dict:
+    from flavorl.data.data_utils import _parse_directions, parse_directions_batch
+
+    raw = synthetic.cooking_directions(n_rows)
+
+    start = time.perf_counter()
+    parse_directions_batch(raw)
+    batch = n_rows / (time.perf_counter() - start)
+
+    sample = raw.head(min(n_rows, 20_000)).to_list()
+    start = time.perf_counter()
+    for x in sample:
+        _parse_directions(x)
+    rowwise = len(sample) / (time.perf_counter() - start)
+
+    return {
+        "preprocess_batch_rows_per_s": batch,
+        "preprocess_rowwise_rows_per_s": rowwise,
+        "peak_rss_kb": _peak_rss_kb(),
+    }
+
+
+CASES = {
+    "dataset": bench_dataset,
+    "env": bench_env,
+    "vec_env": bench_vec_env,
+    "preprocessing": bench_preprocessing,
+}
+
+
+def _run_case(job: tuple) -> dict:
+    name, case_args = job
+    return CASES[name](*case_args)
+
+
+def run(scales: list[int], n_ops: int, workdir: Path) -> dict:
+    """
+    Runs every benchmark case at every scale, each in a fresh process.
+
+    Args:
+        scales (list[int]): Number of users and meals per scale.
+        n_ops (int): Operations per throughput measurement.
+        workdir (Path): Directory for the synthetic data.
+
+    Returns:
+        dict: {"<scale>": {"<case>": {metric: value}}} plus run metadata.
+    """
+    ctx = mp.get_context("spawn")
+    results = {
+        "meta": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "n_ops": n_ops,
+        }
+    }
+
+    for scale in scales:
+        user_csv = str(workdir / f"users_{scale}.csv")
+        meal_csv = str(workdir / f"meals_{scale}.csv")
+        synthetic.write_users(user_csv, scale)
+        synthetic.write_meals(meal_csv, scale)
+
+        jobs = [(name, (user_csv, meal_csv, n_ops)) for name in ("dataset", "env", "vec_env")]
+        jobs.append(("preprocessing", (scale,)))
+
+        results[str(scale)] = {}
+        for job in jobs:
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                metrics = pool.submit(_run_case, job).result()
+            results[str(scale)][job[0]] = metrics
+            print(f"[{scale:>9}] {job[0]:<14} " + "  ".join(f"{k}={v:.4g}" for k, v in metrics.items()))
+
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    Lists the metrics that regressed by more than `threshold` against the baseline.
+
+    Args:
+        results (dict): Current results.
+        baseline (dict): Baseline results.
+        threshold (float): Allowed relative regression (e.g. 0.1 = 10%).
+
+    Returns:
+        list[str]: Human-readable regressions (empty if none).
+    """
+    regressions = []
+    for scale, cases in results.items():
+        if scale == "meta" or scale not in baseline:
+            continue
+        for case, metrics in cases.items():
+            for metric, value in metrics.items():
+                base = baseline[scale].get(case, {}).get(metric)
+                if not base:
+                    continue
+                if _lower_is_better(metric):
+                    change = value / base - 1.0
+                else:
+                    change = base / value - 1.0
+                if change > threshold:
+                    regressions.append(
+                        f"{scale}/{case}/{metric}: {value:.4g} vs baseline {base:.4g} ({change:+.1%} worse)"
+                    )
+    return regressions
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default=",".join(map(str, DEFAULT_SCALES)), help="comma-separated dataset sizes")
+    parser.add_argument("--n-ops", type=int, default=5_000, help="operations per throughput measurement")
+    parser.add_argument("--out", default="bench_results.json", help="JSON results file")
+    parser.add_argument("--baseline", default=None, help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed relative regression")
+    args = parser.parse_args(argv)
+
+    scales = [int(s) for s in args.scales.split(",")]
+    with tempfile.TemporaryDirectory(prefix="flavorl-bench-") as tmp:
+        results = run(scales, args.n_ops, Path(tmp))
+
+    Path(args.out).write_text(json.dumps(results, indent=2))
+    print(f"Results written to {args.out}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) above {args.threshold:.0%}:")
+            for r in regressions:
+                print(f"  - {r}")
+            return 1
+        print(f"No regressions above {args.threshold:.0%}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
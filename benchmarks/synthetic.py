@@ -0,0 +1,87 @@
+import numpy as np
+import polars as pl
+
+from flavorl.dataclasses import NUTRIENTS
+
+ALLERGIES = ("nuts", "gluten", "shellfish", "egg")
+INTOLERANCES = ("lactose", "fructose")
+
+_DIRECTIONS = (
+    "Prep\n{p} m\nCook\n{c} m\nReady In\n{r} m\nPreheat oven to 350 degrees F.\nMix and bake.",
+    "Prep\n{p} m\nReady In\n{r} m\nCook the pasta in salted water.\nServe warm.",
+    "Combine all ingredients in a bowl and serve.",
+)
+
+
+def _json_flags(rng: np.random.Generator, n: int, keys: tuple, p: float) -> pl.Expr:
+    parts = []
+    for i, k in enumerate(keys):
+        flags = pl.Series(rng.random(n) < p)
+        parts += [pl.lit(f'{", " if i else ""}"{k}": '), pl.when(flags).then(pl.lit("true")).otherwise(pl.lit("false"))]
+    return pl.concat_str([pl.lit("{"), *parts, pl.lit("}")])
+
+
+def _json_values(values: dict[str, np.ndarray]) -> pl.Expr:
+    parts = []
+    for i, (k, v) in enumerate(values.items()):
+        parts += [pl.lit(f'{", " if i else ""}"{k}": '), pl.lit(pl.Series(v.round(1))).cast(pl.String)]
+    return pl.concat_str([pl.lit("{"), *parts, pl.lit("}")])
+
+
+def write_users(path: str, n: int, seed: int = 0) -> None:
+    """
+    Writes a MealRec+-shaped user CSV with `n` synthetic users.
+    """
+    rng = np.random.default_rng(seed)
+    vegan = rng.random(n) < 0.05
+    df = pl.DataFrame({"user_idx": np.arange(n)}).with_columns(
+        allergies=_json_flags(rng, n, ALLERGIES, 0.05),
+        intoler=_json_flags(rng, n, INTOLERANCES, 0.05),
+        vegan=pl.Series(vegan),
+        vegetarian=pl.Series(vegan | (rng.random(n) < 0.1)),
+        preferences=pl.lit("likes pasta, spicy food and fresh vegetables"),
+        daily_cal=pl.Series(rng.uniform(1500, 3000, n).round(1)),
+        daily_nutr=_json_values(
+            dict(zip(NUTRIENTS, (rng.uniform(50, 150, n), rng.uniform(200, 350, n), rng.uniform(20, 40, n))))
+        ),
+    )
+    df.write_csv(path)
+
+
+def write_meals(path: str, n: int, seed: int = 0) -> None:
+    """
+    Writes a MealRec+-shaped meal CSV with `n` synthetic meals.
+    """
+    rng = np.random.default_rng(seed + 1)
+    vegan = rng.random(n) < 0.2
+    df = pl.DataFrame({"meal_idx": np.arange(n)}).with_columns(
+        meal_type=pl.Series(rng.integers(0, 3, n)),
+        calories=pl.Series(rng.uniform(200, 900, n).round(1)),
+        nutrients=_json_values(
+            dict(zip(NUTRIENTS, (rng.uniform(5, 50, n), rng.uniform(20, 120, n), rng.uniform(1, 15, n))))
+        ),
+        ingredients=pl.lit("flour^eggs^milk^butter^sugar^salt"),
+        tags=pl.lit("quick^easy^baked"),
+        healthy_score=pl.Series(rng.uniform(0, 10, n).round(2)),
+        vegan=pl.Series(vegan),
+        vegetarian=pl.Series(vegan | (rng.random(n) < 0.3)),
+        allergens=_json_flags(rng, n, ALLERGIES, 0.1),
+        intoler=_json_flags(rng, n, INTOLERANCES, 0.1),
+    )
+    df.write_csv(path)
+
+
+def cooking_directions(n: int, seed: int = 0) -> pl.Series:
+    """
+    Returns `n` synthetic raw 'cooking_directions' values ("{'directions': u'...'}").
+    """
+    rng = np.random.default_rng(seed + 2)
+    kinds = rng.choice(len(_DIRECTIONS), size=n, p=(0.8, 0.15, 0.05))
+    times = rng.integers(5, 90, (n, 2))
+    return pl.Series(
+        "cooking_directions",
+        [
+            repr({"directions": _DIRECTIONS[k].format(p=p, c=c, r=p + c)})
+            for k, (p, c) in zip(kinds, times)
+        ],
+    )
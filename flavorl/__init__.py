@@ -3,4 +3,5 @@ from gymnasium.envs.registration import register
 register(
     id="flavorl/MealRec-v0",
     entry_point="flavorl.envs:MealRec",
+    vector_entry_point="flavorl.envs:MealRecVec",
 )
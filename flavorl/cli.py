@@ -0,0 +1,108 @@
+"""
+Command line interface for training and evaluating agents on MealRec.
+
+Usage:
+    flavorl train --user-csv users.csv --meal-csv meals.csv --n-procs 8 --envs-per-proc 4
+    flavorl eval runs/ppo/model.zip --user-csv users.csv --meal-csv meals.csv --episodes 1000
+"""
+
+import argparse
+import json
+import os
+import time
+
+
+def _add_env_args(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--user-csv", required=True, help="users CSV file")
+    parser.add_argument("--meal-csv", required=True, help="meals CSV file")
+    parser.add_argument(
+        "--meal-aggregates", default=None, help="meal aggregates directory (meal_aggregates build stage)"
+    )
+    parser.add_argument("--obs-mode", default="flat", choices=("flat", "dict"))
+    parser.add_argument("--slate-size", type=int, default=None, help="candidate slate size")
+    parser.add_argument("--schedule", default="uniform", choices=("uniform", "stratified"))
+    parser.add_argument("--algo", default="ppo", choices=("ppo", "a2c", "dqn"))
+    parser.add_argument("--n-procs", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--envs-per-proc", type=int, default=1, help="envs stepped by each worker")
+    parser.add_argument("--start-method", default="spawn", choices=("spawn", "forkserver"))
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def _env_kwargs(args: argparse.Namespace) -> dict:
+    return {
+        "user_csv": args.user_csv,
+        "meal_csv": args.meal_csv,
+        "meal_aggregates": args.meal_aggregates,
+        "obs_mode": args.obs_mode,
+        "slate_size": args.slate_size,
+        "schedule": args.schedule,
+        "profile": getattr(args, "profile", False),
+    }
+
+
+def _train(args: argparse.Namespace) -> dict:
+    from flavorl.training import train
+
+    out = args.out or f"runs/{args.algo}-{time.strftime('%Y%m%d-%H%M%S')}"
+    summary = train(
+        _env_kwargs(args),
+        out,
+        algo=args.algo,
+        total_timesteps=args.timesteps,
+        n_procs=args.n_procs,
+        envs_per_proc=args.envs_per_proc,
+        start_method=args.start_method,
+        checkpoint_every=args.checkpoint_every,
+        seed=args.seed,
+        algo_kwargs=json.loads(args.algo_kwargs) if args.algo_kwargs else None,
+        verbose=0 if args.quiet else 1,
+    )
+    print(f"Run saved to {out}")
+    return summary
+
+
+def _eval(args: argparse.Namespace) -> dict:
+    from flavorl.training import evaluate
+
+    return evaluate(
+        args.model,
+        _env_kwargs(args),
+        algo=args.algo,
+        n_episodes=args.episodes,
+        n_procs=args.n_procs,
+        envs_per_proc=args.envs_per_proc,
+        start_method=args.start_method,
+        seed=args.seed,
+        deterministic=not args.stochastic,
+    )
+
+
+def main(argv: list[str] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="flavorl", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    train = commands.add_parser("train", help="train an SB3 agent across N processes")
+    _add_env_args(train)
+    train.add_argument("--timesteps", type=int, default=100_000, help="training timesteps")
+    train.add_argument("--out", default=None, help="run directory (default: runs/<algo>-<time>)")
+    train.add_argument("--checkpoint-every", type=int, default=50_000, help="timesteps (0: off)")
+    train.add_argument("--algo-kwargs", default=None, help='algorithm arguments as JSON, e.g. \'{"n_steps": 256}\'')
+    train.add_argument("--profile", action="store_true", help="also report env phase times")
+    train.add_argument("--quiet", action="store_true", help="do not print per-iteration metrics")
+    train.set_defaults(run=_train)
+
+    evaluate = commands.add_parser("eval", help="evaluate a saved SB3 agent across N processes")
+    evaluate.add_argument("model", help="saved model (.zip)")
+    _add_env_args(evaluate)
+    evaluate.add_argument("--episodes", type=int, default=100)
+    evaluate.add_argument("--stochastic", action="store_true", help="sample actions")
+    evaluate.set_defaults(run=_eval)
+
+    args = parser.parse_args(argv)
+    print(json.dumps(args.run(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
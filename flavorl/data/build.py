@@ -0,0 +1,450 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Sequence
+
+from flavorl.data.preprocess_data import (
+    CLEAN_PATH,
+    COURSE2INDEX,
+    COURSE_CSV,
+    COURSE_FSA,
+    COURSE_WHO,
+    DATA_DIR,
+    MEAL_COURSE,
+    MEAL_FSA,
+    MEAL_WHO,
+    OUT_PATH,
+    USER_COURSE_TXT,
+    USER_MEAL,
+    USER_MEAL_TEST,
+    USER_MEAL_TRAIN,
+    USER_MEAL_TUNE,
+)
+
+# Directory holding the build state (manifests and hash cache)
+STATE_DIR = ".flavorl-build"
+
+# Meal-type classification outputs (the result cache is per classifier)
+CLASSIFICATION_CSV = Path("course_classification.csv")
+CLASSIFICATION_STORE = "course_classification.{classifier}.jsonl"
+
+# Default Hugging Face model; "keyword" (no model) is meant for CPU testing
+DEFAULT_CLASSIFIER = "Qwen/Qwen2.5-7B-Instruct"
+
+_CHUNK = 1 << 20
+
+
+@dataclass
+class Stage:
+    """
+    One step of the build graph.
+
+    A stage is rebuilt only when the content hash of one of its inputs, its
+    parameters or its version changed since its last successful run (or an
+    output is missing). Inputs produced by other stages make it depend on
+    them; since those are compared by content too, a rebuilt upstream
+    artifact that did not change does not trigger downstream stages.
+
+    Attributes:
+        name (str): Unique stage name.
+        run (Callable[[], Any]): Builds the outputs.
+        inputs (list[Path]): Files or directories read by the stage.
+        outputs (list[Path]): Files or directories written by the stage.
+        params (dict): Parameters that change the outputs (JSON-serializable).
+        version (int): Bumped when the stage's code changes its outputs.
+    """
+
+    name: str
+    run: Callable[[], Any]
+    inputs: list[Path]
+    outputs: list[Path]
+    params: dict = field(default_factory=dict)
+    version: int = 1
+
+
+class FileHasher:
+    """
+    Content hashes of files and directories, cached by (size, mtime).
+
+    Unchanged files are not read again; the cache is persisted in the
+    build state directory.
+    """
+
+    def __init__(self, cache_path: Path) -> None:
+        self.cache_path = Path(cache_path)
+        self._lock = threading.Lock()
+        try:
+            self._cache: dict[str, dict] = json.loads(self.cache_path.read_text())
+        except (OSError, ValueError):
+            self._cache = {}
+
+    def file(self, path: Path) -> str:
+        """
+        Returns the BLAKE2 digest of a file.
+        """
+        key = str(Path(path).resolve())
+        stat = os.stat(path)
+        with self._lock:
+            hit = self._cache.get(key)
+        if hit and hit["size"] == stat.st_size and hit["mtime_ns"] == stat.st_mtime_ns:
+            return hit["digest"]
+
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            while chunk := f.read(_CHUNK):
+                h.update(chunk)
+        digest = h.hexdigest()
+        with self._lock:
+            self._cache[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "digest": digest}
+        return digest
+
+    def path(self, path: Path) -> str | None:
+        """
+        Returns the digest of a file, or of every file in a directory (by
+        relative path), or None if it does not exist.
+        """
+        path = Path(path)
+        if path.is_file():
+            return self.file(path)
+        if not path.is_dir():
+            return None
+        h = hashlib.blake2b(digest_size=16)
+        for p in sorted(q for q in path.rglob("*") if q.is_file()):
+            h.update(str(p.relative_to(path)).encode("utf-8") + b"\x00")
+            h.update(self.file(p).encode("ascii"))
+        return h.hexdigest()
+
+    def save(self) -> None:
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            data = json.dumps(self._cache)
+        tmp = self.cache_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(data)
+        os.replace(tmp, self.cache_path)
+
+
+class BuildGraph:
+    """
+    Incremental build of a set of stages.
+
+    Dependencies are inferred from paths: a stage depends on the stages that
+    write any of its inputs. Out-of-date stages whose dependencies are done
+    run concurrently in a thread pool (the heavy work is polars/NumPy, which
+    release the GIL). The key of every successful run is recorded in
+    `<state_dir>/<stage>.json`.
+    """
+
+    def __init__(self, stages: Sequence[Stage], state_dir: str | Path = STATE_DIR) -> None:
+        """
+        Args:
+            stages (Sequence[Stage]): Stages of the graph.
+            state_dir (str | Path): Directory for the manifests and hash cache.
+
+        Raises:
+            ValueError: If stage names or outputs are duplicated, or the graph has a cycle.
+        """
+        self.stages: dict[str, Stage] = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Duplicated stage: {stage.name}")
+            self.stages[stage.name] = stage
+        self.state_dir = Path(state_dir)
+        self.hasher = FileHasher(self.state_dir / "hashes.json")
+
+        producers: dict[Path, str] = {}
+        for stage in stages:
+            for out in stage.outputs:
+                out = Path(out).resolve()
+                if out in producers:
+                    raise ValueError(f"{out} is written by {producers[out]} and {stage.name}")
+                producers[out] = stage.name
+
+        self.deps: dict[str, set[str]] = {
+            s.name: {producers[p] for p in map(lambda p: Path(p).resolve(), s.inputs) if p in producers}
+            for s in stages
+        }
+        self.order: list[str] = self._toposort()
+
+    def _toposort(self) -> list[str]:
+        order, state = [], {}
+
+        def visit(name: str, path: tuple) -> None:
+            if state.get(name) == "done":
+                return
+            if state.get(name) == "visiting":
+                raise ValueError(f"Cycle in build graph: {' -> '.join(path + (name,))}")
+            state[name] = "visiting"
+            for dep in sorted(self.deps[name]):
+                visit(dep, path + (name,))
+            state[name] = "done"
+            order.append(name)
+
+        for name in self.stages:
+            visit(name, ())
+        return order
+
+    def _closure(self, targets: Sequence[str]) -> list[str]:
+        """
+        Returns the targets and everything they depend on, in build order.
+        """
+        needed, stack = set(), list(targets)
+        while stack:
+            name = stack.pop()
+            if name not in self.stages:
+                raise KeyError(f"Unknown stage: {name}")
+            if name not in needed:
+                needed.add(name)
+                stack.extend(self.deps[name])
+        return [n for n in self.order if n in needed]
+
+    def key(self, name: str) -> dict:
+        """
+        Returns the current key of a stage: version, parameters and the
+        content hash of each input.
+
+        Raises:
+            FileNotFoundError: If an input is missing.
+        """
+        stage = self.stages[name]
+        inputs = {}
+        for p in stage.inputs:
+            digest = self.hasher.path(p)
+            if digest is None:
+                raise FileNotFoundError(f"Missing input of stage {name}: {p}")
+            inputs[str(p)] = digest
+        return {"version": stage.version, "params": stage.params, "inputs": inputs}
+
+    def _manifest(self, name: str) -> Path:
+        return self.state_dir / f"{name}.json"
+
+    def is_fresh(self, name: str) -> bool:
+        """
+        Whether a stage's outputs exist and were built from its current key.
+        """
+        stage = self.stages[name]
+        if not all(Path(p).exists() for p in stage.outputs):
+            return False
+        try:
+            recorded = json.loads(self._manifest(name).read_text())
+        except (OSError, ValueError):
+            return False
+        return recorded.get("key") == json.loads(json.dumps(self.key(name)))
+
+    def _run(self, name: str, force: bool) -> str:
+        if not force and self.is_fresh(name):
+            return "cached"
+
+        start = time.perf_counter()
+        self.stages[name].run()
+        elapsed = time.perf_counter() - start
+
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        manifest = {
+            "key": self.key(name),
+            "outputs": {str(p): self.hasher.path(p) for p in self.stages[name].outputs},
+            "seconds": elapsed,
+        }
+        self._manifest(name).write_text(json.dumps(manifest, indent=2))
+        return "built"
+
+    def build(
+        self, targets: Sequence[str] = None, max_workers: int = None, force: bool = False
+    ) -> dict[str, str]:
+        """
+        Brings the targets (default: every stage) up to date.
+
+        Args:
+            targets (Sequence[str], optional): Stage names. Their dependencies
+                are built too. Defaults to all stages.
+            max_workers (int, optional): Stages run at the same time.
+                Defaults to the number of independent stages.
+            force (bool): Rebuild even if up to date. Defaults to False.
+
+        Returns:
+            dict[str, str]: "built" or "cached" for each stage, in build order.
+
+        Raises:
+            Exception: The first stage error; stages already running finish,
+                and no new stage is started.
+        """
+        names = self._closure(targets or list(self.stages))
+        status: dict[str, str] = {}
+        pending = list(names)
+        running: dict[Future, str] = {}
+        error: BaseException = None
+
+        with ThreadPoolExecutor(max_workers=max_workers or max(len(names), 1)) as pool:
+            try:
+                while pending or running:
+                    if error is None:
+                        for name in [n for n in pending if self.deps[n].issubset(status)]:
+                            pending.remove(name)
+                            running[pool.submit(self._run, name, force)] = name
+                    if not running:
+                        break
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name = running.pop(future)
+                        try:
+                            status[name] = future.result()
+                        except BaseException as e:
+                            error = error or e
+            finally:
+                self.hasher.save()
+
+        if error is not None:
+            raise error
+        return {n: status[n] for n in names if n in status}
+
+
+def mealrec_stages(
+    data_dir: str | Path = DATA_DIR,
+    out_dir: str | Path = ".",
+    missing: str = "nan",
+    classifier: str = DEFAULT_CLASSIFIER,
+    device: str = "cuda:0",
+) -> list[Stage]:
+    """
+    Returns the stages building the MealRec+H artifacts.
+
+    - clean_courses: course.csv + course2index.txt -> course_clean.parquet
+    - courses: cleaned courses + FSA/WHO course scores -> course_processed.parquet
+    - meal_aggregates: processed courses + meal_course.txt + meal FSA/WHO -> meal_aggregates/
+    - meal_types: processed courses -> course_classification.csv
+    - interactions: relation .txt files -> interactions/
+
+    Args:
+        data_dir (str | Path): MealRec+H root directory.
+        out_dir (str | Path): Root directory of the outputs.
+        missing (str): Missing nutrient policy of the meal aggregates.
+        classifier (str): Hugging Face model name for the meal-type
+            classification, or "keyword" (KeywordBackend, no model; for CPU
+            testing). Defaults to DEFAULT_CLASSIFIER.
+        device (str): Device of the Hugging Face model.
+
+    Returns:
+        list[Stage]: Build stages.
+    """
+    from flavorl.data import interactions, meals, preprocess_data
+
+    data_dir, out_dir = Path(data_dir), Path(out_dir)
+    clean_path = out_dir / CLEAN_PATH
+    courses_path = out_dir / OUT_PATH
+    aggregates_dir = out_dir / meals.OUT_DIR
+    interactions_dir = out_dir / interactions.OUT_DIR
+    classification_csv = out_dir / CLASSIFICATION_CSV
+
+    def classify() -> None:
+        import polars as pl
+
+        from flavorl.data.classification import HFBackend, KeywordBackend, classify_courses
+
+        backend = KeywordBackend() if classifier == "keyword" else HFBackend(classifier, device=device)
+        courses = pl.read_parquet(courses_path).drop_nulls("course_id")
+        store_path = out_dir / CLASSIFICATION_STORE.format(classifier=classifier.replace("/", "--"))
+        classify_courses(courses, backend, store_path, verbose=False).write_csv(classification_csv)
+
+    meal_files = [
+        data_dir / p
+        for p in (USER_MEAL, USER_MEAL_TRAIN, USER_MEAL_TUNE, USER_MEAL_TEST)
+        if (data_dir / p).exists()
+    ]
+
+    return [
+        Stage(
+            "clean_courses",
+            lambda: preprocess_data.build_clean_courses(data_dir, clean_path),
+            inputs=[data_dir / COURSE_CSV, data_dir / COURSE2INDEX],
+            outputs=[clean_path],
+        ),
+        Stage(
+            "courses",
+            lambda: preprocess_data.build_course_table(data_dir, courses_path, clean_path),
+            inputs=[clean_path, data_dir / COURSE_FSA, data_dir / COURSE_WHO],
+            outputs=[courses_path],
+        ),
+        Stage(
+            "meal_aggregates",
+            lambda: meals.build_meal_aggregates(data_dir, courses_path, aggregates_dir, missing),
+            inputs=[courses_path, data_dir / MEAL_COURSE, data_dir / MEAL_FSA, data_dir / MEAL_WHO],
+            outputs=[aggregates_dir],
+            params={"missing": missing},
+        ),
+        Stage(
+            "meal_types",
+            classify,
+            inputs=[courses_path],
+            outputs=[classification_csv],
+            params={"classifier": classifier},
+        ),
+        Stage(
+            "interactions",
+            lambda: interactions.build_interaction_matrices(data_dir, interactions_dir),
+            inputs=[*meal_files, data_dir / USER_COURSE_TXT],
+            outputs=[interactions_dir],
+        ),
+    ]
+
+
+def build_mealrec(
+    data_dir: str | Path = DATA_DIR,
+    out_dir: str | Path = ".",
+    targets: Sequence[str] = None,
+    max_workers: int = None,
+    force: bool = False,
+    **stage_kwargs: Any,
+) -> dict[str, str]:
+    """
+    Brings the MealRec+H artifacts up to date (see mealrec_stages).
+
+    Args:
+        data_dir (str | Path): MealRec+H root directory.
+        out_dir (str | Path): Root directory of the outputs.
+        targets (Sequence[str], optional): Stages to build. Defaults to all.
+        max_workers (int, optional): Stages run at the same time.
+        force (bool): Rebuild even if up to date.
+        **stage_kwargs: Other mealrec_stages arguments (missing, classifier, device).
+
+    Returns:
+        dict[str, str]: "built" or "cached" for each stage.
+    """
+    stages = mealrec_stages(data_dir, out_dir, **stage_kwargs)
+    graph = BuildGraph(stages, Path(out_dir) / STATE_DIR)
+    return graph.build(targets, max_workers, force)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Incrementally build the MealRec+H artifacts.")
+    parser.add_argument("targets", nargs="*", help="stages to build (default: all)")
+    parser.add_argument("--data-dir", default=str(DATA_DIR))
+    parser.add_argument("--out-dir", default=".")
+    parser.add_argument("--missing", default="nan")
+    parser.add_argument(
+        "--classifier",
+        default=DEFAULT_CLASSIFIER,
+        help='Hugging Face model, or "keyword" to classify without a model (CPU testing)',
+    )
+    parser.add_argument("--device", default="cuda:0")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+
+    status = build_mealrec(
+        args.data_dir,
+        args.out_dir,
+        args.targets or None,
+        args.workers,
+        args.force,
+        missing=args.missing,
+        classifier=args.classifier,
+        device=args.device,
+    )
+    for name, state in status.items():
+        print(f"{name}: {state}")
@@ -0,0 +1,322 @@
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+from typing import Iterable, Protocol
+
+import polars as pl
+
+CATEGORIES = ("breakfast", "lunch", "dinner")
+
+SYSTEM_PROMPT = "You classify recipes by meal time and answer strictly in JSON."
+
+PROMPT_TEMPLATE = """
+Title: {title}
+Ingredients: {ingredients}
+Directions: {directions}
+
+Classify this recipe into one or more of the following categories:
+- Breakfast
+- Lunch
+- Dinner
+
+Respond **only** with JSON in the form:
+{{"categories": ["breakfast", "lunch"]}}
+If only one applies, return a single-item list. Use only these labels.
+"""
+
+
+def build_messages(title: str, ingredients: str, directions: str) -> list[dict]:
+    """
+    Builds the chat messages asking to classify a recipe by meal time.
+
+    Args:
+        title (str): Recipe title.
+        ingredients (str): Comma-separated ingredients.
+        directions (str): Cooking directions.
+
+    Returns:
+        list[dict]: System and user messages.
+    """
+    prompt = PROMPT_TEMPLATE.format(title=title, ingredients=ingredients, directions=directions)
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt.strip()},
+    ]
+
+
+def parse_categories(gen_text: str, allow_multi: bool = True) -> list[str]:
+    """
+    Extracts the categories from a generated answer.
+
+    Takes the last JSON block containing "categories" that parses, keeping
+    only the allowed labels.
+
+    Args:
+        gen_text (str): Generated text.
+        allow_multi (bool): Whether to keep more than one category.
+
+    Returns:
+        list[str]: Normalized categories (possibly empty).
+    """
+    json_candidates = re.findall(
+        r'\{[^{}]*"categories"[^{}]*\}', gen_text, flags=re.DOTALL | re.IGNORECASE
+    )
+    for cand in reversed(json_candidates):
+        try:
+            cats = json.loads(cand).get("categories", [])
+            cats_norm = [c.strip().lower() for c in cats]
+        except Exception:
+            continue
+        cats_norm = [c for c in cats_norm if c in CATEGORIES]
+        if not allow_multi and cats_norm:
+            cats_norm = [cats_norm[0]]  # keep top
+        return cats_norm
+    return []
+
+
+def content_key(title: str, ingredients: str, directions: str) -> str:
+    """
+    Returns the cache key of a recipe: a hash of its title, ingredients and directions.
+    """
+    h = hashlib.sha256()
+    for part in (title, ingredients, directions):
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class ClassifierBackend(Protocol):
+    """
+    Generates answers for a batch of chat conversations.
+    """
+
+    def generate(self, batch: list[list[dict]]) -> list[str]: ...
+
+
+class HFBackend:
+    """
+    Hugging Face causal LM backend with left-padded batch generation.
+
+    transformers and torch are imported on construction, so the runner can be
+    used with other backends without them.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "Qwen/Qwen2.5-7B-Instruct",
+        device: str = "cuda:0",
+        max_new_tokens: int = 96,
+    ) -> None:
+        """
+        Loads the tokenizer and model.
+
+        Args:
+            model_name (str): Model name or path.
+            device (str): Device to run on (e.g. "cuda:0", "cpu").
+            max_new_tokens (int): Maximum generated tokens per answer.
+        """
+        import torch
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+
+        self._torch = torch
+        self.max_new_tokens = max_new_tokens
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name, padding_side="left")
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+
+        dtype = torch.bfloat16 if device.startswith("cuda") else torch.float32
+        self.model = AutoModelForCausalLM.from_pretrained(
+            model_name, torch_dtype=dtype, device_map={"": device}
+        )
+        self.model.eval()
+
+    def generate(self, batch: list[list[dict]]) -> list[str]:
+        chats = [
+            self.tokenizer.apply_chat_template(m, tokenize=False, add_generation_prompt=True)
+            for m in batch
+        ]
+        inputs = self.tokenizer(chats, return_tensors="pt", padding=True).to(self.model.device)
+
+        with self._torch.no_grad():
+            outputs = self.model.generate(
+                **inputs,
+                max_new_tokens=self.max_new_tokens,
+                do_sample=False,  # deterministic
+                pad_token_id=self.tokenizer.pad_token_id,
+            )
+
+        # decode ONLY the newly generated tokens
+        gen_ids = outputs[:, inputs["input_ids"].shape[-1] :]
+        return [t.strip() for t in self.tokenizer.batch_decode(gen_ids, skip_special_tokens=True)]
+
+
+class KeywordBackend:
+    """
+    Rule-based stand-in for a model: answers from keywords in the prompt.
+
+    Useful to exercise the runner on CPU without downloading a model.
+    """
+
+    KEYWORDS = {
+        "breakfast": ("pancake", "waffle", "omelet", "egg", "muffin", "oat", "granola", "toast"),
+        "lunch": ("salad", "sandwich", "wrap", "soup", "burger"),
+        "dinner": ("roast", "steak", "casserole", "lasagna", "stew", "curry", "chicken", "pasta"),
+    }
+
+    def generate(self, batch: list[list[dict]]) -> list[str]:
+        answers = []
+        for messages in batch:
+            text = messages[-1]["content"].lower()
+            cats = [c for c, words in self.KEYWORDS.items() if any(w in text for w in words)]
+            answers.append(json.dumps({"categories": cats or ["lunch"]}))
+        return answers
+
+
+class ClassificationStore:
+    """
+    Append-only JSONL store of classification results keyed by content hash.
+
+    Each completed batch is appended and flushed to disk, so an interrupted
+    run resumes from the last completed batch. A truncated last line left by
+    a crash is cut off when the store is opened, so that later appends start
+    on a new line.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        """
+        Opens the store, loading the results already recorded.
+
+        Args:
+            path (str | Path): JSONL file.
+        """
+        self.path = Path(path)
+        self.results: dict[str, dict] = {}
+
+        if self.path.exists():
+            self._repair_tail()
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.results[rec["key"]] = rec
+
+    def _repair_tail(self) -> None:
+        """
+        Ends the file on a complete line: a last line without a newline is
+        completed if it is a whole record, and truncated otherwise.
+        """
+        with open(self.path, "rb+") as f:
+            size = f.seek(0, os.SEEK_END)
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+
+            # Start of the last line
+            start = size
+            while start > 0:
+                step = min(start, 1 << 16)
+                f.seek(start - step)
+                nl = f.read(step).rfind(b"\n")
+                if nl >= 0:
+                    start = start - step + nl + 1
+                    break
+                start -= step
+
+            f.seek(start)
+            try:
+                json.loads(f.read())
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                f.truncate(start)
+            else:
+                f.write(b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.results
+
+    def get(self, key: str) -> dict | None:
+        return self.results.get(key)
+
+    def append(self, records: Iterable[dict]) -> None:
+        """
+        Appends records (each with a "key") and syncs them to disk.
+        """
+        records = list(records)
+        with open(self.path, "a", encoding="utf-8") as f:
+            for rec in records:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        for rec in records:
+            self.results[rec["key"]] = rec
+
+
+def classify_courses(
+    courses: pl.DataFrame,
+    backend: ClassifierBackend,
+    store_path: str | Path,
+    batch_size: int = 16,
+    allow_multi: bool = True,
+    verbose: bool = True,
+) -> pl.DataFrame:
+    """
+    Classifies courses by meal time, in batches, skipping cached results.
+
+    Courses are grouped by prompt length to reduce padding. Results are
+    cached by content hash, so identical recipes are classified once and an
+    interrupted run resumes where it stopped.
+
+    Args:
+        courses (pl.DataFrame): Columns course_id, course_name, ingredients
+            ('^'-separated) and cooking_directions (cleaned text).
+        backend (ClassifierBackend): Model backend.
+        store_path (str | Path): Append-only JSONL results store.
+        batch_size (int): Recipes per generation batch.
+        allow_multi (bool): Whether to keep more than one category.
+        verbose (bool): Whether to print progress.
+
+    Returns:
+        pl.DataFrame: Columns course_id, raw_output and categories (list repr),
+            in the order of `courses`.
+    """
+    store = ClassificationStore(store_path)
+
+    items = []
+    for course_id, title, ingredients, directions in courses.select(
+        "course_id", "course_name", "ingredients", "cooking_directions"
+    ).iter_rows():
+        ingredients = (ingredients or "").replace("^", ", ")
+        items.append((course_id, content_key(title, ingredients, directions), title, ingredients, directions))
+
+    pending = {}
+    for _, key, title, ingredients, directions in items:
+        if key not in store and key not in pending:
+            pending[key] = build_messages(title, ingredients, directions)
+
+    # Similar prompt lengths in each batch -> less padding
+    order = sorted(pending, key=lambda k: len(pending[k][-1]["content"]))
+    for start in range(0, len(order), batch_size):
+        keys = order[start : start + batch_size]
+        answers = backend.generate([pending[k] for k in keys])
+        store.append({"key": k, "raw_output": a} for k, a in zip(keys, answers))
+        if verbose:
+            print(f"{min(start + batch_size, len(order))}/{len(order)} classified")
+
+    rows = []
+    for course_id, key, *_ in items:
+        raw_output = store.get(key)["raw_output"]
+        rows.append((course_id, raw_output, str(parse_categories(raw_output, allow_multi))))
+
+    return pl.DataFrame(
+        rows,
+        schema={"course_id": courses.schema["course_id"], "raw_output": pl.String, "categories": pl.String},
+        orient="row",
+    )
@@ -1,6 +1,8 @@
 import re
-import pandas as pd
 import ast
+import os
+import polars as pl
+from concurrent.futures import ProcessPoolExecutor
 
 # --- parser de duraciones -> minutos
 _TIME_PAT = re.compile(
@@ -104,8 +106,8 @@ def extract_times_and_clean(text: str):
     return (prep_min, cook_min, ready_min, cleaned)
 
 
-def _clean_and_unpack(x):
-    # 1) Parsear a dict si viene como string "{'directions': u'...'}"
+def _directions_dict(x) -> dict:
+    # Parsear a dict si viene como string "{'directions': u'...'}"
     d = x
     if isinstance(x, str):
         try:
@@ -114,6 +116,21 @@ def _clean_and_unpack(x):
             d = {"directions": x}
     if not isinstance(d, dict):
         d = {"directions": str(x)}
+    return d
+
+
+def _parse_directions(x):
+    """
+    Igual que _clean_and_unpack, pero devuelve (prep_min, cook_min, ready_min, cleaned_text).
+    """
+    return extract_times_and_clean(_directions_dict(x).get("directions"))
+
+
+def _clean_and_unpack(x):
+    import pandas as pd
+
+    # 1) Parsear a dict si viene como string "{'directions': u'...'}"
+    d = _directions_dict(x)
     # 2) Aplicar tu función al texto
     prep, cook, ready, cleaned = extract_times_and_clean(d.get("directions"))
     # 3) Mantener el mismo formato (dict) pero con 'directions' limpio
@@ -130,6 +147,164 @@ def _clean_and_unpack(x):
     )
 
 
+# --- versión vectorizada (por lotes) ---
+#
+# Ruta rápida: cabecera canónica "Prep\n<v>\nCook\n<v>\nReady In\n<v>\n..." con valores
+# que empiezan por un dígito y solo contienen [0-9A-Za-z ,.]. Para esas filas el resultado
+# de extract_times_and_clean es exactamente: valores = líneas completas y texto limpio =
+# resto tras la cabecera, sin " \n\r\t:.-" iniciales. El resto de filas se procesa con
+# la función original (en un pool de procesos si son muchas).
+_FAST_VAL = r"([0-9][0-9A-Za-z ,.]*)"
+_FAST_HDR = rf"^(Prep\n{_FAST_VAL}\nCook\n{_FAST_VAL}\nReady In\n{_FAST_VAL})(?:[\n\r]|$)"
+
+# "{'directions': u'...'}" sin más escapes que \n y \' (literal_eval trivial)
+_FAST_LITERAL = r"^\{'directions': u?'((?:[^\\'\n\r\x00]|\\[n'])*)'\}$"
+
+# Algún carácter que no es espacio para str.strip() de Python (\s de polars no incluye \x1c-\x1f)
+_NON_SPACE = r"[^\s\x1c-\x1f]"
+
+_BATCH_SCHEMA = {
+    "prep_min": pl.Int64,
+    "cook_min": pl.Int64,
+    "ready_min": pl.Int64,
+    "cleaned": pl.String,
+}
+
+
+def _run_fallback(fn, items: list, n_workers: int | None, min_pool_rows: int) -> list:
+    if n_workers == 1 or len(items) < min_pool_rows:
+        return [fn(x) for x in items]
+    n_workers = n_workers or os.cpu_count()
+    chunksize = max(1, len(items) // (4 * n_workers))
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        return list(pool.map(fn, items, chunksize=chunksize))
+
+
+def _extract_batch(
+    texts: pl.Series, fallback_inputs: pl.Series, fallback_fn, n_workers, min_pool_rows
+) -> pl.DataFrame:
+    df = pl.DataFrame({"text": texts.cast(pl.String)}).with_columns(
+        hdr=pl.col("text").str.extract_groups(_FAST_HDR)
+    )
+    df = df.with_columns(
+        cleaned=pl.col("text")
+        .str.slice(pl.col("hdr").struct.field("1").str.len_chars())
+        .str.strip_chars_start(" \n\r\t:.-"),
+        prep_val=pl.col("hdr").struct.field("2").str.strip_chars(" "),
+        cook_val=pl.col("hdr").struct.field("3").str.strip_chars(" "),
+        ready_val=pl.col("hdr").struct.field("4").str.strip_chars(" "),
+    )
+    # Si el texto limpio queda vacío la función original devuelve el texto completo
+    fast = (
+        pl.col("hdr").struct.field("1").is_not_null() & pl.col("cleaned").str.contains(_NON_SPACE)
+    ).fill_null(False)
+    df = df.with_columns(fast=fast)
+
+    # Los valores de tiempo tienen muy pocos distintos: _to_minutes una vez por valor
+    values = pl.concat([df["prep_val"], df["cook_val"], df["ready_val"]]).drop_nulls().unique()
+    minutes = {v: _to_minutes(v) for v in values}
+
+    out = df.select(
+        *(
+            pl.col(f"{name}_val")
+            .replace_strict(minutes, default=None, return_dtype=pl.Int64)
+            .alias(f"{name}_min")
+            for name in ("prep", "cook", "ready")
+        ),
+        pl.col("cleaned"),
+    )
+
+    slow_idx = df.with_row_index().filter(~pl.col("fast"))["index"]
+    if len(slow_idx) == 0:
+        return out
+
+    slow = _run_fallback(
+        fallback_fn, fallback_inputs.gather(slow_idx).to_list(), n_workers, min_pool_rows
+    )
+    slow_df = pl.DataFrame(slow, schema=_BATCH_SCHEMA, orient="row")
+    return out.with_row_index().update(
+        slow_df.with_columns(index=slow_idx), on="index", include_nulls=True
+    ).drop("index")
+
+
+def extract_times_and_clean_batch(
+    texts: pl.Series, n_workers: int | None = None, min_pool_rows: int = 10_000
+) -> pl.DataFrame:
+    """
+    Versión por lotes de extract_times_and_clean.
+
+    Entrada: columna de textos de 'directions'.
+    Salida: DataFrame con columnas prep_min, cook_min, ready_min y cleaned, idéntico
+    a aplicar extract_times_and_clean fila a fila.
+
+    Args:
+        texts (pl.Series): Textos de 'directions'.
+        n_workers (int, optional): Procesos para las filas fuera de la ruta rápida
+            (None = todos los núcleos, 1 = sin pool).
+        min_pool_rows (int): Mínimo de filas lentas para usar el pool de procesos.
+    """
+    return _extract_batch(texts, texts, extract_times_and_clean, n_workers, min_pool_rows)
+
+
+def parse_directions_batch(
+    raw: pl.Series, n_workers: int | None = None, min_pool_rows: int = 10_000
+) -> pl.DataFrame:
+    """
+    Versión por lotes de _clean_and_unpack para la columna 'cooking_directions'.
+
+    Desempaqueta los literales "{'directions': u'...'}" con expresiones vectorizadas
+    y aplica extract_times_and_clean_batch. Salida igual que extract_times_and_clean_batch.
+
+    Args:
+        raw (pl.Series): Valores originales de 'cooking_directions'.
+        n_workers (int, optional): Procesos para las filas fuera de la ruta rápida.
+        min_pool_rows (int): Mínimo de filas lentas para usar el pool de procesos.
+    """
+    raw = raw.cast(pl.String)
+    texts = (
+        raw.str.extract(_FAST_LITERAL, 1)
+        .str.replace_all("\\'", "'", literal=True)
+        .str.replace_all("\\n", "\n", literal=True)
+    )
+    return _extract_batch(texts, raw, _parse_directions, n_workers, min_pool_rows)
+
+
+# --- nutrientes de 'nutritions' (dict de Allrecipes: {u'protein': {... u'amount': 4.2 ...}, ...})
+# columna de salida -> clave en el dict; mismo orden que (calories, *NUTRIENTS)
+NUTRITION_KEYS = {
+    "calories": "calories",
+    "prot": "protein",
+    "ch": "carbohydrates",
+    "fib": "fiber",
+}
+_NUM = r"(-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)"
+
+
+def parse_nutritions_batch(raw: pl.Series) -> pl.DataFrame:
+    """
+    Extrae calorías y nutrientes de la columna 'nutritions' con expresiones vectorizadas.
+
+    Cada valor es el repr de un dict de dicts con un campo 'amount'. Las claves
+    que falten o no tengan 'amount' numérico quedan a null (no a 0), para que
+    el agregado por comida decida cómo tratarlas.
+
+    Args:
+        raw (pl.Series): Valores originales de 'nutritions'.
+
+    Returns:
+        pl.DataFrame: Columnas de NUTRITION_KEYS (Float64, null si falta).
+    """
+    raw = raw.cast(pl.String)
+    return pl.DataFrame(
+        {
+            col: raw.str.extract(
+                rf"""["']{key}["']:\s*\{{[^{{}}]*?["']amount["']:\s*{_NUM}""", 1
+            ).cast(pl.Float64)
+            for col, key in NUTRITION_KEYS.items()
+        }
+    )
+
+
 # sample = u'Prep\n20 m\nCook\n1 h\nReady In\n1 h 40 m\nGrease and flour two 8 x 4 inch pans. Preheat oven to 325 degrees F (165 degrees C).\nSift flour, salt, baking powder, soda, and cinnamon together in a bowl.\nBeat eggs, oil, vanilla, and sugar together in a large bowl. Add sifted ingredients to the creamed mixture, and beat well. Stir in zucchini and nuts until well combined. Pour batter into prepared pans.\nBake for 40 to 60 minutes, or until tester inserted in the center comes out clean. Cool in pan on rack for 20 minutes. Remove bread from pan, and completely cool.'
 # prep, cook, ready, cleaned = extract_times_and_clean(sample)
 # print(prep, cook, ready)     # 20, 60, 100
@@ -0,0 +1,313 @@
+import json
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+import polars as pl
+
+if TYPE_CHECKING:
+    from scipy import sparse
+
+from flavorl.data.preprocess_data import (
+    DATA_DIR,
+    USER_COURSE_TXT,
+    USER_MEAL,
+    USER_MEAL_TEST,
+    USER_MEAL_TRAIN,
+    USER_MEAL_TUNE,
+)
+
+# Directorio de salida de las matrices de interacción
+OUT_DIR = Path("interactions")
+
+_ARRAYS = ("indptr", "indices", "data")
+
+
+class InteractionMatrix:
+    """
+    Compressed sparse (CSR) user x item interaction counts.
+
+    Rows are user indices and columns item (meal or course) indices, as
+    numbered in the MealRec+ relation files; column indices are sorted within
+    each row. Saved matrices are plain .npy arrays, so `load` memory-maps them
+    and several processes share the same pages.
+    """
+
+    def __init__(
+        self,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        data: np.ndarray,
+        shape: tuple[int, int],
+        path: Path = None,
+    ) -> None:
+        """
+        Wraps CSR arrays. Use `from_pairs`, `from_txt` or `load` to build one.
+
+        Args:
+            indptr (np.ndarray): Row pointers, shape (n_users + 1,).
+            indices (np.ndarray): Item index of each interaction, sorted per row.
+            data (np.ndarray): Interaction count of each (user, item).
+            shape (tuple[int, int]): (n_users, n_items).
+            path (Path, optional): Directory the arrays were loaded from.
+        """
+        self.indptr: np.ndarray = indptr
+        self.indices: np.ndarray = indices
+        self.data: np.ndarray = data
+        self.shape: tuple[int, int] = (int(shape[0]), int(shape[1]))
+        self.path: Path = path
+
+        # Bisection steps needed to search the longest row
+        max_len = int(np.diff(indptr).max()) if len(indptr) > 1 else 0
+        self._n_steps: int = max_len.bit_length()
+
+    @classmethod
+    def from_pairs(
+        cls, users: np.ndarray, items: np.ndarray, shape: tuple[int, int] = None
+    ) -> "InteractionMatrix":
+        """
+        Builds the matrix from (user, item) pairs, counting repeated pairs.
+
+        Args:
+            users (np.ndarray): User index of each interaction.
+            items (np.ndarray): Item index of each interaction.
+            shape (tuple[int, int], optional): (n_users, n_items). Defaults to
+                the largest indices + 1.
+
+        Returns:
+            InteractionMatrix: Interaction counts.
+        """
+        users = np.asarray(users, dtype=np.int64)
+        items = np.asarray(items, dtype=np.int64)
+        if shape is None:
+            shape = (
+                int(users.max()) + 1 if len(users) else 0,
+                int(items.max()) + 1 if len(items) else 0,
+            )
+
+        keys, counts = np.unique(users * shape[1] + items, return_counts=True)
+        rows, indices = np.divmod(keys, shape[1]) if shape[1] else (keys, keys)
+        indptr = np.zeros(shape[0] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=shape[0]), out=indptr[1:])
+
+        return cls(indptr, indices.astype(np.int32), counts.astype(np.float32), shape)
+
+    @classmethod
+    def from_txt(
+        cls, path: str | Path, shape: tuple[int, int] = None, separator: str = "\t"
+    ) -> "InteractionMatrix":
+        """
+        Builds the matrix from a MealRec+ relation file ("user<TAB>item" per line).
+
+        Args:
+            path (str | Path): Relation file.
+            shape (tuple[int, int], optional): (n_users, n_items). Defaults to
+                the largest indices + 1.
+            separator (str): Column separator. Defaults to a tab.
+
+        Returns:
+            InteractionMatrix: Interaction counts.
+        """
+        pairs = (
+            pl.scan_csv(path, separator=separator, has_header=False)
+            .select(pl.nth(0).cast(pl.Int64).alias("user"), pl.nth(1).cast(pl.Int64).alias("item"))
+            .collect()
+        )
+        return cls.from_pairs(pairs["user"].to_numpy(), pairs["item"].to_numpy(), shape)
+
+    @classmethod
+    def load(cls, path: str | Path, mmap: bool = True) -> "InteractionMatrix":
+        """
+        Loads a matrix written by `save`.
+
+        Args:
+            path (str | Path): Matrix directory.
+            mmap (bool): Whether to memory-map the arrays (read-only) instead
+                of reading them. Defaults to True.
+
+        Returns:
+            InteractionMatrix: Loaded matrix.
+        """
+        path = Path(path)
+        meta = json.loads((path / "meta.json").read_text())
+        arrays = {
+            name: np.load(path / f"{name}.npy", mmap_mode="r" if mmap else None)
+            for name in _ARRAYS
+        }
+        return cls(shape=tuple(meta["shape"]), path=path, **arrays)
+
+    def save(self, path: str | Path) -> Path:
+        """
+        Writes the arrays as .npy files plus a meta.json with the shape.
+
+        Args:
+            path (str | Path): Output directory (created if needed).
+
+        Returns:
+            Path: Output directory.
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        for name in _ARRAYS:
+            np.save(path / f"{name}.npy", getattr(self, name))
+        (path / "meta.json").write_text(json.dumps({"shape": self.shape, "nnz": self.nnz}))
+        return path
+
+    @property
+    def nnz(self) -> int:
+        return len(self.indices)
+
+    def affinity(self, user_idx: int, item_idx: int) -> float:
+        """
+        Returns the interaction count of a (user, item) pair, 0 if none.
+
+        Binary search within the user's row, so the cost only depends on the
+        number of interactions of that user.
+        """
+        start, end = self.indptr[user_idx], self.indptr[user_idx + 1]
+        pos = start + np.searchsorted(self.indices[start:end], item_idx)
+        if pos < end and self.indices[pos] == item_idx:
+            return float(self.data[pos])
+        return 0.0
+
+    def affinities(self, users: np.ndarray, items: np.ndarray) -> np.ndarray:
+        """
+        Returns the interaction counts of a batch of (user, item) pairs.
+
+        All pairs are searched at once: a vectorized bisection over each
+        user's row, as many steps as the longest row needs.
+
+        Args:
+            users (np.ndarray): User indices, shape (B,).
+            items (np.ndarray): Item indices, shape (B,).
+
+        Returns:
+            np.ndarray: float32 counts (0 where there is no interaction), shape (B,).
+        """
+        users = np.asarray(users, dtype=np.int64)
+        items = np.asarray(items, dtype=np.int64)
+        out = np.zeros(len(users), dtype=np.float32)
+        if self.nnz == 0:
+            return out
+
+        lo = self.indptr[users].astype(np.int64)
+        end = self.indptr[users + 1].astype(np.int64)
+        hi = end.copy()
+        last = self.nnz - 1
+        for _ in range(self._n_steps):
+            mid = (lo + hi) // 2
+            right = (lo < hi) & (self.indices[np.minimum(mid, last)] < items)
+            left = (lo < hi) & ~right
+            lo = np.where(right, mid + 1, lo)
+            hi = np.where(left, mid, hi)
+
+        pos = np.minimum(lo, last)
+        found = (lo < end) & (self.indices[pos] == items)
+        out[found] = self.data[pos[found]]
+        return out
+
+    def row(self, user_idx: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the items and counts of a user (views of the CSR arrays).
+        """
+        start, end = self.indptr[user_idx], self.indptr[user_idx + 1]
+        return self.indices[start:end], self.data[start:end]
+
+    def rows(self, users: np.ndarray) -> "sparse.csr_matrix":
+        """
+        Returns the rows of a batch of users.
+
+        Args:
+            users (np.ndarray): User indices, shape (k,).
+
+        Returns:
+            sparse.csr_matrix: Interaction counts, shape (k, n_items).
+        """
+        from scipy import sparse
+
+        users = np.asarray(users, dtype=np.int64)
+        starts = self.indptr[users].astype(np.int64)
+        lens = self.indptr[users + 1] - starts
+        indptr = np.concatenate(([0], np.cumsum(lens)))
+        gather = np.arange(indptr[-1]) + np.repeat(starts - indptr[:-1], lens)
+        return sparse.csr_matrix(
+            (self.data[gather], self.indices[gather], indptr), shape=(len(users), self.shape[1])
+        )
+
+    def to_scipy(self) -> "sparse.csr_matrix":
+        """
+        Returns the whole matrix as a scipy CSR matrix over the same arrays.
+        """
+        from scipy import sparse
+
+        return sparse.csr_matrix((self.data, self.indices, self.indptr), shape=self.shape)
+
+    def __reduce__(self):
+        # Saved matrices are re-mapped from disk instead of pickling the arrays
+        if self.path is not None:
+            return (InteractionMatrix.load, (self.path,))
+        return (
+            InteractionMatrix,
+            (self.indptr, self.indices, self.data, self.shape),
+        )
+
+
+def _max_indices(paths: list[Path], separator: str = "\t") -> tuple[int, int]:
+    """
+    Largest (user, item) index over several relation files, -1 if there are none.
+    """
+    if not paths:
+        return -1, -1
+    frames = [
+        pl.scan_csv(p, separator=separator, has_header=False).select(
+            pl.nth(0).cast(pl.Int64).max().alias("user"), pl.nth(1).cast(pl.Int64).max().alias("item")
+        )
+        for p in paths
+    ]
+    maxima = pl.concat(frames).select(pl.all().max()).collect().row(0)
+    return tuple(-1 if m is None else int(m) for m in maxima)
+
+
+def build_interaction_matrices(
+    data_dir: str | Path = DATA_DIR, out_dir: str | Path = OUT_DIR
+) -> dict[str, Path]:
+    """
+    Builds and saves the user x meal and user x course interaction matrices.
+
+    The user x meal matrix uses the train split only, so that the tune/test
+    interactions stay unseen. Shapes span every split, so meal and user
+    indices are valid across them.
+
+    Args:
+        data_dir (str | Path): MealRec+H root directory.
+        out_dir (str | Path): Output directory.
+
+    Returns:
+        dict[str, Path]: Directory of each matrix ("user_meal", "user_course").
+    """
+    data_dir, out_dir = Path(data_dir), Path(out_dir)
+
+    meal_files = [
+        data_dir / p
+        for p in (USER_MEAL, USER_MEAL_TRAIN, USER_MEAL_TUNE, USER_MEAL_TEST)
+        if (data_dir / p).exists()
+    ]
+    course_file = data_dir / USER_COURSE_TXT
+
+    max_user_meal, max_meal = _max_indices(meal_files)
+    max_user_course, max_course = _max_indices([course_file])
+    n_users = max(max_user_meal, max_user_course) + 1
+
+    user_meal = InteractionMatrix.from_txt(data_dir / USER_MEAL_TRAIN, shape=(n_users, max_meal + 1))
+    user_course = InteractionMatrix.from_txt(course_file, shape=(n_users, max_course + 1))
+
+    return {
+        "user_meal": user_meal.save(out_dir / "user_meal"),
+        "user_course": user_course.save(out_dir / "user_course"),
+    }
+
+
+if __name__ == "__main__":
+    for name, path in build_interaction_matrices().items():
+        m = InteractionMatrix.load(path)
+        print(f"{name}: shape={m.shape} nnz={m.nnz} -> {path}")
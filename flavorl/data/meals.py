@@ -0,0 +1,193 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+
+from flavorl.data.data_utils import NUTRITION_KEYS
+from flavorl.data.interactions import InteractionMatrix
+from flavorl.data.preprocess_data import DATA_DIR, MEAL_COURSE, MEAL_FSA, MEAL_WHO, OUT_PATH
+from flavorl.dataclasses import MealDataset
+
+# Directorio de salida de los agregados por comida
+OUT_DIR = Path("meal_aggregates")
+
+# Tratamiento de los nutrientes que faltan en algún plato de la comida
+MISSING_POLICIES = (
+    "nan",  # el total de la comida queda a NaN
+    "zero",  # el plato cuenta como 0 para ese nutriente
+    "impute",  # el plato cuenta con la media de los platos que sí lo tienen
+)
+
+_ARRAYS = ("nutrients", "n_missing", "healthy_score")
+
+
+def course_nutrient_matrix(courses: pl.DataFrame, n_courses: int) -> np.ndarray:
+    """
+    Returns the calories and nutrients of every course, indexed by course_index.
+
+    Args:
+        courses (pl.DataFrame): Processed courses (course_index plus the
+            NUTRITION_KEYS columns), e.g. the output of build_course_table.
+        n_courses (int): Number of rows of the output.
+
+    Returns:
+        np.ndarray: float32 matrix of shape (n_courses, len(NUTRITION_KEYS)),
+            with columns (calories, *NUTRIENTS); NaN where a value is missing
+            or the course is not in `courses`.
+    """
+    cols = list(NUTRITION_KEYS)
+    known = courses.select("course_index", *cols).drop_nulls("course_index")
+    idx = known["course_index"].to_numpy().astype(np.int64)
+    keep = (idx >= 0) & (idx < n_courses)
+
+    out = np.full((n_courses, len(cols)), np.nan, dtype=np.float32)
+    out[idx[keep]] = known.select(cols).to_numpy().astype(np.float32)[keep]
+    return out
+
+
+def aggregate_meals(
+    meal_course: InteractionMatrix, course_nutr: np.ndarray, missing: str = "nan"
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Sums the calories and nutrients of the courses of every meal.
+
+    All meals are aggregated with one sparse-dense product of the meal x
+    course incidence matrix (a course listed twice counts twice) with the
+    course nutrient matrix. Meals without courses are NaN under every policy.
+
+    Args:
+        meal_course (InteractionMatrix): Meal x course incidence counts.
+        course_nutr (np.ndarray): Course values from course_nutrient_matrix,
+            shape (n_courses, k).
+        missing (str): How courses with a missing value are counted (see
+            MISSING_POLICIES). Defaults to "nan".
+
+    Returns:
+        tuple:
+            - nutrients (np.ndarray): float32 totals, shape (n_meals, k).
+            - n_missing (np.ndarray): int16 number of courses of each meal
+              missing each value, shape (n_meals, k).
+    """
+    if missing not in MISSING_POLICIES:
+        raise ValueError(f"Invalid missing policy: {missing}")
+
+    incidence = meal_course.to_scipy()
+    is_missing = np.isnan(course_nutr)
+
+    if missing == "impute":
+        fill = np.nan_to_num(np.nanmean(np.where(is_missing, np.nan, course_nutr), axis=0))
+    else:
+        fill = np.zeros(course_nutr.shape[1], dtype=np.float32)
+    filled = np.where(is_missing, fill, course_nutr).astype(np.float64)
+
+    nutrients = np.asarray(incidence @ filled)
+    n_missing = np.asarray(incidence @ is_missing.astype(np.float64))
+
+    if missing == "nan":
+        nutrients[n_missing > 0] = np.nan
+    nutrients[np.diff(meal_course.indptr) == 0] = np.nan
+
+    return nutrients.astype(np.float32), np.minimum(n_missing, np.iinfo(np.int16).max).astype(np.int16)
+
+
+def _line_values(path: Path, n: int) -> np.ndarray:
+    """
+    Reads a one-value-per-line file (line number == index), NaN-padded to `n`.
+    """
+    out = np.full(n, np.nan, dtype=np.float32)
+    if path.exists():
+        values = pl.read_csv(path, has_header=False, new_columns=["v"])["v"].cast(pl.Float32)
+        values = values.fill_null(np.nan).to_numpy()[:n]
+        out[: len(values)] = values
+    return out
+
+
+def build_meal_aggregates(
+    data_dir: str | Path = DATA_DIR,
+    courses_path: str | Path = OUT_PATH,
+    out_dir: str | Path = OUT_DIR,
+    missing: str = "nan",
+) -> Path:
+    """
+    Builds and saves the meal-level calories, nutrients and healthy score.
+
+    Args:
+        data_dir (str | Path): MealRec+H root directory (meal_course.txt and
+            the meal FSA/WHO scores).
+        courses_path (str | Path): Processed courses Parquet (build_course_table).
+        out_dir (str | Path): Output directory.
+        missing (str): Missing value policy (see MISSING_POLICIES). Defaults to "nan".
+
+    Returns:
+        Path: Output directory, with nutrients.npy (n_meals, 4) float32 in
+            the (calories, *NUTRIENTS) order of MealDataset.nutrient_matrix,
+            n_missing.npy (n_meals, 4) int16, healthy_score.npy (n_meals,)
+            float32 (meal_fsa + meal_who) and meta.json.
+    """
+    data_dir, out_dir = Path(data_dir), Path(out_dir)
+
+    courses = pl.read_parquet(courses_path, columns=["course_index", *NUTRITION_KEYS])
+    pairs = (
+        pl.scan_csv(data_dir / MEAL_COURSE, separator="\t", has_header=False)
+        .select(pl.nth(0).cast(pl.Int64).alias("meal"), pl.nth(1).cast(pl.Int64).alias("course"))
+        .collect()
+    )
+    n_meals = int(pairs["meal"].max()) + 1 if pairs.height else 0
+    max_course = courses["course_index"].max()
+    n_courses = max(
+        int(pairs["course"].max()) + 1 if pairs.height else 0,
+        int(max_course) + 1 if max_course is not None else 0,
+    )
+
+    meal_course = InteractionMatrix.from_pairs(
+        pairs["meal"].to_numpy(), pairs["course"].to_numpy(), shape=(n_meals, n_courses)
+    )
+    nutrients, n_missing = aggregate_meals(
+        meal_course, course_nutrient_matrix(courses, n_courses), missing
+    )
+    healthy_score = _line_values(data_dir / MEAL_FSA, n_meals) + _line_values(data_dir / MEAL_WHO, n_meals)
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    arrays = {"nutrients": nutrients, "n_missing": n_missing, "healthy_score": healthy_score}
+    for name in _ARRAYS:
+        np.save(out_dir / f"{name}.npy", arrays[name])
+    (out_dir / "meta.json").write_text(
+        json.dumps({"n_meals": n_meals, "columns": list(NUTRITION_KEYS), "missing": missing})
+    )
+    return out_dir
+
+
+def load_meal_aggregates(path: str | Path = OUT_DIR, mmap: bool = True) -> dict[str, np.ndarray]:
+    """
+    Loads the arrays written by build_meal_aggregates.
+
+    Args:
+        path (str | Path): Aggregates directory.
+        mmap (bool): Whether to memory-map the arrays (read-only). Defaults to True.
+
+    Returns:
+        dict[str, np.ndarray]: "nutrients", "n_missing" and "healthy_score",
+            indexed by MealRec+ meal index.
+    """
+    path = Path(path)
+    return {name: np.load(path / f"{name}.npy", mmap_mode="r" if mmap else None) for name in _ARRAYS}
+
+
+def dataset_rows(arr: np.ndarray, meal_dataset: MealDataset) -> np.ndarray:
+    """
+    Reorders a per-meal-index array to the rows of a MealDataset (by meal_idx),
+    e.g. to use the aggregated nutrients as the env's nutrient matrix (see
+    MealDataset's `aggregates`).
+    """
+    meal_idx = meal_dataset.column("meal_idx", np.int64)
+    if len(meal_idx) and (meal_idx.min() < 0 or meal_idx.max() >= len(arr)):
+        raise ValueError(f"meal_idx out of range of the aggregates ({len(arr)} meals)")
+    return np.ascontiguousarray(arr[meal_idx])
+
+
+if __name__ == "__main__":
+    out_dir = build_meal_aggregates()
+    agg = load_meal_aggregates(out_dir)
+    incomplete = int(np.isnan(agg["nutrients"]).any(axis=1).sum())
+    print(f"{len(agg['nutrients'])} comidas, {incomplete} con nutrientes incompletos -> {out_dir}")
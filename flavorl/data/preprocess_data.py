@@ -1,116 +1,253 @@
-import os
-import re
-import ast
-import json
-import pandas as pd
+import polars as pl
 from pathlib import Path
-from flavorl.data.data_utils import extract_times_and_clean, _clean_and_unpack
+from flavorl.data.data_utils import NUTRITION_KEYS, parse_directions_batch, parse_nutritions_batch
 
 # 1) RUTAS
 DATA_DIR = Path("MealRecPlus/MealRec+/MealRec+H")
-meta_dir = DATA_DIR / "meta_data"
-health_dir = DATA_DIR / "healthiness"
-rel_dir = DATA_DIR  # los .txt de relaciones están en la raíz de MealRec+H
+OUT_PATH = Path("course_processed.parquet")
+CLEAN_PATH = Path("course_clean.parquet")  # platos limpios, antes de unir FSA/WHO
 
-# Rutas directas (sin coalesce_path)
-course_csv_fp = meta_dir / "course.csv"  # cuidado que hay que hacer unzip
-user_course_csv_fp = meta_dir / "user_course.csv"
-user2index_fp = meta_dir / "user2index.txt"
-course2index_fp = meta_dir / "course2index.txt"
+# Paths relative to the MealRec+H root
+META_DIR = "meta_data"
+HEALTH_DIR = "healthiness"
+REL_DIR = "."  # los .txt de relaciones están en la raíz de MealRec+H
 
-user_course_txt_fp = rel_dir / "user_course.txt"
-course_category_fp = rel_dir / "course_category.txt"
-meal_course_fp = rel_dir / "meal_course.txt"
-user_meal_fp = rel_dir / "user_meal.txt"  # opcional
+COURSE_CSV = f"{META_DIR}/course.csv"  # cuidado que hay que hacer unzip
+USER_COURSE_CSV = f"{META_DIR}/user_course.csv"
+USER2INDEX = f"{META_DIR}/user2index.txt"
+COURSE2INDEX = f"{META_DIR}/course2index.txt"
+
+USER_COURSE_TXT = f"{REL_DIR}/user_course.txt"
+COURSE_CATEGORY = f"{REL_DIR}/course_category.txt"
+MEAL_COURSE = f"{REL_DIR}/meal_course.txt"
+USER_MEAL = f"{REL_DIR}/user_meal.txt"  # opcional
 
 # splits de user_meal:
-user_meal_train_fp = rel_dir / "user_meal_train.txt"
-user_meal_tune_fp = rel_dir / "user_meal_tune.txt"
-user_meal_test_fp = rel_dir / "user_meal_test.txt"
-
-course_fsa_fp = health_dir / "course_fsa.txt"
-course_who_fp = health_dir / "course_who.txt"
-meal_fsa_fp = health_dir / "meal_fsa.txt"
-meal_who_fp = health_dir / "meal_who.txt"
-user_fsa_fp = health_dir / "user_fsa.txt"
-user_who_fp = health_dir / "user_who.txt"
-
-# Comprobaciones
-required_paths = [
-    course_csv_fp,
-    user_course_csv_fp,
-    user2index_fp,
-    course2index_fp,
-    user_course_txt_fp,
-    course_category_fp,
-    meal_course_fp,
-    course_fsa_fp,
-    course_who_fp,
-    meal_fsa_fp,
-    meal_who_fp,
-    user_fsa_fp,
-    user_who_fp,
+USER_MEAL_TRAIN = f"{REL_DIR}/user_meal_train.txt"
+USER_MEAL_TUNE = f"{REL_DIR}/user_meal_tune.txt"
+USER_MEAL_TEST = f"{REL_DIR}/user_meal_test.txt"
+
+COURSE_FSA = f"{HEALTH_DIR}/course_fsa.txt"
+COURSE_WHO = f"{HEALTH_DIR}/course_who.txt"
+MEAL_FSA = f"{HEALTH_DIR}/meal_fsa.txt"
+MEAL_WHO = f"{HEALTH_DIR}/meal_who.txt"
+USER_FSA = f"{HEALTH_DIR}/user_fsa.txt"
+USER_WHO = f"{HEALTH_DIR}/user_who.txt"
+
+REQUIRED_FILES = [
+    COURSE_CSV,
+    USER_COURSE_CSV,
+    USER2INDEX,
+    COURSE2INDEX,
+    USER_COURSE_TXT,
+    COURSE_CATEGORY,
+    MEAL_COURSE,
+    COURSE_FSA,
+    COURSE_WHO,
+    MEAL_FSA,
+    MEAL_WHO,
+    USER_FSA,
+    USER_WHO,
 ]
-missing = [str(p) for p in required_paths if not p.exists()]
-if missing:
-    raise FileNotFoundError("Faltan estos archivos:\n  - " + "\n  - ".join(missing))
 
+_DIRECTIONS_DTYPE = pl.Struct(
+    {
+        "prep_min": pl.Int64,
+        "cook_min": pl.Int64,
+        "ready_min": pl.Int64,
+        "cooking_directions": pl.String,
+    }
+)
 
-# ==============================
-# 2) META COURSE
-# ==============================
-df_courses = pd.read_csv(course_csv_fp)
 
-print(df_courses.shape)
-print(df_courses.columns)
-print(df_courses.head())
+def check_files(data_dir: str | Path = DATA_DIR) -> None:
+    """
+    Checks that every raw MealRec+H file is present.
 
+    Args:
+        data_dir (str | Path): MealRec+H root directory.
+
+    Raises:
+        FileNotFoundError: If any required file is missing.
+    """
+    data_dir = Path(data_dir)
+    missing = [str(data_dir / p) for p in REQUIRED_FILES if not (data_dir / p).exists()]
+    if missing:
+        raise FileNotFoundError("Faltan estos archivos:\n  - " + "\n  - ".join(missing))
 
-import ast
-import pandas as pd
 
-df_courses["cooking_directions_original"] = df_courses["cooking_directions"]
-df_courses[["cooking_directions", "prep_min", "cook_min", "ready_min"]] = df_courses[
-    "cooking_directions"
-].apply(_clean_and_unpack)
+def _parse_directions(s: pl.Series) -> pl.Series:
+    """
+    Extracts prep/cook/ready times and cleans a batch of 'cooking_directions'.
 
-print(df_courses.head())
+    Each value is a "{'directions': u'...'}" literal (or plain text).
+    """
+    parsed = parse_directions_batch(s).rename({"cleaned": "cooking_directions"})
+    return parsed.to_struct(s.name)
 
 
-course2index_fp = "MealRecPlus/MealRec+/MealRec+H/meta_data/course2index.txt"
-course_fsa_fp = "MealRecPlus/MealRec+/MealRec+H/healthiness/course_fsa.txt"
-course_who_fp = "MealRecPlus/MealRec+/MealRec+H/healthiness/course_who.txt"
+_NUTRITIONS_DTYPE = pl.Struct({col: pl.Float64 for col in NUTRITION_KEYS})
+
 
-# --- 1) course_id -> course_index ---
-df_c2i = pd.read_csv(
-    course2index_fp, sep="\t", header=None, names=["course_id", "course_index"]
-)
+def _parse_nutritions(s: pl.Series) -> pl.Series:
+    """
+    Extracts calories and nutrients from a batch of 'nutritions' values.
+    """
+    return parse_nutritions_batch(s).to_struct(s.name)
 
-# If your main dataframe is df_courses (has column 'course_id'):
-df_courses = df_courses.merge(df_c2i, on="course_id", how="left")
-
-# Optional: make it an integer (nullable) so NaNs are allowed
-df_courses["course_index"] = df_courses["course_index"].astype("Int64")
-
-# --- 2) load FSA/WHO series (line index == course_index) ---
-# Each line is a value; its row number is the course_index.
-s_fsa = pd.read_csv(course_fsa_fp, header=None).squeeze("columns")
-s_who = pd.read_csv(course_who_fp, header=None).squeeze("columns")
-
-s_fsa.index.name = "course_index"
-s_fsa.name = "course_fsa"
-s_who.index.name = "course_index"
-s_who.name = "course_who"
-
-# --- 3) join by course_index ---
-df_courses = df_courses.join(s_fsa, on="course_index")
-df_courses = df_courses.join(s_who, on="course_index")
-
-# Optional sanity checks
-print("Unmapped course_id count:", df_courses["course_index"].isna().sum())
-print(
-    "Missing FSA:",
-    df_courses["course_fsa"].isna().sum(),
-    "Missing WHO:",
-    df_courses["course_who"].isna().sum(),
-)
+
+def _scan_line_values(path: Path, name: str) -> pl.LazyFrame:
+    """
+    Scans a one-value-per-line file whose line number is the course_index.
+    """
+    return (
+        pl.scan_csv(path, has_header=False, new_columns=[name])
+        .with_row_index("course_index")
+        .with_columns(pl.col("course_index").cast(pl.Int64))
+    )
+
+
+def clean_course_table(data_dir: str | Path = DATA_DIR) -> pl.LazyFrame:
+    """
+    Builds the lazy query for the cleaned course table (without health scores).
+
+    Cleans the cooking directions (extracting prep/cook/ready minutes),
+    extracts calories and nutrients (columns of NUTRITION_KEYS, null when
+    missing) from 'nutritions' if present and maps course_id to course_index.
+
+    Args:
+        data_dir (str | Path): MealRec+H root directory.
+
+    Returns:
+        pl.LazyFrame: Cleaned courses. 'cooking_directions' holds the cleaned
+            directions text and 'cooking_directions_original' the raw value.
+    """
+    data_dir = Path(data_dir)
+
+    # 2) META COURSE
+    courses = pl.scan_csv(data_dir / COURSE_CSV).with_columns(
+        pl.col("cooking_directions").alias("cooking_directions_original"),
+        pl.col("cooking_directions")
+        .map_batches(_parse_directions, return_dtype=_DIRECTIONS_DTYPE, is_elementwise=True)
+        .alias("_parsed"),
+    )
+    courses = courses.drop("cooking_directions").unnest("_parsed")
+
+    if "nutritions" in courses.collect_schema().names():
+        courses = courses.with_columns(
+            pl.col("nutritions")
+            .map_batches(_parse_nutritions, return_dtype=_NUTRITIONS_DTYPE, is_elementwise=True)
+            .alias("_nutr")
+        ).unnest("_nutr")
+
+    # 3) course_id -> course_index
+    c2i = pl.scan_csv(
+        data_dir / COURSE2INDEX,
+        separator="\t",
+        has_header=False,
+        new_columns=["course_id", "course_index"],
+        schema_overrides=[pl.Int64, pl.Int64],
+    )
+    return courses.join(c2i, on="course_id", how="left")
+
+
+def join_health(courses: pl.LazyFrame, data_dir: str | Path = DATA_DIR) -> pl.LazyFrame:
+    """
+    Joins the FSA/WHO healthiness scores to cleaned courses.
+
+    Args:
+        courses (pl.LazyFrame): Cleaned courses (see clean_course_table).
+        data_dir (str | Path): MealRec+H root directory.
+
+    Returns:
+        pl.LazyFrame: Courses with 'course_fsa' and 'course_who' columns.
+    """
+    data_dir = Path(data_dir)
+
+    # 4) FSA/WHO scores (line index == course_index)
+    courses = courses.join(
+        _scan_line_values(data_dir / COURSE_FSA, "course_fsa"), on="course_index", how="left"
+    )
+    courses = courses.join(
+        _scan_line_values(data_dir / COURSE_WHO, "course_who"), on="course_index", how="left"
+    )
+
+    return courses
+
+
+def course_table(data_dir: str | Path = DATA_DIR) -> pl.LazyFrame:
+    """
+    Builds the lazy query for the processed course table: the cleaned
+    courses (see clean_course_table) with the FSA/WHO healthiness scores.
+
+    Args:
+        data_dir (str | Path): MealRec+H root directory.
+
+    Returns:
+        pl.LazyFrame: Processed courses.
+    """
+    return join_health(clean_course_table(data_dir), data_dir)
+
+
+def build_clean_courses(data_dir: str | Path = DATA_DIR, out_path: str | Path = CLEAN_PATH) -> Path:
+    """
+    Writes the cleaned course table (see clean_course_table) to Parquet.
+
+    Args:
+        data_dir (str | Path): MealRec+H root directory.
+        out_path (str | Path): Output Parquet file.
+
+    Returns:
+        Path: Path to the written file.
+    """
+    out_path = Path(out_path)
+    clean_course_table(data_dir).sink_parquet(out_path, engine="streaming")
+    return out_path
+
+
+def build_course_table(
+    data_dir: str | Path = DATA_DIR, out_path: str | Path = OUT_PATH, clean_path: str | Path = None
+) -> Path:
+    """
+    Runs the course preprocessing pipeline and writes its Parquet output.
+
+    The query is executed with the streaming engine, so raw files are
+    processed in bounded memory across all cores.
+
+    Args:
+        data_dir (str | Path): MealRec+H root directory.
+        out_path (str | Path): Output Parquet file.
+        clean_path (str | Path, optional): Cleaned courses written by
+            build_clean_courses. If given, only the health scores are joined
+            to it instead of cleaning the raw courses again. Defaults to None.
+
+    Returns:
+        Path: Path to the written file.
+    """
+    if clean_path is None:
+        check_files(data_dir)
+        query = course_table(data_dir)
+    else:
+        query = join_health(pl.scan_parquet(clean_path), data_dir)
+
+    out_path = Path(out_path)
+    query.sink_parquet(out_path, engine="streaming")
+
+    return out_path
+
+
+if __name__ == "__main__":
+    out_path = build_course_table()
+
+    # Sanity checks
+    summary = (
+        pl.scan_parquet(out_path)
+        .select(
+            pl.len().alias("courses"),
+            pl.col("course_index").null_count().alias("unmapped_course_id"),
+            pl.col("course_fsa").null_count().alias("missing_fsa"),
+            pl.col("course_who").null_count().alias("missing_who"),
+        )
+        .collect()
+    )
+    print(summary)
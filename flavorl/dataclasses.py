@@ -1,12 +1,30 @@
+from abc import ABC, abstractmethod
+from collections.abc import Mapping
 from enum import Enum
-from dataclasses import dataclass
-from typing import Any, List, Type, TypeVar
+from dataclasses import dataclass, field, fields
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any, Iterator, List, Sequence, Type, TypeVar, get_origin
 
-import polars as pl
-import random
+import json
+import os
+import numpy as np
+
+# polars is imported where it is used, so that importing the env (e.g. to
+# check a gym spec or spawn a worker) does not pay for it
+if TYPE_CHECKING:
+    import polars as pl
 
 T = TypeVar("T")
 
+# Fixed nutrient order used by every nutrient vector/matrix
+NUTRIENTS = ("prot", "ch", "fib")
+
+# Separator of the tags of a meal (e.g. "quick^easy^baked")
+TAG_SEPARATOR = "^"
+
+# Version of the binary cache layout (text columns are stored dictionary-encoded)
+_CACHE_VERSION = 2
+
 class MealType(Enum):
     BREAKFAST = 0
     LUNCH = 1
@@ -22,7 +40,7 @@ class Day(Enum):
     SUNDAY = 6
 
 
-@dataclass
+@dataclass(slots=True)
 class User:
     """
     Represents a single user entry.
@@ -48,7 +66,7 @@ class User:
     daily_cal: float
     daily_nutr: dict[str, float]
 
-@dataclass
+@dataclass(slots=True)
 class Meal:
     """
     Represents a single meal item with its nutritional information.
@@ -61,6 +79,10 @@ class Meal:
         ingredients (str): Description or list of the ingredients used in the meal.
         tags (str): Descriptive tags or labels associated with the meal.
         healthy_score (float): Aggregated healthy scores (course_fsa + course_who).
+        vegan (bool): Whether the meal is suitable for a vegan diet.
+        vegetarian (bool): Whether the meal is suitable for a vegetarian diet.
+        allergens (dict[str, bool]): dict indicating the allergens the meal contains.
+        intoler (dict[str, bool]): dict indicating the intolerances the meal may trigger.
     """
 
     meal_idx: int
@@ -72,60 +94,808 @@ class Meal:
     tags: str
     healthy_score : float
 
+    vegan: bool = False
+    vegetarian: bool = False
+    allergens: dict[str, bool] = field(default_factory=dict)
+    intoler: dict[str, bool] = field(default_factory=dict)
+
+
+class KeyedVector(Mapping):
+    """
+    Read-only mapping over a fixed-order NumPy vector.
+
+    Exposes a row of a dataset matrix (e.g. the nutrients of a meal) both as
+    a dict-like object (`meal.nutrients["prot"]`) and as a vector
+    (`meal.nutrients.values`, `np.asarray(meal.nutrients)`), without copying.
+    """
+
+    __slots__ = ("values", "_pos")
+
+    def __init__(self, values: np.ndarray, pos: dict[str, int]) -> None:
+        """
+        Args:
+            values (np.ndarray): Vector (a read-only view of a dataset row).
+            pos (dict[str, int]): Position of each key in `values`.
+        """
+        self.values: np.ndarray = values
+        self._pos: dict[str, int] = pos
+
+    def __getitem__(self, key: str) -> Any:
+        return self.values[self._pos[key]].item()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._pos)
+
+    def __len__(self) -> int:
+        return len(self._pos)
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        return np.array(self.values, dtype=dtype, copy=copy)
+
+    def __repr__(self) -> str:
+        return f"KeyedVector({dict(self)})"
+
+
+@dataclass
+class TagVocab:
+    """
+    Integer ids of the meal tags.
+
+    Tags are tokenized once per distinct tags string and stored as a CSR
+    layout: the tag ids of row i are `ids[indptr[i]:indptr[i + 1]]`.
+
+    Attributes:
+        tokens (tuple[str, ...]): Tag of each id, sorted.
+        indptr (np.ndarray): Row offsets into `ids`, shape (n_meals + 1,).
+        ids (np.ndarray): int32 tag ids of every row, concatenated.
+    """
+
+    tokens: tuple[str, ...]
+    indptr: np.ndarray
+    ids: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def row(self, row_idx: int) -> np.ndarray:
+        """
+        Returns the tag ids of a row.
+        """
+        return self.ids[self.indptr[row_idx] : self.indptr[row_idx + 1]]
+
+    def id(self, token: str) -> int:
+        """
+        Returns the id of a tag, or -1 if it is unknown.
+        """
+        pos = int(np.searchsorted(self.tokens, token))
+        return pos if pos < len(self.tokens) and self.tokens[pos] == token else -1
+
+
+class RowView(ABC):
+    """
+    Flyweight view of a dataset row.
+
+    Holds only the row index and the dataset's column arrays, which are
+    shared by every view of the dataset. Attributes are read from the arrays
+    on access, so views are cheap to create and never copy the row.
+    Use `to_record` to get the equivalent dataclass.
+    """
+
+    __slots__ = ("_c", "_row")
+
+    # Identifier field shown by repr
+    _id_field: str = None
+
+    def __init__(self, columns: SimpleNamespace, row: int) -> None:
+        """
+        Args:
+            columns (SimpleNamespace): Shared column arrays (see `bind`).
+            row (int): Row index in the dataset.
+        """
+        self._c = columns
+        self._row = row
+
+    @classmethod
+    @abstractmethod
+    def bind(cls, dataset: "BaseDataset") -> SimpleNamespace:
+        """
+        Returns the column arrays read by the views of a dataset.
+        """
+
+    @property
+    def row(self) -> int:
+        return self._row
+
+    def to_record(self) -> Any:
+        """
+        Returns the row as an instance of the dataset's dataclass.
+        """
+        return self._c.dataset.record(self._row)
+
+    def _text(self, col: str) -> str:
+        dataset = self._c.dataset
+        return dataset.text(col)[self._row] if col in dataset.text_columns else None
+
+    def __eq__(self, other: object) -> bool:
+        return type(other) is type(self) and other._c is self._c and other._row == self._row
+
+    def __hash__(self) -> int:
+        return hash((id(self._c), self._row))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(row={self._row}, {self._id_field}={getattr(self, self._id_field)})"
+
+
+def _view_array(dataset: "BaseDataset", col: str, dtype: np.dtype) -> np.ndarray:
+    """
+    Read-only column array, zeros if the column is missing.
+    """
+    if col in dataset.df.columns:
+        arr = dataset.column(col, dtype).view()
+    else:
+        arr = np.zeros(len(dataset), dtype=dtype)
+    arr.flags.writeable = False
+    return arr
+
+
+def _view_struct(
+    dataset: "BaseDataset", col: str, dtype: np.dtype, keys: Sequence[str] = None
+) -> tuple[np.ndarray, dict[str, int]]:
+    """
+    Read-only matrix of a dict column and the position of each key. Keys
+    default to the fields of the column (none if it is missing).
+    """
+    if keys is None:
+        fields_ = getattr(dataset.df.schema.get(col), "fields", None) or []
+        keys = [f.name for f in fields_]
+    if keys and col in dataset.df.columns:
+        arr = dataset.struct_column(col, keys, dtype).view()
+    else:
+        arr = np.zeros((len(dataset), len(keys)), dtype=dtype)
+    arr.flags.writeable = False
+    return arr, {k: j for j, k in enumerate(keys)}
+
+
+class MealView(RowView):
+    """
+    Array-backed view of a meal with the attributes of `Meal`.
+
+    `nutrients`, `allergens` and `intoler` are KeyedVectors; nutrients follow
+    the fixed NUTRIENTS order. `tag_ids` are the ids of the meal's tags in
+    the dataset's TagVocab.
+    """
+
+    __slots__ = ()
+    _id_field = "meal_idx"
+
+    @classmethod
+    def bind(cls, dataset: "BaseDataset") -> SimpleNamespace:
+        nutrients, nutrient_pos = _view_struct(dataset, "nutrients", np.float32, NUTRIENTS)
+        allergens, allergen_pos = _view_struct(dataset, "allergens", np.bool_)
+        intoler, intoler_pos = _view_struct(dataset, "intoler", np.bool_)
+        return SimpleNamespace(
+            dataset=dataset,
+            meal_idx=_view_array(dataset, "meal_idx", np.int64),
+            meal_type=_view_array(dataset, "meal_type", np.int64),
+            calories=_view_array(dataset, "calories", np.float64),
+            healthy_score=_view_array(dataset, "healthy_score", np.float64),
+            vegan=_view_array(dataset, "vegan", np.bool_),
+            vegetarian=_view_array(dataset, "vegetarian", np.bool_),
+            nutrients=nutrients,
+            nutrient_pos=nutrient_pos,
+            allergens=allergens,
+            allergen_pos=allergen_pos,
+            intoler=intoler,
+            intoler_pos=intoler_pos,
+        )
+
+    @property
+    def meal_idx(self) -> int:
+        return int(self._c.meal_idx[self._row])
+
+    @property
+    def meal_type(self) -> int:
+        return int(self._c.meal_type[self._row])
+
+    @property
+    def calories(self) -> float:
+        return float(self._c.calories[self._row])
+
+    @property
+    def nutrients(self) -> KeyedVector:
+        return KeyedVector(self._c.nutrients[self._row], self._c.nutrient_pos)
+
+    @property
+    def ingredients(self) -> str:
+        return self._text("ingredients")
+
+    @property
+    def tags(self) -> str:
+        return self._text("tags")
+
+    @property
+    def tag_ids(self) -> np.ndarray:
+        return self._c.dataset.tag_vocab().row(self._row)
+
+    @property
+    def healthy_score(self) -> float:
+        return float(self._c.healthy_score[self._row])
+
+    @property
+    def vegan(self) -> bool:
+        return bool(self._c.vegan[self._row])
+
+    @property
+    def vegetarian(self) -> bool:
+        return bool(self._c.vegetarian[self._row])
+
+    @property
+    def allergens(self) -> KeyedVector:
+        return KeyedVector(self._c.allergens[self._row], self._c.allergen_pos)
+
+    @property
+    def intoler(self) -> KeyedVector:
+        return KeyedVector(self._c.intoler[self._row], self._c.intoler_pos)
+
+
+class UserView(RowView):
+    """
+    Array-backed view of a user with the attributes of `User`.
+
+    `daily_nutr`, `allergies` and `intoler` are KeyedVectors; daily nutrients
+    follow the fixed NUTRIENTS order.
+    """
+
+    __slots__ = ()
+    _id_field = "user_idx"
+
+    @classmethod
+    def bind(cls, dataset: "BaseDataset") -> SimpleNamespace:
+        daily_nutr, nutrient_pos = _view_struct(dataset, "daily_nutr", np.float32, NUTRIENTS)
+        allergies, allergy_pos = _view_struct(dataset, "allergies", np.bool_)
+        intoler, intoler_pos = _view_struct(dataset, "intoler", np.bool_)
+        return SimpleNamespace(
+            dataset=dataset,
+            user_idx=_view_array(dataset, "user_idx", np.int64),
+            vegan=_view_array(dataset, "vegan", np.bool_),
+            vegetarian=_view_array(dataset, "vegetarian", np.bool_),
+            daily_cal=_view_array(dataset, "daily_cal", np.float64),
+            daily_nutr=daily_nutr,
+            nutrient_pos=nutrient_pos,
+            allergies=allergies,
+            allergy_pos=allergy_pos,
+            intoler=intoler,
+            intoler_pos=intoler_pos,
+        )
+
+    @property
+    def user_idx(self) -> int:
+        return int(self._c.user_idx[self._row])
+
+    @property
+    def allergies(self) -> KeyedVector:
+        return KeyedVector(self._c.allergies[self._row], self._c.allergy_pos)
+
+    @property
+    def intoler(self) -> KeyedVector:
+        return KeyedVector(self._c.intoler[self._row], self._c.intoler_pos)
+
+    @property
+    def vegan(self) -> bool:
+        return bool(self._c.vegan[self._row])
+
+    @property
+    def vegetarian(self) -> bool:
+        return bool(self._c.vegetarian[self._row])
+
+    @property
+    def preferences(self) -> str:
+        return self._text("preferences")
+
+    @property
+    def daily_cal(self) -> float:
+        return float(self._c.daily_cal[self._row])
+
+    @property
+    def daily_nutr(self) -> KeyedVector:
+        return KeyedVector(self._c.daily_nutr[self._row], self._c.nutrient_pos)
+
+
+def text_columns(schema: "pl.Schema", dataclass_type: Type[T]) -> list[str]:
+    """
+    Returns the free-text columns of a dataset schema: string (or
+    dictionary-encoded) columns that are not dict fields of the dataclass.
+
+    Args:
+        schema (pl.Schema): Schema of the CSV or of its binary cache.
+        dataclass_type (Type[T]): Dataclass type for the rows.
+
+    Returns:
+        list[str]: Text column names, in schema order.
+    """
+    import polars as pl
+
+    dict_fields = {f.name for f in fields(dataclass_type) if get_origin(f.type) is dict}
+    return [
+        col
+        for col, dtype in schema.items()
+        if col not in dict_fields and (dtype == pl.String or isinstance(dtype, (pl.Enum, pl.Categorical)))
+    ]
+
+
+def encode_text(s: "pl.Series") -> "pl.Series":
+    """
+    Dictionary-encodes a text column as an Enum of its sorted distinct values,
+    so each distinct string is stored once and rows hold integer codes.
+    """
+    import polars as pl
+
+    if isinstance(s.dtype, pl.Enum):
+        return s
+    s = s.cast(pl.String)
+    return s.cast(pl.Enum(s.drop_nulls().unique().sort()))
+
+
+def read_csv(csv_file: str, dataclass_type: Type[T], text: bool = True) -> "pl.DataFrame":
+    """
+    Parses a dataset CSV file.
+
+    dict fields of the dataclass, stored as JSON strings in the CSV, are
+    decoded into struct columns. Text columns (see `text_columns`) are
+    dictionary-encoded.
+
+    Args:
+        csv_file (str): Path to the CSV file.
+        dataclass_type (Type[T]): Dataclass type for the rows.
+        text (bool): Whether to read the text columns. Defaults to True.
+
+    Returns:
+        pl.DataFrame: Parsed dataframe.
+    """
+    import polars as pl
+
+    schema = pl.scan_csv(csv_file).collect_schema()
+    text_cols = text_columns(schema, dataclass_type)
+    df = pl.read_csv(csv_file, columns=None if text else [c for c in schema if c not in text_cols])
+    for f in fields(dataclass_type):
+        if get_origin(f.type) is dict and df.schema.get(f.name) == pl.String:
+            df = df.with_columns(df[f.name].str.json_decode(infer_schema_length=None))
+    return df.with_columns(encode_text(df[col]) for col in text_cols if col in df.columns)
+
+
+def read_csv_cached(csv_file: str, dataclass_type: Type[T], text: bool = True) -> "pl.DataFrame":
+    """
+    Loads a dataset CSV file through a binary cache stored next to it.
+
+    On first use, the parsed CSV is written as uncompressed Arrow IPC to
+    `<csv_file>.arrow`, with the source size and mtime recorded in
+    `<csv_file>.arrow.meta`. Later calls memory-map the Arrow file instead of
+    parsing the CSV, so processes loading the same dataset share the same
+    page-cache pages. The cache is rebuilt when the source changes, and
+    skipped if it cannot be written.
+
+    Args:
+        csv_file (str): Path to the CSV file.
+        dataclass_type (Type[T]): Dataclass type for the rows.
+        text (bool): Whether to read the text columns. Defaults to True.
+
+    Returns:
+        pl.DataFrame: Loaded dataframe.
+    """
+    import polars as pl
+
+    cache_file = f"{csv_file}.arrow"
+    meta_file = f"{cache_file}.meta"
+
+    if _cache_meta(csv_file) is None:
+        stat = os.stat(csv_file)
+        df = read_csv(csv_file, dataclass_type)
+        source = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "n_rows": df.height,
+            "version": _CACHE_VERSION,
+        }
+
+        # Write to temporary files and rename them, so concurrent readers never
+        # see a partial cache and existing memory maps stay valid
+        try:
+            tmp_suffix = f".{os.getpid()}.tmp"
+            df.write_ipc(cache_file + tmp_suffix, compression="uncompressed")
+            os.replace(cache_file + tmp_suffix, cache_file)
+            with open(meta_file + tmp_suffix, "w") as f:
+                json.dump(source, f)
+            os.replace(meta_file + tmp_suffix, meta_file)
+        except OSError:
+            return df if text else df.drop(text_columns(df.schema, dataclass_type))
+
+    if text:
+        return pl.read_ipc(cache_file)
+    schema = pl.read_ipc_schema(cache_file)
+    text_cols = text_columns(schema, dataclass_type)
+    return pl.read_ipc(cache_file, columns=[c for c in schema if c not in text_cols])
+
+
+def read_text_column(csv_file: str, col: str, cache: bool = True) -> "pl.Series":
+    """
+    Reads one dictionary-encoded text column of a dataset, from the binary
+    cache if it is up to date, else from the CSV.
+
+    Args:
+        csv_file (str): Path to the CSV file.
+        col (str): Text column name.
+        cache (bool): Whether to read from the binary cache. Defaults to True.
+
+    Returns:
+        pl.Series: Enum-encoded column.
+    """
+    import polars as pl
+
+    if cache and _cache_meta(csv_file) is not None:
+        return encode_text(pl.read_ipc(f"{csv_file}.arrow", columns=[col]).to_series())
+    return encode_text(pl.read_csv(csv_file, columns=[col]).to_series())
+
+
+def _cache_meta(csv_file: str) -> dict | None:
+    """
+    Returns the metadata of the binary cache of a CSV file, or None if the
+    cache is missing, older than the CSV or written by an older version.
+    """
+    stat = os.stat(csv_file)
+    try:
+        with open(f"{csv_file}.arrow.meta") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("size") != stat.st_size or meta.get("mtime_ns") != stat.st_mtime_ns:
+        return None
+    if meta.get("version") != _CACHE_VERSION:
+        return None
+    return meta
+
 
 class BaseDataset:
     """
     Generic CSV-backed dataset.
 
-    Provides filtering and sampling utilities.
+    Provides filtering and sampling utilities. Rows are returned as views
+    of `view_type` (see RowView), or as dataclass instances if it is None.
+
+    Free-text columns (e.g. ingredients, tags, preferences) are not part of
+    `df`: they are read dictionary-encoded from the binary cache (or the CSV)
+    the first time they are accessed through `text`, since the step loop
+    never reads them.
     """
 
-    def __init__(self, csv_file: str, dataclass_type: Type[T]) -> None:
+    view_type: Type[RowView] = None
+
+    def __init__(self, csv_file: str, dataclass_type: Type[T], cache: bool = True) -> None:
         """
         Initializes the dataset from a CSV file.
 
         Args:
             csv_file (str): Path to the CSV file.
             dataclass_type (Type[T]): Dataclass type for the rows (Meal, User, etc.)
+            cache (bool): Whether to load through the memory-mapped binary
+                cache (see `read_csv_cached`). Defaults to True.
         """
-        self.df: pl.DataFrame = pl.read_csv(csv_file)
+        import polars as pl
+
+        self.csv_file: str = csv_file
+        self.cache: bool = cache
+        if cache:
+            self.df: "pl.DataFrame" = read_csv_cached(csv_file, dataclass_type, text=False)
+        else:
+            self.df: "pl.DataFrame" = read_csv(csv_file, dataclass_type, text=False)
         self.dataclass_type = dataclass_type
 
-    def sample(self, n: int = 1, **filters: Any) -> List[T]:
+        # Text columns, read on first access
+        self.text_columns: tuple[str, ...] = tuple(
+            text_columns(pl.scan_csv(csv_file).collect_schema(), dataclass_type)
+        )
+        self._text_cache: dict[str, "pl.Series"] = {}
+
+        # Row indices matching each filter combination, built on first use
+        self._index_cache: dict[tuple, np.ndarray] = {}
+
+        # Numeric column arrays, built on first use
+        self._array_cache: dict[tuple, np.ndarray] = {}
+
+        # Generator used when sampling without an explicit one
+        self._rng: np.random.Generator = np.random.default_rng()
+
+        # Column arrays shared by every row view, built on first use
+        self._view_columns: SimpleNamespace = None
+
+    def __len__(self) -> int:
+        return self.df.height
+
+    def indices(self, **filters: Any) -> np.ndarray:
         """
-        Returns a random sample of objects from the dataset, optionally filtered.
+        Returns the row indices matching the given filters.
+
+        Indices are computed once per filter combination and cached, so
+        repeated calls do not scan the dataframe again.
+
+        Args:
+            **filters: Column filters. Unknown columns are ignored.
+
+        Returns:
+            np.ndarray: Matching row indices (int64).
+        """
+        key = tuple(
+            sorted(
+                (col, val.value if isinstance(val, Enum) else val)
+                for col, val in filters.items()
+                if col in self.df.columns or col in self.text_columns
+            )
+        )
+
+        idx = self._index_cache.get(key)
+        if idx is None:
+            import polars as pl
+
+            df = self.df.with_columns(
+                self.text(col).cast(pl.String) for col, _ in key if col in self.text_columns
+            )
+            mask = pl.lit(True)
+            for col, val in key:
+                mask = mask & (pl.col(col) == val)
+            idx = (
+                df.select(pl.arg_where(mask))
+                .to_series()
+                .to_numpy()
+                .astype(np.int64)
+            )
+            self._index_cache[key] = idx
+
+        return idx
+
+    def column(self, col: str, dtype: np.dtype = np.float32) -> np.ndarray:
+        """
+        Returns a column as a contiguous NumPy array.
+
+        Args:
+            col (str): Column name.
+            dtype (np.dtype): Output dtype. Defaults to float32.
+
+        Returns:
+            np.ndarray: Column values, shape (n,).
+        """
+        key = (col, None, np.dtype(dtype))
+        arr = self._array_cache.get(key)
+        if arr is None:
+            arr = np.ascontiguousarray(self.df[col].to_numpy(), dtype=dtype)
+            self._array_cache[key] = arr
+        return arr
+
+    def struct_column(
+        self, col: str, keys: Sequence[str], dtype: np.dtype = np.float32
+    ) -> np.ndarray:
+        """
+        Returns selected keys of a dict column as a contiguous NumPy matrix.
+
+        Args:
+            col (str): Dict column name.
+            keys (Sequence[str]): Keys to extract, in output column order.
+            dtype (np.dtype): Output dtype. Defaults to float32.
+
+        Returns:
+            np.ndarray: Values, shape (n, len(keys)).
+        """
+        key = (col, tuple(keys), np.dtype(dtype))
+        arr = self._array_cache.get(key)
+        if arr is None:
+            struct = self.df[col].struct
+            arr = np.empty((self.df.height, len(keys)), dtype=dtype)
+            for j, k in enumerate(keys):
+                arr[:, j] = struct.field(k).to_numpy()
+            self._array_cache[key] = arr
+        return arr
+
+    def text(self, col: str) -> "pl.Series":
+        """
+        Returns a text column, reading it on first access.
+
+        Args:
+            col (str): Text column name (see `text_columns`).
+
+        Returns:
+            pl.Series: Enum-encoded column: one integer code per row over
+                the sorted distinct strings (`dtype.categories`).
+
+        Raises:
+            KeyError: If `col` is not a text column of the dataset.
+        """
+        if col not in self.text_columns:
+            raise KeyError(f"{col} is not a text column: {self.text_columns}")
+        s = self._text_cache.get(col)
+        if s is None:
+            s = self._text_cache[col] = read_text_column(self.csv_file, col, self.cache)
+        return s
+
+    def get(self, row_idx: int) -> RowView | T:
+        """
+        Returns the object stored at a given row.
+
+        Args:
+            row_idx (int): Row index in the dataframe.
+
+        Returns:
+            RowView | T: View of the row (see `view_type`), or an instance of
+                the dataclass if the dataset has no view type.
+        """
+        if self.view_type is None:
+            return self.record(row_idx)
+        if self._view_columns is None:
+            self._view_columns = self.view_type.bind(self)
+        return self.view_type(self._view_columns, int(row_idx))
+
+    def record(self, row_idx: int) -> T:
+        """
+        Builds the dataclass instance of a given row, copying its values.
+
+        Args:
+            row_idx (int): Row index in the dataframe.
+
+        Returns:
+            T: Row as an instance of the dataclass.
+        """
+        row = self.df.row(int(row_idx), named=True)
+        for col in self.text_columns:
+            row[col] = self.text(col)[int(row_idx)]
+        return self.dataclass_type(**row)
+
+    def sample_indices(
+        self, n: int = 1, rng: np.random.Generator = None, **filters: Any
+    ) -> np.ndarray:
+        """
+        Returns the row indices of a random sample, optionally filtered.
 
         Args:
             n (int): Number of items to sample.
+            rng (np.random.Generator, optional): Generator to draw from, e.g.
+                an env's `np_random`. Defaults to the dataset's own generator.
             **filters: Column filters.
 
         Returns:
-            List[T]: Sampled objects as instances of the dataclass.
+            np.ndarray: Sampled row indices (empty if no row matches).
         """
-        df = self.df
-        for col, val in filters.items():
-            if col in df.columns:
-                df = df.filter(pl.col(col) == val)
+        idx = self.indices(**filters)
+        if len(idx) == 0:
+            return idx
 
-        if df.is_empty():
-            return []
+        if rng is None:
+            rng = self._rng
 
-        rows: List[dict[str, Any]] = df.to_dicts()
-        if n <= len(rows):
-            sampled_rows = random.sample(rows, n)
+        if n <= len(idx):
+            positions = rng.choice(len(idx), size=n, replace=False)
         else:
-            sampled_rows = [random.choice(rows) for _ in range(n)]
+            positions = rng.integers(len(idx), size=n)
 
-        return [self.dataclass_type(**row) for row in sampled_rows]
+        return idx[positions]
+
+    def sample(
+        self, n: int = 1, rng: np.random.Generator = None, **filters: Any
+    ) -> List[RowView | T]:
+        """
+        Returns a random sample of objects from the dataset, optionally filtered.
+
+        Only the sampled rows are materialized, so the cost does not depend on
+        the size of the dataset once the filter indices are cached.
+
+        Args:
+            n (int): Number of items to sample.
+            rng (np.random.Generator, optional): Generator to draw from.
+                Defaults to the dataset's own generator.
+            **filters: Column filters.
+
+        Returns:
+            List[RowView | T]: Sampled objects (see `get`).
+        """
+        return [self.get(row_idx) for row_idx in self.sample_indices(n, rng, **filters)]
 
 
 class MealDataset(BaseDataset):
     """
     Dataset for meals.
+
+    Calories, nutrients and healthy_score are read from the CSV, or from the
+    meal aggregates built by flavorl.data.meals (see `aggregates`), so that
+    the env, its reward and the shared catalog use the precomputed values.
     """
 
-    def __init__(self, csv_file: str):
-        super().__init__(csv_file, Meal)
+    view_type = MealView
+
+    def __init__(self, csv_file: str, cache: bool = True, aggregates: str = None):
+        """
+        Args:
+            csv_file (str): Path to the CSV file.
+            cache (bool): Whether to load through the binary cache. Defaults to True.
+            aggregates (str, optional): Directory written by
+                flavorl.data.meals.build_meal_aggregates. Its memory-mapped
+                arrays replace the calories, nutrients and healthy_score
+                columns, matched to the rows by meal_idx. Defaults to None
+                (the CSV values).
+        """
+        super().__init__(csv_file, Meal, cache)
+        self.aggregates: str = aggregates
+        self._tag_vocab: TagVocab = None
+        if aggregates is not None:
+            self._use_aggregates(aggregates)
+
+    def _use_aggregates(self, path: str) -> None:
+        """
+        Replaces the nutrient columns of `df` by the meal aggregates.
+        """
+        import polars as pl
+
+        from flavorl.data.meals import dataset_rows, load_meal_aggregates
+
+        agg = load_meal_aggregates(path)
+        nutr = dataset_rows(agg["nutrients"], self)
+        self.df = self.df.with_columns(
+            pl.Series("calories", nutr[:, 0], dtype=pl.Float64),
+            pl.DataFrame({k: nutr[:, j + 1] for j, k in enumerate(NUTRIENTS)})
+            .cast(pl.Float64)
+            .to_struct("nutrients"),
+            pl.Series("healthy_score", dataset_rows(agg["healthy_score"], self), dtype=pl.Float64),
+        )
+
+    def nutrient_matrix(self) -> np.ndarray:
+        """
+        Returns calories and nutrients of every meal.
+
+        Returns:
+            np.ndarray: float32 matrix of shape (n_meals, 1 + len(NUTRIENTS)),
+                with columns (calories, *NUTRIENTS).
+        """
+        key = ("__nutrient_matrix__", None, np.dtype(np.float32))
+        arr = self._array_cache.get(key)
+        if arr is None:
+            arr = np.hstack(
+                [self.column("calories")[:, None], self.struct_column("nutrients", NUTRIENTS)]
+            )
+            self._array_cache[key] = arr
+        return arr
+
+    def tag_vocab(self) -> TagVocab:
+        """
+        Returns the tag vocabulary of the meals, built on first use.
+
+        Tags are split on TAG_SEPARATOR once per distinct tags string and
+        mapped to every row through the dictionary codes of the column.
+
+        Returns:
+            TagVocab: Sorted tags and the tag ids of every meal (none if the
+                dataset has no tags column).
+        """
+        if self._tag_vocab is None:
+            import polars as pl
+
+            if "tags" not in self.text_columns:
+                indptr = np.zeros(len(self) + 1, dtype=np.int64)
+                self._tag_vocab = TagVocab((), indptr, np.zeros(0, dtype=np.int32))
+                return self._tag_vocab
+
+            tags = self.text("tags")
+            distinct = tags.dtype.categories.str.split(TAG_SEPARATOR).list.eval(
+                pl.element().str.strip_chars().filter(pl.element() != "").unique(maintain_order=True)
+            )
+            tokens = distinct.explode().drop_nulls().unique().sort()
+            lookup = {t: i for i, t in enumerate(tokens.to_list())}
+
+            # Tag ids of each distinct string (CSR), plus an empty entry for nulls
+            dist_lens = np.append(distinct.list.len().to_numpy(), 0).astype(np.int64)
+            dist_ptr = np.concatenate(([0], np.cumsum(dist_lens)))
+            dist_ids = distinct.explode().drop_nulls().replace_strict(lookup, return_dtype=pl.Int32).to_numpy()
+
+            codes = tags.to_physical().fill_null(len(dist_lens) - 1).to_numpy().astype(np.int64)
+            lens = dist_lens[codes]
+            indptr = np.concatenate(([0], np.cumsum(lens)))
+            ids = dist_ids[np.repeat(dist_ptr[codes] - indptr[:-1], lens) + np.arange(indptr[-1])]
+            self._tag_vocab = TagVocab(tuple(tokens.to_list()), indptr, ids.astype(np.int32))
+        return self._tag_vocab
 
 
 class UserDataset(BaseDataset):
@@ -133,5 +903,106 @@ class UserDataset(BaseDataset):
     Dataset for users.
     """
 
-    def __init__(self, csv_file: str):
-        super().__init__(csv_file, User)
+    view_type = UserView
+
+    def __init__(self, csv_file: str, cache: bool = True):
+        super().__init__(csv_file, User, cache)
+
+    def target_matrix(self) -> np.ndarray:
+        """
+        Returns the daily calorie and nutrient targets of every user.
+
+        Returns:
+            np.ndarray: float32 matrix of shape (n_users, 1 + len(NUTRIENTS)),
+                with columns (daily_cal, *NUTRIENTS).
+        """
+        key = ("__target_matrix__", None, np.dtype(np.float32))
+        arr = self._array_cache.get(key)
+        if arr is None:
+            arr = np.hstack(
+                [self.column("daily_cal")[:, None], self.struct_column("daily_nutr", NUTRIENTS)]
+            )
+            self._array_cache[key] = arr
+        return arr
+
+
+# Datasets loaded in this process, keyed by (type, path, mtime, size, cache)
+_DATASETS: dict[tuple, BaseDataset] = {}
+
+D = TypeVar("D", bound=BaseDataset)
+
+
+def _dataset_key(dataset_type: Type[D], csv_file: str, cache: bool, aggregates: str = None) -> tuple:
+    path = os.path.realpath(csv_file)
+    stat = os.stat(path)
+    key = (dataset_type, path, stat.st_mtime_ns, stat.st_size, cache)
+    if aggregates is not None:
+        # Rebuilt aggregates rewrite their meta.json
+        meta = os.path.join(os.path.realpath(aggregates), "meta.json")
+        key += (os.path.dirname(meta), os.stat(meta).st_mtime_ns)
+    return key
+
+
+def load_dataset(
+    dataset_type: Type[D], csv_file: str, cache: bool = True, aggregates: str = None
+) -> D:
+    """
+    Returns a dataset, shared by every caller in the process.
+
+    Datasets are kept in a process-level registry keyed by path and
+    modification time, so repeated env constructions (e.g. several `gym.make`
+    calls) reuse the parsed data and its cached arrays. A file that changed
+    on disk is loaded again.
+
+    Args:
+        dataset_type (Type[D]): MealDataset or UserDataset.
+        csv_file (str): Path to the CSV file.
+        cache (bool): Whether to load through the binary cache. Defaults to True.
+        aggregates (str, optional): Meal aggregates directory (MealDataset
+            only, see MealDataset). Defaults to None.
+
+    Returns:
+        D: Loaded dataset. Treat it as read-only, since it is shared.
+    """
+    key = _dataset_key(dataset_type, csv_file, cache, aggregates)
+    dataset = _DATASETS.get(key)
+    if dataset is None:
+        # Drop older versions of the same file (and aggregates)
+        for old in [k for k in _DATASETS if k[:2] == key[:2] and k[5:6] == key[5:6]]:
+            del _DATASETS[old]
+        if aggregates is None:
+            dataset = dataset_type(csv_file, cache)
+        else:
+            dataset = dataset_type(csv_file, cache, aggregates=aggregates)
+        _DATASETS[key] = dataset
+    return dataset
+
+
+def dataset_len(dataset_type: Type[D], csv_file: str) -> int:
+    """
+    Returns the number of rows of a dataset without loading it if possible:
+    from the registry, else from the binary cache metadata, else by loading it.
+
+    Args:
+        dataset_type (Type[D]): MealDataset or UserDataset.
+        csv_file (str): Path to the CSV file.
+
+    Returns:
+        int: Number of rows.
+    """
+    for cache in (True, False):
+        dataset = _DATASETS.get(_dataset_key(dataset_type, csv_file, cache))
+        if dataset is not None:
+            return len(dataset)
+
+    meta = _cache_meta(csv_file)
+    if meta is not None:
+        return meta["n_rows"]
+    return len(load_dataset(dataset_type, csv_file))
+
+
+def clear_datasets() -> None:
+    """
+    Empties the process-level dataset registry.
+    """
+    _DATASETS.clear()
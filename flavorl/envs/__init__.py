@@ -1 +1,56 @@
-from flavorl.envs.mealrec import MealRec
+from importlib import import_module
+from typing import TYPE_CHECKING
+
+# Public names and their modules. Submodules are imported on first access,
+# so that `gym.make` and vector-env workers only import what they use
+_EXPORTS = {
+    "MealRec": "flavorl.envs.mealrec",
+    "MealRecVec": "flavorl.envs.mealrec_vec",
+    "SharedMealCatalog": "flavorl.envs.catalog",
+    "PhaseProfiler": "flavorl.envs.profiling",
+    "merge_profiles": "flavorl.envs.profiling",
+    "EpisodeSchedule": "flavorl.envs.schedule",
+    "RewardBatch": "flavorl.envs.reward",
+    "RewardEngine": "flavorl.envs.reward",
+    "reward_component": "flavorl.envs.reward",
+    "TrajectoryLogger": "flavorl.envs.trajectory",
+    "LoggedInteractions": "flavorl.envs.replay",
+    "LoggedReplay": "flavorl.envs.replay",
+    "OffPolicyEstimator": "flavorl.envs.replay",
+    "evaluate_policy": "flavorl.envs.replay",
+    "popularity_propensities": "flavorl.envs.replay",
+    "WeeklyPlan": "flavorl.envs.planner",
+    "WeeklyPlanner": "flavorl.envs.planner",
+}
+
+__all__ = list(_EXPORTS)
+
+if TYPE_CHECKING:
+    from flavorl.envs.mealrec import MealRec
+    from flavorl.envs.mealrec_vec import MealRecVec
+    from flavorl.envs.catalog import SharedMealCatalog
+    from flavorl.envs.profiling import PhaseProfiler, merge_profiles
+    from flavorl.envs.schedule import EpisodeSchedule
+    from flavorl.envs.reward import RewardBatch, RewardEngine, reward_component
+    from flavorl.envs.trajectory import TrajectoryLogger
+    from flavorl.envs.replay import (
+        LoggedInteractions,
+        LoggedReplay,
+        OffPolicyEstimator,
+        evaluate_policy,
+        popularity_propensities,
+    )
+    from flavorl.envs.planner import WeeklyPlan, WeeklyPlanner
+
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted([*globals(), *_EXPORTS])
@@ -0,0 +1,103 @@
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from flavorl.dataclasses import MealType
+
+if TYPE_CHECKING:
+    from scipy.spatial import cKDTree
+
+
+class CandidateIndex:
+    """
+    Nearest-neighbour retrieval of candidate meals (a slate) per step.
+
+    Builds one KD-tree per meal type over the meal nutrient vectors
+    (calories, *NUTRIENTS), scaled to unit variance. A slate is the
+    `slate_size` meals of the current meal type closest to the user's
+    remaining needs split evenly over the meals left in the day, preferring
+    meals that satisfy the user's dietary constraints. Actions then index
+    into the slate instead of the whole catalog.
+    """
+
+    def __init__(
+        self,
+        nutrients: np.ndarray,
+        meal_type: np.ndarray,
+        slate_size: int = 16,
+        oversample: int = 4,
+    ) -> None:
+        """
+        Builds the KD-trees.
+
+        Args:
+            nutrients (np.ndarray): (calories, *NUTRIENTS) per meal, shape (n_meals, 4).
+            meal_type (np.ndarray): MealType value per meal, shape (n_meals,).
+            slate_size (int): Meals per slate.
+            oversample (int): Neighbours retrieved per slate entry, so that
+                infeasible meals can be skipped.
+        """
+        from scipy.spatial import cKDTree
+
+        self.slate_size: int = slate_size
+        self.n_meals: int = len(nutrients)
+
+        scale = nutrients.std(axis=0)
+        scale[scale == 0] = 1.0
+        self._scale: np.ndarray = scale.astype(np.float64)
+
+        self._trees: list["cKDTree"] = []
+        self._ids: list[np.ndarray] = []
+        self._k: list[int] = []
+        for t in MealType:
+            ids = np.flatnonzero(meal_type == t.value)
+            if len(ids) == 0:  # no meals of this type: fall back to the whole catalog
+                ids = np.arange(self.n_meals)
+            self._trees.append(cKDTree(nutrients[ids] / self._scale))
+            self._ids.append(ids)
+            self._k.append(min(slate_size * oversample, len(ids)))
+
+    def query(
+        self, remaining: np.ndarray, meal_type: np.ndarray, user_bits: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the slate of each user.
+
+        Args:
+            remaining (np.ndarray): Remaining daily (calories, *NUTRIENTS), shape (k, 4).
+            meal_type (np.ndarray): Current MealType value per user, shape (k,).
+            user_bits (np.ndarray): Packed feasible meals per user (see
+                ConstraintIndex.user_bits), shape (k, n_bytes).
+
+        Returns:
+            tuple:
+                - slates (np.ndarray): Meal indices, shape (k, slate_size), nearest first
+                  among feasible meals, then infeasible ones.
+                - feasible (np.ndarray): Whether each slate meal satisfies the
+                  user's constraints, shape (k, slate_size).
+        """
+        remaining = np.atleast_2d(remaining)
+        user_bits = np.atleast_2d(user_bits)
+        meal_type = np.broadcast_to(meal_type, (len(remaining),))
+        slates = np.empty((len(remaining), self.slate_size), dtype=np.int64)
+        feasible = np.empty((len(remaining), self.slate_size), dtype=np.bool_)
+
+        # Per-meal share of the remaining needs
+        meals_left = (len(MealType) - meal_type)[:, None]
+        points = remaining / meals_left / self._scale
+
+        for t in np.unique(meal_type):
+            rows = np.flatnonzero(meal_type == t)
+            k = self._k[t]
+            _, pos = self._trees[t].query(points[rows], k=k)
+            cand = self._ids[t][pos.reshape(len(rows), k)]
+
+            # Feasible candidates first, keeping distance order
+            ok = ((user_bits[rows[:, None], cand >> 3] >> (7 - (cand & 7))) & 1).astype(np.bool_)
+            order = np.argsort(~ok, axis=1, kind="stable")[:, : self.slate_size]
+            if order.shape[1] < self.slate_size:  # fewer meals than slate entries
+                order = order[:, np.arange(self.slate_size) % order.shape[1]]
+            slates[rows] = np.take_along_axis(cand, order, axis=1)
+            feasible[rows] = np.take_along_axis(ok, order, axis=1)
+
+        return slates, feasible
@@ -0,0 +1,287 @@
+from multiprocessing import resource_tracker, shared_memory
+from typing import TYPE_CHECKING, Sequence
+
+import numpy as np
+
+from flavorl.dataclasses import MealDataset, UserDataset
+from flavorl.envs.constraints import ConstraintIndex
+from flavorl.envs.reward import DEFAULT_WEIGHTS, InteractionAffinity, RewardEngine, TextAffinity
+
+if TYPE_CHECKING:
+    from flavorl.data.interactions import InteractionMatrix
+
+# Byte alignment of every array in the shared block
+_ALIGN = 64
+
+# User columns published by default: ids, the observed diet flags and the
+# default strata of EpisodeSchedule
+USER_COLUMNS = ("user_idx", "vegan", "vegetarian")
+
+
+class CatalogColumns:
+    """
+    Read-only user columns of a catalog, with the `len()` / `column()`
+    interface of BaseDataset used by EpisodeSchedule and the envs.
+    """
+
+    def __init__(self, arrays: dict[str, np.ndarray], n_rows: int) -> None:
+        """
+        Args:
+            arrays (dict[str, np.ndarray]): Column name -> values.
+            n_rows (int): Number of rows.
+        """
+        self.arrays: dict[str, np.ndarray] = arrays
+        self.n_rows: int = n_rows
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def column(self, col: str, dtype: np.dtype = np.float32) -> np.ndarray:
+        """
+        Returns a column, without copying if it is stored with `dtype`.
+
+        Args:
+            col (str): Column name.
+            dtype (np.dtype): Output dtype. Defaults to float32.
+
+        Returns:
+            np.ndarray: Column values, shape (n,).
+        """
+        if col not in self.arrays:
+            raise KeyError(f"Column {col!r} is not published in the catalog (see `user_columns`)")
+        return self.arrays[col].astype(dtype, copy=False)
+
+
+class SharedMealCatalog:
+    """
+    Numeric meal catalog published once to shared memory.
+
+    The parent process builds the meal matrices (calories and nutrients,
+    healthy_score, meal_type), the user targets and diet flags, the dietary
+    constraint bitsets and the reward arrays, and copies them into a single
+    `multiprocessing.shared_memory` block. Pickling a catalog only sends the
+    block name and layout, so env constructors in AsyncVectorEnv /
+    SubprocVecEnv workers attach read-only NumPy views instead of building
+    private copies, and never load the datasets themselves.
+
+    The publishing process owns the block and must call `unlink()` once all
+    workers are done.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, layout: list, owner: bool) -> None:
+        """
+        Wraps an existing shared block. Use `publish` to create one.
+
+        Args:
+            shm (shared_memory.SharedMemory): Shared block holding the arrays.
+            layout (list): (name, dtype, shape, offset) of every array.
+            owner (bool): Whether this process created the block.
+        """
+        self._shm = shm
+        self._layout = layout
+        self._owner = owner
+
+        self.arrays: dict[str, np.ndarray] = {}
+        for name, dtype, shape, offset in layout:
+            arr = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+            arr.flags.writeable = False
+            self.arrays[name] = arr
+
+    @classmethod
+    def publish(
+        cls,
+        meal_dataset: MealDataset,
+        user_dataset: UserDataset,
+        user_columns: Sequence[str] = USER_COLUMNS,
+        text_affinity: bool = True,
+    ) -> "SharedMealCatalog":
+        """
+        Builds the catalog arrays and copies them into a new shared block.
+
+        Publishing runs polars in this process. Envs given the catalog step
+        from its arrays only and do not call polars, so their workers may be
+        started with any start method. Reading dataset-backed attributes in a
+        worker (e.g. `MealRec.user_dataset`, `current_user`, `current_meal`)
+        does load polars there, which deadlocks in a worker forked from this
+        process: start such workers with spawn or forkserver
+        (see flavorl.training.START_METHODS).
+
+        Args:
+            meal_dataset (MealDataset): Meal catalog, e.g. loaded with the
+                meal aggregates (`load_dataset(MealDataset, csv, aggregates=...)`)
+                to publish the precomputed nutrients and healthy_score.
+            user_dataset (UserDataset): Users whose dietary constraints are indexed.
+            user_columns (Sequence[str], optional): User columns published for
+                the envs and their EpisodeSchedule (e.g. extra strata). Must
+                include USER_COLUMNS. Defaults to USER_COLUMNS.
+            text_affinity (bool, optional): Whether to publish the preference
+                text arrays of TextAffinity, needed by envs with a nonzero
+                "preference" weight and no interactions. Defaults to True.
+
+        Returns:
+            SharedMealCatalog: Owning catalog.
+        """
+        missing = set(USER_COLUMNS) - set(user_columns)
+        if missing:
+            raise ValueError(f"user_columns must include {sorted(missing)}")
+
+        constraint_index = ConstraintIndex(meal_dataset, user_dataset)
+        meal_nutr = meal_dataset.nutrient_matrix()
+        healthy_score = meal_dataset.column("healthy_score")
+        user_targets = user_dataset.target_matrix()
+        engine = RewardEngine(meal_nutr, user_targets, healthy_score, constraint_index)
+
+        arrays = {
+            "nutrients": meal_nutr,
+            "healthy_score": healthy_score,
+            "meal_type": meal_dataset.column("meal_type", np.int64),
+            "meal_idx": meal_dataset.column("meal_idx", np.int64),
+            "user_targets": user_targets,
+            **{f"user.{col}": user_dataset.column(col, np.int64) for col in user_columns},
+            "type_bits": constraint_index.type_bits,
+            "feasible_bits": constraint_index.feasible_bits,
+            "user_constraints": constraint_index.user_constraints,
+            **{f"reward.{k}": v for k, v in engine.arrays().items()},
+        }
+        if text_affinity:
+            affinity = TextAffinity(user_dataset, meal_dataset)
+            arrays.update({f"text.{k}": v for k, v in affinity.arrays().items()})
+
+        layout = []
+        size = 0
+        for name, arr in arrays.items():
+            layout.append((name, arr.dtype.str, arr.shape, size))
+            size += -(-arr.nbytes // _ALIGN) * _ALIGN
+
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for name, dtype, shape, offset in layout:
+            np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)[...] = arrays[name]
+
+        return cls(shm, layout, owner=True)
+
+    @classmethod
+    def attach(cls, name: str, layout: list) -> "SharedMealCatalog":
+        """
+        Attaches to a catalog published by another process.
+
+        Args:
+            name (str): Shared block name.
+            layout (list): Array layout of the published catalog.
+
+        Returns:
+            SharedMealCatalog: Read-only, non-owning catalog.
+        """
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Python < 3.13 always registers attached blocks with the resource
+            # tracker, which would unlink them when the worker exits
+            register = resource_tracker.register
+            resource_tracker.register = lambda *args, **kwargs: None
+            try:
+                shm = shared_memory.SharedMemory(name=name)
+            finally:
+                resource_tracker.register = register
+        return cls(shm, layout, owner=False)
+
+    def __reduce__(self):
+        return (SharedMealCatalog.attach, (self._shm.name, self._layout))
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.arrays[name]
+
+    @property
+    def n_meals(self) -> int:
+        return self.arrays["nutrients"].shape[0]
+
+    @property
+    def n_users(self) -> int:
+        return self.arrays["user_targets"].shape[0]
+
+    @property
+    def users(self) -> CatalogColumns:
+        """
+        Published user columns, usable in place of the UserDataset by
+        EpisodeSchedule.
+        """
+        prefix = "user."
+        columns = {k[len(prefix) :]: v for k, v in self.arrays.items() if k.startswith(prefix)}
+        return CatalogColumns(columns, self.n_users)
+
+    def constraint_index(self) -> ConstraintIndex:
+        """
+        Returns a ConstraintIndex backed by the shared bitsets.
+
+        Returns:
+            ConstraintIndex: Constraint index sharing this catalog's memory.
+        """
+        return ConstraintIndex.from_arrays(
+            self.n_meals,
+            self.arrays["type_bits"],
+            self.arrays["feasible_bits"],
+            self.arrays["user_constraints"],
+        )
+
+    def reward_engine(
+        self, weights: dict[str, float] = None, interactions: "InteractionMatrix" = None
+    ) -> RewardEngine:
+        """
+        Returns a RewardEngine backed by the shared arrays, equivalent to
+        `RewardEngine.from_datasets` over the published datasets.
+
+        Args:
+            weights (dict[str, float], optional): Component weights. Defaults to None.
+            interactions (InteractionMatrix, optional): User x meal interactions
+                used as preference affinity. Defaults to None (TextAffinity
+                over the published text arrays).
+
+        Returns:
+            RewardEngine: Engine sharing this catalog's memory.
+        """
+        affinity = None
+        if {**DEFAULT_WEIGHTS, **(weights or {})}["preference"]:
+            if interactions is not None:
+                affinity = InteractionAffinity.from_arrays(
+                    interactions, self.arrays["user.user_idx"], self.arrays["meal_idx"]
+                )
+            elif "text.n_words" in self.arrays:
+                affinity = TextAffinity.from_arrays(
+                    self.arrays["text.user_indptr"],
+                    self.arrays["text.user_words"],
+                    self.arrays["text.meal_keys"],
+                    int(self.arrays["text.n_words"][0]),
+                )
+            else:
+                raise ValueError(
+                    "The catalog was published without text_affinity; pass interactions "
+                    "or a zero 'preference' weight"
+                )
+        return RewardEngine.from_arrays(
+            self.arrays["nutrients"],
+            self.arrays["user_targets"],
+            self.arrays["reward.healthy_score"],
+            self.arrays["reward.target_share"],
+            self.constraint_index(),
+            affinity=affinity,
+            weights=weights,
+        )
+
+    def close(self) -> None:
+        """
+        Releases this process's views of the shared block.
+        """
+        self.arrays = {}
+        try:
+            self._shm.close()
+        except BufferError:
+            # Views still held by live envs; the mapping is released with them
+            pass
+
+    def unlink(self) -> None:
+        """
+        Closes and destroys the shared block. Only valid in the owning process.
+        """
+        if not self._owner:
+            raise RuntimeError("Only the publishing process can unlink the catalog")
+        self.close()
+        self._shm.unlink()
@@ -0,0 +1,157 @@
+import numpy as np
+
+from flavorl.dataclasses import MealDataset, UserDataset, MealType
+
+
+class ConstraintIndex:
+    """
+    Bitset indexes over the meal catalog for dietary constraints.
+
+    Built once per MealDataset. Each constraint (vegan, vegetarian, every
+    allergy and intolerance) is stored as a packed bitset of the meals that
+    satisfy it, so the feasible actions for a user and meal type are a few
+    bitwise ANDs instead of a scan of the catalog.
+
+    Constraints missing from either dataset are not applied.
+    """
+
+    def __init__(self, meal_dataset: MealDataset, user_dataset: UserDataset) -> None:
+        """
+        Builds the meal bitsets and the user constraint matrix.
+
+        Args:
+            meal_dataset (MealDataset): Meal catalog (actions).
+            user_dataset (UserDataset): Users whose constraints are applied.
+        """
+        self.n_meals: int = len(meal_dataset)
+
+        meal_type = meal_dataset.column("meal_type", np.int64)
+        self.type_bits: np.ndarray = np.stack(
+            [self._pack(meal_type == t.value) for t in MealType]
+        )
+
+        meal_cols = meal_dataset.df.columns
+        user_cols = user_dataset.df.columns
+
+        # (user requirement, meals satisfying it) for every applicable constraint
+        user_reqs: list[np.ndarray] = []
+        meal_ok: list[np.ndarray] = []
+
+        if "vegan" in meal_cols and "vegan" in user_cols:
+            user_reqs.append(user_dataset.column("vegan", np.bool_))
+            meal_ok.append(meal_dataset.column("vegan", np.bool_))
+
+        if "vegetarian" in meal_cols and "vegetarian" in user_cols:
+            vegetarian = meal_dataset.column("vegetarian", np.bool_)
+            if "vegan" in meal_cols:
+                vegetarian = vegetarian | meal_dataset.column("vegan", np.bool_)
+            user_reqs.append(user_dataset.column("vegetarian", np.bool_))
+            meal_ok.append(vegetarian)
+
+        for user_col, meal_col in (("allergies", "allergens"), ("intoler", "intoler")):
+            keys = self._shared_keys(user_dataset, user_col, meal_dataset, meal_col)
+            if not keys:
+                continue
+            user_flags = user_dataset.struct_column(user_col, keys, np.bool_)
+            meal_flags = meal_dataset.struct_column(meal_col, keys, np.bool_)
+            for j in range(len(keys)):
+                user_reqs.append(user_flags[:, j])
+                meal_ok.append(~meal_flags[:, j])
+
+        # (n_users, n_constraints) bool, (n_constraints, n_bytes) uint8
+        self.user_constraints: np.ndarray = (
+            np.stack(user_reqs, axis=1)
+            if user_reqs
+            else np.zeros((len(user_dataset), 0), dtype=np.bool_)
+        )
+        self.feasible_bits: np.ndarray = (
+            np.stack([self._pack(ok) for ok in meal_ok])
+            if meal_ok
+            else np.zeros((0, self.type_bits.shape[1]), dtype=np.uint8)
+        )
+
+    @classmethod
+    def from_arrays(
+        cls,
+        n_meals: int,
+        type_bits: np.ndarray,
+        feasible_bits: np.ndarray,
+        user_constraints: np.ndarray,
+    ) -> "ConstraintIndex":
+        """
+        Wraps prebuilt bitsets (e.g. attached from shared memory) without copying.
+
+        Args:
+            n_meals (int): Number of meals in the catalog.
+            type_bits (np.ndarray): Packed meal type bitsets, shape (len(MealType), n_bytes).
+            feasible_bits (np.ndarray): Packed constraint bitsets, shape (n_constraints, n_bytes).
+            user_constraints (np.ndarray): User constraint flags, shape (n_users, n_constraints).
+
+        Returns:
+            ConstraintIndex: Constraint index over the given arrays.
+        """
+        index = cls.__new__(cls)
+        index.n_meals = n_meals
+        index.type_bits = type_bits
+        index.feasible_bits = feasible_bits
+        index.user_constraints = user_constraints
+        return index
+
+    def user_bits(self, users: np.ndarray) -> np.ndarray:
+        """
+        Returns the bitset of meals satisfying the constraints of each user.
+
+        Args:
+            users (np.ndarray): User row indices, shape (k,).
+
+        Returns:
+            np.ndarray: Packed bitsets, shape (k, n_bytes).
+        """
+        users = np.asarray(users, dtype=np.int64)
+        bits = np.full((len(users), self.type_bits.shape[1]), 0xFF, dtype=np.uint8)
+
+        active = self.user_constraints[users]
+        for c in np.flatnonzero(active.any(axis=0)):
+            bits[active[:, c]] &= self.feasible_bits[c]
+
+        return bits
+
+    def mask(self, user_bits: np.ndarray, meal_type: int | np.ndarray) -> np.ndarray:
+        """
+        Returns the action mask for users at the given meal types.
+
+        Users without any feasible meal get an all-True mask, so that masked
+        policies always have a valid action.
+
+        Args:
+            user_bits (np.ndarray): Packed bitsets from `user_bits`, shape (n_bytes,) or (k, n_bytes).
+            meal_type (int | np.ndarray): Meal type value, or one per user.
+
+        Returns:
+            np.ndarray: Boolean mask, shape (n_meals,) or (k, n_meals).
+        """
+        bits = user_bits & self.type_bits[meal_type]
+        mask = np.unpackbits(bits, axis=-1, count=self.n_meals).astype(np.bool_)
+
+        empty = ~mask.any(axis=-1)
+        if np.any(empty):
+            mask[empty] = True
+
+        return mask
+
+    @staticmethod
+    def _pack(flags: np.ndarray) -> np.ndarray:
+        return np.packbits(np.asarray(flags, dtype=np.bool_))
+
+    @staticmethod
+    def _shared_keys(
+        user_dataset: UserDataset, user_col: str, meal_dataset: MealDataset, meal_col: str
+    ) -> list[str]:
+        if user_col not in user_dataset.df.columns or meal_col not in meal_dataset.df.columns:
+            return []
+        user_keys = user_dataset.df.schema[user_col]
+        meal_keys = meal_dataset.df.schema[meal_col]
+        if not (hasattr(user_keys, "fields") and hasattr(meal_keys, "fields")):
+            return []
+        meal_names = {f.name for f in meal_keys.fields}
+        return [f.name for f in user_keys.fields if f.name in meal_names]
@@ -1,26 +1,164 @@
+from typing import TYPE_CHECKING
+
 import numpy as np
 
 import gymnasium as gym
 from gymnasium import spaces
 
-from flavorl.dataclasses import User, Meal, UserDataset, MealDataset, MealType, Day
+from flavorl.dataclasses import (
+    UserView,
+    MealView,
+    UserDataset,
+    MealDataset,
+    MealType,
+    Day,
+    dataset_len,
+    load_dataset,
+)
+from flavorl.envs.candidates import CandidateIndex
+from flavorl.envs.catalog import CatalogColumns, SharedMealCatalog
+from flavorl.envs.constraints import ConstraintIndex
+from flavorl.envs.profiling import PhaseProfiler
+from flavorl.envs.reward import RewardBatch, RewardEngine
+from flavorl.envs.schedule import EpisodeSchedule
+
+if TYPE_CHECKING:
+    from flavorl.data.interactions import InteractionMatrix
 
 # --- TODO: determine dimensions ---
 OBS_SPACE_DIM = 10  # n_features
-ACTION_SPACE_DIM = 5  # n_meals
 MAX_EPISODE_STEPS = 21  # 3 meals x 7 days
 
+# Methods timed when profiling, and their phase names
+PROFILED_METHODS = {
+    "_get_next_observation": "observation",
+    "_compute_reward": "reward",
+    "_check_termination": "termination",
+    "action_masks": "action_mask",
+    "_update_slate": "slate",
+}
+
+# Field layout of the flat observation vector (obs_mode="flat")
+FLAT_OBS_FIELDS = (
+    "day",  # 0: Day value
+    "meal_type",  # 1: MealType value
+    "rem_cal",  # 2: remaining daily calories
+    "rem_prot",  # 3: remaining daily protein
+    "rem_ch",  # 4: remaining daily carbohydrates
+    "rem_fib",  # 5: remaining daily fiber
+    "user_vegan",  # 6: 1.0 if the user is vegan
+    "user_vegetarian",  # 7: 1.0 if the user is vegetarian
+)
+FLAT_REM = slice(2, 6)  # (rem_cal, *NUTRIENTS), same order as the nutrient matrices
+DICT_REM = ("rem_cal", "rem_prot", "rem_ch", "rem_fib")  # same fields in the dict observation
+FLAT_SLATE = slice(len(FLAT_OBS_FIELDS), None)  # (calories, *NUTRIENTS) of each slate meal
+SLATE_FEATURES = 4
+
+
+# Fixed-size record of the episode state (see MealRec.get_state)
+STATE_DTYPE = np.dtype(
+    [
+        ("user", np.int64),  # user row
+        ("step", np.int64),
+        ("day", np.int64),  # Day value
+        ("meal_type", np.int64),  # MealType value
+        ("remaining", np.float64, (len(DICT_REM),)),  # remaining daily (calories, *NUTRIENTS)
+        ("history", np.int64, (MAX_EPISODE_STEPS,)),  # meals recommended so far, -1 padded
+        ("rng", np.uint64, (6,)),  # PCG64 state: state (hi, lo), inc (hi, lo), has_uint32, uinteger
+    ]
+)
+
+_MASK64 = (1 << 64) - 1
+
+
+def rng_state_words(rng: np.random.Generator) -> np.ndarray:
+    """
+    Packs the state of a PCG64 generator into 6 uint64 words (see STATE_DTYPE).
+    """
+    state = rng.bit_generator.state
+    if state["bit_generator"] != "PCG64":
+        raise ValueError(f"Unsupported bit generator: {state['bit_generator']}")
+    s, inc = state["state"]["state"], state["state"]["inc"]
+    return np.array(
+        [s >> 64, s & _MASK64, inc >> 64, inc & _MASK64, state["has_uint32"], state["uinteger"]],
+        dtype=np.uint64,
+    )
+
+
+def set_rng_state_words(rng: np.random.Generator, words: np.ndarray) -> None:
+    """
+    Restores the state of a PCG64 generator from `rng_state_words`.
+    """
+    w = [int(x) for x in words]
+    rng.bit_generator.state = {
+        "bit_generator": "PCG64",
+        "state": {"state": (w[0] << 64) | w[1], "inc": (w[2] << 64) | w[3]},
+        "has_uint32": w[4],
+        "uinteger": w[5],
+    }
+
+
+def flat_observation_space(shape: tuple = (), slate_size: int = 0) -> spaces.Box:
+    """
+    Returns the Box space of flat observations.
+
+    Args:
+        shape (tuple): Leading batch shape. Defaults to a single observation.
+        slate_size (int): Candidate slate size; its features are appended
+            after FLAT_OBS_FIELDS. Defaults to 0 (no slate).
+
+    Returns:
+        spaces.Box: float32 space of shape
+            (*shape, len(FLAT_OBS_FIELDS) + slate_size * SLATE_FEATURES).
+    """
+    n_slate = slate_size * SLATE_FEATURES
+    low = np.array(
+        [0, 0, -np.inf, -np.inf, -np.inf, -np.inf, 0, 0] + [0] * n_slate, dtype=np.float32
+    )
+    high = np.array(
+        [len(Day) - 1, len(MealType) - 1, np.inf, np.inf, np.inf, np.inf, 1, 1]
+        + [np.inf] * n_slate,
+        dtype=np.float32,
+    )
+    full_shape = (*shape, len(FLAT_OBS_FIELDS) + n_slate)
+    return spaces.Box(
+        low=np.broadcast_to(low, full_shape),
+        high=np.broadcast_to(high, full_shape),
+        dtype=np.float32,
+    )
+
 
 class MealRec(gym.Env):
     """
     Gym environment for a meal recommendation system.
 
     Simulates recommending meals to users over multiple days and meal times.
+
+    Datasets are loaded on the first reset, through the process-level
+    registry (see `load_dataset`), so constructing the env is cheap and envs
+    of the same process share the parsed data. With a SharedMealCatalog the
+    datasets are not loaded at all: every array comes from the catalog, and
+    only `user_dataset`, `meal_dataset`, `current_user` and `current_meal`
+    load them when read.
     """
 
     metadata = {"render_modes": ["human"]}
 
-    def __init__(self, user_csv: str, meal_csv: str, render_mode: str = None):
+    def __init__(
+        self,
+        user_csv: str,
+        meal_csv: str,
+        render_mode: str = None,
+        obs_mode: str = "dict",
+        catalog: SharedMealCatalog = None,
+        profile: bool = False,
+        schedule: str | EpisodeSchedule = "uniform",
+        slate_size: int = None,
+        reward_weights: dict[str, float] = None,
+        interactions: "InteractionMatrix" = None,
+        reuse_obs_buffer: bool = False,
+        meal_aggregates: str = None,
+    ):
         """
         Initializes the MealRec environment.
 
@@ -28,44 +166,212 @@ class MealRec(gym.Env):
             user_csv (str): Path to the CSV file containing user data.
             meal_csv (str): Path to the CSV file containing meal data.
             render_mode (str, optional): Render mode. Defaults to None.
+            obs_mode (str, optional): "dict" for a spaces.Dict observation, or
+                "flat" for a float32 Box laid out as FLAT_OBS_FIELDS. Defaults to "dict".
+            catalog (SharedMealCatalog, optional): Catalog published to shared
+                memory for these datasets. When given, the meal and user
+                arrays, constraint bitsets and reward arrays are attached
+                instead of built, and the datasets are not loaded. Defaults to None.
+            profile (bool, optional): Whether to record time and calls per step
+                phase (see `get_profile`). Defaults to False.
+            schedule (str | EpisodeSchedule, optional): Order in which users
+                are assigned to episodes: a mode name ("uniform", "stratified")
+                or a configured EpisodeSchedule (e.g. a fixed evaluation list).
+                Defaults to "uniform".
+            slate_size (int, optional): If given, each step offers a slate of
+                this many meals near the user's remaining needs (see
+                CandidateIndex); actions index into the slate and the slate
+                features are part of the observation. Defaults to None (the
+                action is a meal index of the whole catalog).
+            reward_weights (dict[str, float], optional): Weight of each reward
+                component (see flavorl.envs.reward), overriding the defaults.
+                Per-component values are returned in info["reward_components"].
+                Defaults to None.
+            interactions (InteractionMatrix, optional): User x meal interactions
+                (see flavorl.data.interactions) used as preference affinity by
+                the reward. Defaults to None (preference text).
+            reuse_obs_buffer (bool, optional): Whether flat observations are
+                returned as the env's preallocated buffer, which is overwritten
+                by the next reset/step, instead of a copy. Saves one allocation
+                per step for callers that consume the observation right away;
+                breaks callers that keep it (e.g. gymnasium's check_env).
+                Defaults to False.
+            meal_aggregates (str, optional): Meal aggregates directory built
+                by flavorl.data.meals (the meal_aggregates build stage), whose
+                calories, nutrients and healthy_score replace those of the
+                meal CSV (see MealDataset). Defaults to None.
         """
+        if obs_mode not in ("dict", "flat"):
+            raise ValueError(f"Invalid obs_mode: {obs_mode}")
+
         self.render_mode: str = render_mode
+        self.obs_mode: str = obs_mode
+        self.reuse_obs_buffer: bool = reuse_obs_buffer
 
-        self.user_dataset: UserDataset = UserDataset(user_csv)
-        self.meal_dataset: MealDataset = MealDataset(meal_csv)
+        self.user_csv: str = user_csv
+        self.meal_csv: str = meal_csv
+        self.meal_aggregates: str = meal_aggregates
+        self._user_dataset: UserDataset = None
+        self._meal_dataset: MealDataset = None
+
+        # Users are drawn from np_random in blocks and consumed across resets
+        if isinstance(schedule, str):
+            schedule = EpisodeSchedule(schedule)
+        self.schedule: EpisodeSchedule = schedule
 
-        self.current_user: User = None
-        self.current_meal: Meal = None
         self.current_day: Day = None
         self.current_mealtype: MealType = None
         self.current_step: int = 0
-        self.current_obs: dict = None
+        self.current_obs: dict | np.ndarray = None
+
+        # Catalog structures, built from the datasets on the first reset (see `_load`)
+        self._catalog: SharedMealCatalog = catalog
+        self._reward_weights: dict[str, float] = reward_weights
+        self._interactions: "InteractionMatrix" = interactions
+        self._meal_nutr: np.ndarray = None  # (calories, *NUTRIENTS) per meal
+        self._user_targets: np.ndarray = None  # daily (calories, *NUTRIENTS) per user
+        self._users: UserDataset | CatalogColumns = None  # user columns, for the schedule
+        self._user_ids: np.ndarray = None
+        self._user_vegan: np.ndarray = None
+        self._user_vegetarian: np.ndarray = None
+        self.constraint_index: ConstraintIndex = None
+        self.reward_engine: RewardEngine = None
+        self.candidates: CandidateIndex = None
+
+        # Current user's targets and constraint bits
+        self._targets: np.ndarray = None
+        self._user_bits: np.ndarray = None
+        self._obs_buf: np.ndarray = np.zeros(
+            len(FLAT_OBS_FIELDS) + (slate_size or 0) * SLATE_FEATURES, dtype=np.float32
+        )
+
+        self._user_row: int = None
+        self._history: np.ndarray = np.full((1, MAX_EPISODE_STEPS), -1, dtype=np.int64)
+
+        # Candidate slate over the catalog, rebuilt every step
+        self.slate_size: int = slate_size
+        self.slate: np.ndarray = None
+        self._slate_ok: np.ndarray = None
 
         # --- TODO: confirm obs data ---
-        self.observation_space = spaces.Dict(
-            {
-                "day": spaces.Discrete(7),
-                "meal_type": spaces.Discrete(3),
-                "rem_cal": spaces.Box(low=0, high=100, shape=(1,), dtype=np.float32),
-                "rem_prot": spaces.Box(low=0, high=100, shape=(1,), dtype=np.float32),
-                "rem_ch": spaces.Box(low=0, high=100, shape=(1,), dtype=np.float32),
-                "rem_fib": spaces.Box(low=0, high=100, shape=(1,), dtype=np.float32),
-                # --- TODO: complete ... ---
-                "user_vegan": spaces.Discrete(2),
-                "user vegetarian": spaces.Discrete(2),
-            }
-        )
+        if obs_mode == "flat":
+            self.observation_space = flat_observation_space(slate_size=slate_size or 0)
+        else:
+            self.observation_space = spaces.Dict(
+                {
+                    "day": spaces.Discrete(7),
+                    "meal_type": spaces.Discrete(3),
+                    "rem_cal": spaces.Box(low=0, high=100, shape=(1,), dtype=np.float32),
+                    "rem_prot": spaces.Box(low=0, high=100, shape=(1,), dtype=np.float32),
+                    "rem_ch": spaces.Box(low=0, high=100, shape=(1,), dtype=np.float32),
+                    "rem_fib": spaces.Box(low=0, high=100, shape=(1,), dtype=np.float32),
+                    # --- TODO: complete ... ---
+                    "user_vegan": spaces.Discrete(2),
+                    "user vegetarian": spaces.Discrete(2),
+                }
+            )
+            if slate_size is not None:
+                self.observation_space["slate"] = spaces.Box(
+                    low=0, high=np.inf, shape=(slate_size, SLATE_FEATURES), dtype=np.float32
+                )
+
+        # One action per meal in the dataset, or per slate entry. The number
+        # of meals is read without loading the dataset when possible
+        n_meals = catalog.n_meals if catalog is not None else dataset_len(MealDataset, meal_csv)
+        self.action_space = spaces.Discrete(slate_size or n_meals)
+
+        self._profiler: PhaseProfiler = None
+        if profile:
+            self._profiler = PhaseProfiler(PROFILED_METHODS.values())
+            self._profiler.instrument(self, PROFILED_METHODS)
+
+    @property
+    def user_dataset(self) -> UserDataset:
+        if self._user_dataset is None:
+            self._user_dataset = load_dataset(UserDataset, self.user_csv)
+        return self._user_dataset
+
+    @property
+    def meal_dataset(self) -> MealDataset:
+        if self._meal_dataset is None:
+            self._meal_dataset = load_dataset(
+                MealDataset, self.meal_csv, aggregates=self.meal_aggregates
+            )
+        return self._meal_dataset
+
+    @property
+    def current_user(self) -> UserView:
+        """
+        Current user, as a view of its dataset row (loads the user dataset).
+        """
+        if self._user_row is None:
+            return None
+        return self.user_dataset.get(self._user_row)
+
+    @property
+    def current_user_idx(self) -> int:
+        """
+        user_idx of the current user, read without loading the user dataset.
+        """
+        if self._user_row is None:
+            return None
+        return int(self._user_ids[self._user_row])
+
+    @property
+    def current_meal(self) -> MealView:
+        """
+        Last recommended meal of the episode, as a view of its dataset row
+        (loads the meal dataset).
+        """
+        if not self.current_step:
+            return None
+        return self._get_dataset_meal(int(self._history[0, self.current_step - 1]))
 
-        self.action_space = spaces.Discrete(ACTION_SPACE_DIM)
+    def _load(self) -> None:
+        """
+        Builds the catalog structures (nutrient matrix, user arrays, constraint
+        bitsets, reward engine, candidate index) from the datasets, or attaches
+        them from the shared catalog without loading the datasets.
+        """
+        catalog = self._catalog
+        if catalog is not None:
+            self._users = catalog.users
+            self._meal_nutr = catalog["nutrients"]
+            self._user_targets = catalog["user_targets"]
+            self.constraint_index = catalog.constraint_index()
+            self.reward_engine = catalog.reward_engine(self._reward_weights, self._interactions)
+            meal_type = catalog["meal_type"]
+        else:
+            self._users = self.user_dataset
+            self._meal_nutr = self.meal_dataset.nutrient_matrix()
+            self._user_targets = self.user_dataset.target_matrix()
+            self.constraint_index = ConstraintIndex(self.meal_dataset, self.user_dataset)
+            self.reward_engine = RewardEngine.from_datasets(
+                self.meal_dataset,
+                self.user_dataset,
+                self.constraint_index,
+                self._reward_weights,
+                self._interactions,
+            )
+            meal_type = self.meal_dataset.column("meal_type", np.int64)
+
+        self._user_ids = self._users.column("user_idx", np.int64)
+        self._user_vegan = self._users.column("vegan", np.int64)
+        self._user_vegetarian = self._users.column("vegetarian", np.int64)
+
+        if self.slate_size is not None:
+            self.candidates = CandidateIndex(self._meal_nutr, meal_type, self.slate_size)
 
     def reset(self, seed: int = None, options: dict = None):
         """
         Resets the environment to start a new episode.
 
-        Samples a new user and initializes observation, day, and meal indices.
+        Takes the next user of the schedule and initializes observation, day,
+        and meal indices.
 
         Args:
-            seed (int, optional): Random seed for reproducibility. Defaults to None.
+            seed (int, optional): Random seed for reproducibility. Seeding also
+                restarts the schedule. Defaults to None.
             options (dict, optional): Additional options for reset. Defaults to None.
 
         Returns:
@@ -74,42 +380,80 @@ class MealRec(gym.Env):
                 - info (dict): Additional information.
         """
         super().reset(seed=seed)
+        if seed is not None:
+            self.schedule.restart()
+
+        if self.reward_engine is None:
+            self._load()
+
+        # Next user of the schedule
+        user_row = self.schedule.take(self._users, self.np_random)[0]
+        return self._start_episode(user_row)
+
+    def _start_episode(self, user_row: int):
+        """
+        Starts an episode for a given user.
+
+        Args:
+            user_row (int): User row index.
+
+        Returns:
+            tuple: Initial observation and info, as returned by `reset`.
+        """
+        if self.reward_engine is None:
+            self._load()
 
         self.current_step = 0
         self.current_day = Day.MONDAY
         self.current_mealtype = MealType.BREAKFAST
 
-        # Sample new user
-        self.current_user = self.user_dataset.sample()
+        self._history[:] = -1
+        self._set_user(user_row)
+
+        if self.obs_mode == "flat":
+            self.current_obs = self._obs_buf
+            self.current_obs[:] = 0.0
+            self.current_obs[FLAT_REM] = self._targets
+            self.current_obs[6] = self._user_vegan[user_row]
+            self.current_obs[7] = self._user_vegetarian[user_row]
+            self._update_slate()
+            return self._observation(), self._get_reset_info()
 
         # Initialize observation dictionary
         # --- TODO: confirm obs data ---
         self.current_obs = {
             "day": self.current_day.value,
             "meal_type": self.current_mealtype.value,
-            "rem_cal": self.current_user.daily_cal,
-            "rem_prot": self.current_user.daily_nutr["protein"],
-            "rem_ch": self.current_user.daily_nutr["ch"],
-            "rem_fib": self.current_user.daily_nutr["fib"],
+            **self._get_daily_targets(),
             # --- TODO: complete ... ---
-            "user_vegan": self.current_user.vegan,
-            "user vegetarian": self.current_user.vegetarian,
+            "user_vegan": bool(self._user_vegan[user_row]),
+            "user vegetarian": bool(self._user_vegetarian[user_row]),
         }
+        self._update_slate()
 
-        info = {
+        return self.current_obs, self._get_reset_info()
+
+    def _get_reset_info(self) -> dict:
+        """
+        Returns the info dictionary of a reset.
+
+        Returns:
+            dict: Additional information.
+        """
+        return {
             "step": self.current_step,
             "day": self.current_day.name,
             "meal_type": self.current_mealtype.name,
+            "action_mask": self.action_masks(),
         }
 
-        return self.current_obs, info
-
     def step(self, action: int):
         """
         Takes an action in the environment and returns the next state.
 
         Args:
-            action (int): Action chosen by the agent.
+            action (int): Action chosen by the agent: a meal index, or a slate
+                position if slate_size is set.
 
         Returns:
             tuple:
@@ -121,14 +465,20 @@ class MealRec(gym.Env):
         """
         assert self.action_space.contains(action), f"Invalid action: {action}"
 
-        self.current_obs = self._get_next_observation(action)
+        meal_idx = int(self.slate[action]) if self.slate_size is not None else action
+        remaining = self._remaining().copy()
+        meal_type = self.current_mealtype.value
+
+        self.current_obs = self._get_next_observation(meal_idx)
+        self._update_slate()
+
+        self.current_step += 1
 
         terminated = self._check_termination()
         truncated = self.current_step >= MAX_EPISODE_STEPS
 
-        reward = self._compute_reward()
-
-        self.current_step += 1
+        reward, components = self._compute_reward(meal_idx, remaining, meal_type)
+        self._history[0, self.current_step - 1] = meal_idx
 
         info = {
             "step": self.current_step,
@@ -136,9 +486,124 @@ class MealRec(gym.Env):
             "meal_type": self.current_mealtype.name,
             "terminated": terminated,
             "truncated": truncated,
+            "action_mask": self.action_masks(),
+            "reward_components": components,
         }
 
-        return self.current_obs, reward, terminated, truncated, info
+        return self._observation(), reward, terminated, truncated, info
+
+    def get_state(self) -> np.ndarray:
+        """
+        Returns a snapshot of the episode state, e.g. to branch rollouts from it.
+
+        The snapshot is a small STATE_DTYPE record (user row, step, day, meal
+        type, remaining needs, meal history and RNG state); datasets and
+        catalog structures are not copied. The user schedule is not part of
+        it, since it only affects the next reset.
+
+        Returns:
+            np.ndarray: 0-d STATE_DTYPE array.
+        """
+        state = np.zeros((), dtype=STATE_DTYPE)
+        state["user"] = self._user_row
+        state["step"] = self.current_step
+        state["day"] = self.current_day.value
+        state["meal_type"] = self.current_mealtype.value
+        if self.obs_mode == "flat":
+            state["remaining"] = self.current_obs[FLAT_REM]
+        else:
+            state["remaining"] = [self.current_obs[k] for k in DICT_REM]
+        state["history"] = self._history[0]
+        state["rng"] = rng_state_words(self.np_random)
+        return state
+
+    def set_state(self, state: np.ndarray) -> dict | np.ndarray:
+        """
+        Restores a snapshot from `get_state` (of this env or of any env over
+        the same datasets, e.g. a row of MealRecVec.get_states).
+
+        Args:
+            state (np.ndarray): STATE_DTYPE record.
+
+        Returns:
+            dict | np.ndarray: Observation of the restored state.
+        """
+        if self.reward_engine is None:
+            self._load()
+
+        user_row = int(state["user"])
+        if user_row != self._user_row:
+            self._set_user(user_row)
+
+        self.current_step = int(state["step"])
+        self.current_day = Day(int(state["day"]))
+        self.current_mealtype = MealType(int(state["meal_type"]))
+        self._history[0] = state["history"]
+        set_rng_state_words(self.np_random, state["rng"])
+
+        if self.obs_mode == "flat":
+            self.current_obs = self._obs_buf
+            self.current_obs[0] = self.current_day.value
+            self.current_obs[1] = self.current_mealtype.value
+            self.current_obs[FLAT_REM] = state["remaining"]
+            self.current_obs[6] = self._user_vegan[user_row]
+            self.current_obs[7] = self._user_vegetarian[user_row]
+        else:
+            self.current_obs = {
+                "day": self.current_day.value,
+                "meal_type": self.current_mealtype.value,
+                **dict(zip(DICT_REM, state["remaining"].tolist())),
+                "user_vegan": bool(self._user_vegan[user_row]),
+                "user vegetarian": bool(self._user_vegetarian[user_row]),
+            }
+        self._update_slate()
+        return self._observation()
+
+    def action_masks(self) -> np.ndarray:
+        """
+        Returns the meals that are feasible for the current user and meal type.
+
+        Compatible with sb3-contrib's MaskablePPO.
+
+        Returns:
+            np.ndarray: Boolean mask over the action space.
+        """
+        if self.slate_size is not None:
+            return self._slate_ok if self._slate_ok.any() else np.ones_like(self._slate_ok)
+        return self.constraint_index.mask(self._user_bits, self.current_mealtype.value)
+
+    def get_profile(self, reset: bool = False) -> dict:
+        """
+        Returns the cumulative time and calls of each phase.
+
+        Phases do not call each other, so their times add up to the profiled
+        part of reset/step.
+        Use `merge_profiles` to aggregate profiles from vector-env workers.
+
+        Args:
+            reset (bool, optional): Whether to zero the counters afterwards. Defaults to False.
+
+        Returns:
+            dict: {phase: {"ns": total_ns, "calls": n_calls}}, empty if profiling is disabled.
+        """
+        if self._profiler is None:
+            return {}
+        profile = self._profiler.snapshot()
+        if reset:
+            self._profiler.reset()
+        return profile
+
+    def __getstate__(self) -> dict:
+        # Timed wrappers are bound to this instance; rebuild them on copies
+        state = self.__dict__.copy()
+        for method in PROFILED_METHODS:
+            state.pop(method, None)
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        if self._profiler is not None:
+            self._profiler.instrument(self, PROFILED_METHODS)
 
     def render(self) -> None:
         """
@@ -159,28 +624,105 @@ class MealRec(gym.Env):
         Returns the next observation.
 
         Returns:
-            np.array: next observation.
+            dict | np.ndarray: next observation (np.ndarray if obs_mode is "flat").
         """
 
-        obs = self.current_obs.deepcopy()
+        # Update time variables
+        self.current_mealtype = MealType((self.current_mealtype.value + 1) % len(MealType))
+        new_day = self.current_mealtype == MealType.BREAKFAST
+        if new_day:
+            self.current_day = Day((self.current_day.value + 1) % len(Day))
 
-        # Update obs time variables
-        obs["day"] = Day((self.current_day.value + 1) % len(Day))
-        obs["meal_type"] = MealType((self.current_mealtype.value + 1) % len(MealType))
+        if self.obs_mode == "flat":
+            obs = self._obs_buf
+            if new_day:
+                obs[FLAT_REM] = self._targets
+            else:
+                obs[FLAT_REM] -= self._meal_nutr[action]
+            obs[0] = self.current_day.value
+            obs[1] = self.current_mealtype.value
+            return obs
 
-        # Update remaining calories / nutrients
-        self.current_meal = self._get_dataset_meal(action)
+        obs = dict(self.current_obs)
 
-        obs["rem_cal"] -= self.current_meal.calories
-        obs["rem_prot"] -= self.current_meal.nutrients["prot"]
-        obs["rem_ch"] -= self.current_meal.nutrients["ch"]
-        obs["rem_fib"] -= self.current_meal.nutrients["fib"]
+        # Update remaining calories / nutrients, in (calories, *NUTRIENTS) order
+        for key, value in zip(DICT_REM, self._meal_nutr[action].tolist()):
+            obs[key] -= value
+
+        # Refill the daily targets on a new day
+        if new_day:
+            obs.update(self._get_daily_targets())
+
+        obs["day"] = self.current_day.value
+        obs["meal_type"] = self.current_mealtype.value
 
         # --- TODO: complete obs ---
         # ...
 
         return obs
 
+    def _observation(self) -> dict | np.ndarray:
+        """
+        Returns the current observation as handed to the caller: in flat
+        mode, a copy of the buffer unless reuse_obs_buffer is set.
+
+        Returns:
+            dict | np.ndarray: Current observation.
+        """
+        if self.obs_mode == "flat" and not self.reuse_obs_buffer:
+            return self.current_obs.copy()
+        return self.current_obs
+
+    def _set_user(self, user_row: int) -> None:
+        """
+        Makes `user_row` the current user: its targets and constraint bits.
+        """
+        self._user_row = user_row
+        self._user_bits = self.constraint_index.user_bits([user_row])[0]
+        self._targets = self._user_targets[user_row]
+
+    def _remaining(self) -> np.ndarray:
+        """
+        Returns the remaining daily (calories, *NUTRIENTS) of the current observation.
+
+        Returns:
+            np.ndarray: float32 vector (a view of the buffer in flat mode).
+        """
+        if self.obs_mode == "flat":
+            return self.current_obs[FLAT_REM]
+        return np.array(
+            [self.current_obs[k] for k in DICT_REM],
+            dtype=np.float32,
+        ).reshape(-1)
+
+    def _update_slate(self) -> None:
+        """
+        Retrieves the slate for the current state and adds its features to
+        the current observation. Does nothing without a slate.
+        """
+        if self.slate_size is None:
+            return
+
+        slates, feasible = self.candidates.query(
+            self._remaining(), self.current_mealtype.value, self._user_bits
+        )
+        self.slate, self._slate_ok = slates[0], feasible[0]
+
+        features = self._meal_nutr[self.slate]
+        if self.obs_mode == "flat":
+            self.current_obs[FLAT_SLATE] = features.reshape(-1)
+        else:
+            self.current_obs["slate"] = features
+
+    def _get_daily_targets(self) -> dict:
+        """
+        Returns the current user's daily calorie and nutrient targets.
+
+        Returns:
+            dict: remaining calories / nutrients at the start of a day.
+        """
+        return dict(zip(DICT_REM, self._targets.tolist()))
+
     def _check_termination(self) -> bool:
         """
         Checks if the episode should terminate.
@@ -191,17 +733,34 @@ class MealRec(gym.Env):
         # --- TODO: implement termination logic ---
         return False
 
-    def _compute_reward(self) -> float:
+    def _compute_reward(
+        self, meal_idx: int, remaining: np.ndarray, meal_type: int
+    ) -> tuple[float, dict]:
         """
         Computes the reward for the current step.
 
+        Args:
+            meal_idx (int): Recommended meal.
+            remaining (np.ndarray): Remaining daily (calories, *NUTRIENTS) before the meal.
+            meal_type (int): MealType value the meal was recommended for.
+
         Returns:
-            float: Reward value.
+            tuple:
+                - reward (float): Reward value.
+                - components (dict): Unweighted value of each reward component.
         """
-        # --- TODO: implement reward computation ---
-        return 0.0
+        reward, components = self.reward_engine.compute(
+            RewardBatch(
+                users=np.array([self._user_row]),
+                meals=np.array([meal_idx]),
+                remaining=remaining[None],
+                meal_type=np.array([meal_type]),
+                history=self._history,
+            )
+        )
+        return float(reward[0]), {k: float(v[0]) for k, v in components.items()}
 
-    def _get_dataset_meal(self, meal_idx: int) -> Meal:
+    def _get_dataset_meal(self, meal_idx: int) -> MealView:
         """
         Looks for a given meal in the MealDataset
 
@@ -209,8 +768,6 @@ class MealRec(gym.Env):
             meal_idx (int): meal index.
 
         Return:
-            Meal: corresponding meal.
+            MealView: corresponding meal (a view of its dataset row).
         """
-
-        # --- TODO: implement meal search ---
-        raise NotImplementedError
+        return self.meal_dataset.get(meal_idx)
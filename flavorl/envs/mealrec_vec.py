@@ -0,0 +1,519 @@
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from gymnasium import spaces
+from gymnasium.vector import AutoresetMode, VectorEnv
+from gymnasium.vector.utils import batch_space
+
+from flavorl.dataclasses import UserDataset, MealDataset, MealType, Day, load_dataset
+from flavorl.envs.candidates import CandidateIndex
+from flavorl.envs.catalog import CatalogColumns, SharedMealCatalog
+from flavorl.envs.constraints import ConstraintIndex
+from flavorl.envs.profiling import PhaseProfiler
+from flavorl.envs.reward import RewardBatch, RewardEngine
+from flavorl.envs.schedule import EpisodeSchedule
+from flavorl.envs.mealrec import (
+    MAX_EPISODE_STEPS,
+    FLAT_OBS_FIELDS,
+    FLAT_REM,
+    FLAT_SLATE,
+    SLATE_FEATURES,
+    STATE_DTYPE,
+    flat_observation_space,
+    rng_state_words,
+)
+
+if TYPE_CHECKING:
+    from flavorl.data.interactions import InteractionMatrix
+
+
+# Methods timed when profiling, and their phase names
+PROFILED_METHODS = {
+    "_reset_slots": "reset",
+    "_get_obs": "observation",
+    "_compute_rewards": "reward",
+    "_check_terminations": "termination",
+    "action_masks": "action_mask",
+    "_update_slates": "slate",
+}
+
+
+class MealRecVec(VectorEnv):
+    """
+    Vectorized version of the MealRec environment.
+
+    Steps `num_envs` users in lockstep. Per-env state is kept in contiguous
+    NumPy arrays, so a batch of actions is applied with a single nutrient
+    subtraction instead of one Python call per env. Episodes never
+    terminate: as in MealRec, they are truncated after MAX_EPISODE_STEPS.
+    Finished slots are reset on the next step (Gymnasium's NEXT_STEP
+    autoreset mode).
+
+    All slots draw from one generator (`np_random`), so the env is seeded
+    with a single seed rather than one per env.
+    """
+
+    metadata = {"render_modes": [], "autoreset_mode": AutoresetMode.NEXT_STEP}
+
+    def __init__(
+        self,
+        num_envs: int,
+        user_csv: str,
+        meal_csv: str,
+        render_mode: str = None,
+        obs_mode: str = "dict",
+        catalog: SharedMealCatalog = None,
+        profile: bool = False,
+        schedule: str | EpisodeSchedule = "uniform",
+        slate_size: int = None,
+        reward_weights: dict[str, float] = None,
+        interactions: "InteractionMatrix" = None,
+        reuse_obs_buffer: bool = False,
+        meal_aggregates: str = None,
+    ):
+        """
+        Initializes the vectorized MealRec environment.
+
+        Args:
+            num_envs (int): Number of users stepped in parallel.
+            user_csv (str): Path to the CSV file containing user data.
+            meal_csv (str): Path to the CSV file containing meal data.
+            render_mode (str, optional): Render mode. Defaults to None.
+            obs_mode (str, optional): "dict" or "flat", as in MealRec. Flat
+                observations are (num_envs, len(FLAT_OBS_FIELDS)) arrays.
+                Defaults to "dict".
+            catalog (SharedMealCatalog, optional): Shared catalog, as in
+                MealRec: the datasets are not loaded. Defaults to None.
+            profile (bool, optional): Whether to record time and calls per
+                phase, as in MealRec. Defaults to False.
+            schedule (str | EpisodeSchedule, optional): User schedule shared by
+                all slots, as in MealRec. Defaults to "uniform".
+            slate_size (int, optional): Candidate slate size, as in MealRec.
+                Defaults to None.
+            reward_weights (dict[str, float], optional): Reward component
+                weights, as in MealRec. Defaults to None.
+            interactions (InteractionMatrix, optional): User x meal
+                interactions, as in MealRec. Defaults to None.
+            reuse_obs_buffer (bool, optional): Whether flat observations are
+                returned as the preallocated batch buffer, overwritten by the
+                next reset/step, instead of a copy, as in MealRec. Defaults to False.
+            meal_aggregates (str, optional): Precomputed meal aggregates, as in
+                MealRec. Defaults to None.
+        """
+        if obs_mode not in ("dict", "flat"):
+            raise ValueError(f"Invalid obs_mode: {obs_mode}")
+
+        self.num_envs: int = num_envs
+        self.render_mode: str = render_mode
+        self.obs_mode: str = obs_mode
+        self.reuse_obs_buffer: bool = reuse_obs_buffer
+
+        # Shared with other envs of the process (see `load_dataset`), and
+        # not loaded at all with a catalog
+        self.user_csv: str = user_csv
+        self.meal_csv: str = meal_csv
+        self.meal_aggregates: str = meal_aggregates
+        self._user_dataset: UserDataset = None
+        self._meal_dataset: MealDataset = None
+
+        if isinstance(schedule, str):
+            schedule = EpisodeSchedule(schedule)
+        self.schedule: EpisodeSchedule = schedule
+
+        # Dataset arrays: (calories, *NUTRIENTS) per user target / per meal,
+        # dietary constraint bitsets and reward engine, built once or attached
+        if catalog is not None:
+            self._users: UserDataset | CatalogColumns = catalog.users
+            self._user_targets: np.ndarray = catalog["user_targets"]
+            self._meal_nutr: np.ndarray = catalog["nutrients"]
+            self.constraint_index: ConstraintIndex = catalog.constraint_index()
+            self.reward_engine: RewardEngine = catalog.reward_engine(reward_weights, interactions)
+            meal_type = catalog["meal_type"]
+        else:
+            self._users: UserDataset | CatalogColumns = self.user_dataset
+            self._user_targets: np.ndarray = self.user_dataset.target_matrix()
+            self._meal_nutr: np.ndarray = self.meal_dataset.nutrient_matrix()
+            self.constraint_index: ConstraintIndex = ConstraintIndex(
+                self.meal_dataset, self.user_dataset
+            )
+            self.reward_engine: RewardEngine = RewardEngine.from_datasets(
+                self.meal_dataset,
+                self.user_dataset,
+                self.constraint_index,
+                reward_weights,
+                interactions,
+            )
+            meal_type = self.meal_dataset.column("meal_type", np.int64)
+        self._user_vegan: np.ndarray = self._users.column("vegan", np.int64)
+        self._user_vegetarian: np.ndarray = self._users.column("vegetarian", np.int64)
+
+        # Per-env state
+        self._user_idx = np.zeros(num_envs, dtype=np.int64)
+        self._step = np.zeros(num_envs, dtype=np.int64)
+        self._targets = np.zeros((num_envs, self._meal_nutr.shape[1]), dtype=np.float32)
+        self._rem = np.zeros_like(self._targets)
+        self._autoreset = np.zeros(num_envs, dtype=np.bool_)
+        self._history = np.full((num_envs, MAX_EPISODE_STEPS), -1, dtype=np.int64)
+        self._obs_buf = np.zeros(
+            (num_envs, len(FLAT_OBS_FIELDS) + (slate_size or 0) * SLATE_FEATURES), dtype=np.float32
+        )
+        self._user_bits = np.zeros(
+            (num_envs, self.constraint_index.type_bits.shape[1]), dtype=np.uint8
+        )
+
+        # Candidate slates, rebuilt every step
+        self.slate_size: int = slate_size
+        self.candidates: CandidateIndex = None
+        self._slates = np.zeros((num_envs, slate_size or 0), dtype=np.int64)
+        self._slate_ok = np.zeros((num_envs, slate_size or 0), dtype=np.bool_)
+        if slate_size is not None:
+            self.candidates = CandidateIndex(self._meal_nutr, meal_type, slate_size)
+
+        # Remaining needs go negative once a day's targets are exceeded, and
+        # calories are in the thousands: the boxes are unbounded, as in flat mode
+        if obs_mode == "flat":
+            self.single_observation_space = flat_observation_space(slate_size=slate_size or 0)
+        else:
+            self.single_observation_space = spaces.Dict(
+                {
+                    "day": spaces.Discrete(7),
+                    "meal_type": spaces.Discrete(3),
+                    "rem_cal": spaces.Box(low=-np.inf, high=np.inf, shape=(1,), dtype=np.float32),
+                    "rem_prot": spaces.Box(low=-np.inf, high=np.inf, shape=(1,), dtype=np.float32),
+                    "rem_ch": spaces.Box(low=-np.inf, high=np.inf, shape=(1,), dtype=np.float32),
+                    "rem_fib": spaces.Box(low=-np.inf, high=np.inf, shape=(1,), dtype=np.float32),
+                    "user_vegan": spaces.Discrete(2),
+                    "user vegetarian": spaces.Discrete(2),
+                }
+            )
+            if slate_size is not None:
+                self.single_observation_space["slate"] = spaces.Box(
+                    low=0, high=np.inf, shape=(slate_size, SLATE_FEATURES), dtype=np.float32
+                )
+        self.single_action_space = spaces.Discrete(slate_size or len(self._meal_nutr))
+
+        self.observation_space = batch_space(self.single_observation_space, num_envs)
+        self.action_space = batch_space(self.single_action_space, num_envs)
+
+        self._profiler: PhaseProfiler = None
+        if profile:
+            self._profiler = PhaseProfiler(PROFILED_METHODS.values())
+            self._profiler.instrument(self, PROFILED_METHODS)
+
+    def reset(self, seed: int = None, options: dict = None):
+        """
+        Resets every env to start a new episode.
+
+        Args:
+            seed (int, optional): Random seed of the generator shared by all
+                envs; seeding also restarts the schedule. Per-env seed lists
+                are rejected. Defaults to None.
+            options (dict, optional): Additional options for reset. Defaults to None.
+
+        Returns:
+            tuple:
+                - observation (dict): Batched initial observations.
+                - info (dict): Batched additional information.
+        """
+        if isinstance(seed, (list, tuple, np.ndarray)):
+            raise ValueError("MealRecVec shares one generator across envs; pass a single int seed")
+        super().reset(seed=seed)
+        if seed is not None:
+            self.schedule.restart()
+
+        self._reset_slots(np.ones(self.num_envs, dtype=np.bool_))
+        self._autoreset[:] = False
+        self._update_slates()
+
+        return self._get_obs(), self._get_infos()
+
+    def step(self, actions: np.ndarray):
+        """
+        Applies one action per env and returns the batched next state.
+
+        Slots whose episode finished on the previous step are reset instead,
+        ignoring their action and returning zero reward.
+
+        Args:
+            actions (np.ndarray): Meal index (or slate position if slate_size
+                is set) chosen for each env, shape (num_envs,).
+
+        Returns:
+            tuple:
+                - observation (dict): Batched next observations.
+                - reward (np.ndarray): Rewards, shape (num_envs,).
+                - terminated (np.ndarray): Termination flags, shape (num_envs,).
+                - truncated (np.ndarray): Truncation flags, shape (num_envs,).
+                - info (dict): Batched additional information.
+        """
+        actions = np.asarray(actions, dtype=np.int64)
+        if self.slate_size is not None:
+            actions = self._slates[np.arange(self.num_envs), actions]
+
+        resetting = self._autoreset.copy()
+        if resetting.any():
+            self._reset_slots(resetting)
+        active = ~resetting
+
+        remaining = self._rem.copy()
+        prev_step = self._step.copy()
+
+        # Update remaining calories / nutrients
+        delta = self._meal_nutr[actions]
+        delta[resetting] = 0.0
+        self._rem -= delta
+        self._step += active
+
+        # Refill the daily targets of envs starting a new day
+        new_day = active & (self._step % len(MealType) == 0)
+        self._rem[new_day] = self._targets[new_day]
+
+        terminated = active & self._check_terminations()
+        truncated = active & (self._step >= MAX_EPISODE_STEPS)
+
+        rewards, components = self._compute_rewards(actions, remaining, prev_step % len(MealType))
+        rewards[resetting] = 0.0
+        self._history[active, prev_step[active]] = actions[active]
+
+        self._autoreset = terminated | truncated
+        self._update_slates()
+
+        infos = self._get_infos()
+        infos["reward_components"] = {
+            **components,
+            **{f"_{k}": active for k in components},
+        }
+        infos["_reward_components"] = active
+        return self._get_obs(), rewards, terminated, truncated, infos
+
+    def get_states(self, indices: np.ndarray = None) -> np.ndarray:
+        """
+        Returns snapshots of the episode state of some slots, as MealRec.get_state.
+
+        Every record holds the state of the env's shared generator.
+
+        Args:
+            indices (np.ndarray, optional): Slots. Defaults to every slot.
+
+        Returns:
+            np.ndarray: STATE_DTYPE records, shape (len(indices),).
+        """
+        idx = np.arange(self.num_envs) if indices is None else np.asarray(indices, dtype=np.int64)
+        states = np.zeros(len(idx), dtype=STATE_DTYPE)
+        step = self._step[idx]
+        states["user"] = self._user_idx[idx]
+        states["step"] = step
+        states["day"] = (step // len(MealType)) % len(Day)
+        states["meal_type"] = step % len(MealType)
+        states["remaining"] = self._rem[idx]
+        states["history"] = self._history[idx]
+        states["rng"] = rng_state_words(self.np_random)
+        return states
+
+    def set_states(self, states: np.ndarray, indices: np.ndarray = None) -> dict | np.ndarray:
+        """
+        Restores snapshots into some slots at once, e.g. one MealRec.get_state
+        repeated over every slot to branch rollouts from it.
+
+        Slots restored at the end of an episode are reset on the next step.
+        The generator is shared by every slot, so the RNG field is not restored.
+
+        Args:
+            states (np.ndarray): STATE_DTYPE records, shape (len(indices),).
+            indices (np.ndarray, optional): Slots. Defaults to every slot.
+
+        Returns:
+            dict | np.ndarray: Batched observation of every slot.
+        """
+        idx = np.arange(self.num_envs) if indices is None else np.asarray(indices, dtype=np.int64)
+        states = np.broadcast_to(np.asarray(states, dtype=STATE_DTYPE), idx.shape)
+        users = states["user"]
+
+        self._user_idx[idx] = users
+        self._step[idx] = states["step"]
+        self._targets[idx] = self._user_targets[users]
+        self._rem[idx] = states["remaining"]
+        self._user_bits[idx] = self.constraint_index.user_bits(users)
+        self._history[idx] = states["history"]
+        self._autoreset[idx] = states["step"] >= MAX_EPISODE_STEPS
+        self._update_slates()
+
+        return self._get_obs()
+
+    @property
+    def user_dataset(self) -> UserDataset:
+        if self._user_dataset is None:
+            self._user_dataset = load_dataset(UserDataset, self.user_csv)
+        return self._user_dataset
+
+    @property
+    def meal_dataset(self) -> MealDataset:
+        if self._meal_dataset is None:
+            self._meal_dataset = load_dataset(
+                MealDataset, self.meal_csv, aggregates=self.meal_aggregates
+            )
+        return self._meal_dataset
+
+    def get_profile(self, reset: bool = False) -> dict:
+        """
+        Returns the cumulative time and calls of each phase.
+
+        Phase times are inclusive (e.g. "observation" includes "action_mask"
+        through the info dict).
+
+        Args:
+            reset (bool, optional): Whether to zero the counters afterwards. Defaults to False.
+
+        Returns:
+            dict: {phase: {"ns": total_ns, "calls": n_calls}}, empty if profiling is disabled.
+        """
+        if self._profiler is None:
+            return {}
+        profile = self._profiler.snapshot()
+        if reset:
+            self._profiler.reset()
+        return profile
+
+    def __getstate__(self) -> dict:
+        # Timed wrappers are bound to this instance; rebuild them on copies
+        state = self.__dict__.copy()
+        for method in PROFILED_METHODS:
+            state.pop(method, None)
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        if self._profiler is not None:
+            self._profiler.instrument(self, PROFILED_METHODS)
+
+    def _reset_slots(self, mask: np.ndarray) -> None:
+        """
+        Assigns the next users of the schedule to the selected slots and resets their state.
+
+        Args:
+            mask (np.ndarray): Boolean mask of the slots to reset.
+        """
+        n = int(mask.sum())
+        users = self.schedule.take(self._users, self.np_random, n)
+
+        self._user_idx[mask] = users
+        self._step[mask] = 0
+        self._targets[mask] = self._user_targets[users]
+        self._rem[mask] = self._targets[mask]
+        self._user_bits[mask] = self.constraint_index.user_bits(users)
+        self._history[mask] = -1
+
+    def action_masks(self) -> np.ndarray:
+        """
+        Returns the meals that are feasible for each env's user and meal type.
+
+        Returns:
+            np.ndarray: Boolean mask, shape (num_envs, n_meals), or
+                (num_envs, slate_size) if slate_size is set.
+        """
+        if self.slate_size is not None:
+            mask = self._slate_ok.copy()
+            mask[~mask.any(axis=1)] = True
+            return mask
+        return self.constraint_index.mask(self._user_bits, self._step % len(MealType))
+
+    def _get_obs(self) -> dict | np.ndarray:
+        """
+        Builds the batched observation from the state arrays.
+
+        Returns:
+            dict | np.ndarray: Batched observation (np.ndarray if obs_mode is "flat").
+        """
+        if self.obs_mode == "flat":
+            obs = self._obs_buf
+            obs[:, 0] = (self._step // len(MealType)) % len(Day)
+            obs[:, 1] = self._step % len(MealType)
+            obs[:, FLAT_REM] = self._rem
+            obs[:, 6] = self._user_vegan[self._user_idx]
+            obs[:, 7] = self._user_vegetarian[self._user_idx]
+            if self.slate_size is not None:
+                obs[:, FLAT_SLATE] = self._meal_nutr[self._slates].reshape(self.num_envs, -1)
+            return obs if self.reuse_obs_buffer else obs.copy()
+
+        obs = {
+            "day": (self._step // len(MealType)) % len(Day),
+            "meal_type": self._step % len(MealType),
+            "rem_cal": self._rem[:, 0:1].copy(),
+            "rem_prot": self._rem[:, 1:2].copy(),
+            "rem_ch": self._rem[:, 2:3].copy(),
+            "rem_fib": self._rem[:, 3:4].copy(),
+            "user_vegan": self._user_vegan[self._user_idx],
+            "user vegetarian": self._user_vegetarian[self._user_idx],
+        }
+        if self.slate_size is not None:
+            obs["slate"] = self._meal_nutr[self._slates]
+        return obs
+
+    def _update_slates(self) -> None:
+        """
+        Retrieves the slate of every env for its current state. Does nothing
+        without a slate.
+        """
+        if self.slate_size is None:
+            return
+        self._slates, self._slate_ok = self.candidates.query(
+            self._rem, self._step % len(MealType), self._user_bits
+        )
+
+    def _get_infos(self) -> dict:
+        """
+        Builds the batched info dictionary.
+
+        Returns:
+            dict: Per-env step, day, meal type and action mask, with their
+                Gymnasium masks.
+        """
+        present = np.ones(self.num_envs, dtype=np.bool_)
+        return {
+            "step": self._step.copy(),
+            "day": (self._step // len(MealType)) % len(Day),
+            "meal_type": self._step % len(MealType),
+            "action_mask": self.action_masks(),
+            "_step": present,
+            "_day": present,
+            "_meal_type": present,
+            "_action_mask": present,
+        }
+
+    def _check_terminations(self) -> np.ndarray:
+        """
+        Checks which envs should terminate. Episodes have no terminal state
+        (see the class docstring), so every flag is False.
+
+        Returns:
+            np.ndarray: Boolean termination flags, shape (num_envs,).
+        """
+        return np.zeros(self.num_envs, dtype=np.bool_)
+
+    def _compute_rewards(
+        self, actions: np.ndarray, remaining: np.ndarray, meal_type: np.ndarray
+    ) -> tuple[np.ndarray, dict]:
+        """
+        Computes the rewards of a batch of actions.
+
+        Args:
+            actions (np.ndarray): Meal index chosen for each env.
+            remaining (np.ndarray): Remaining daily (calories, *NUTRIENTS) before the meals.
+            meal_type (np.ndarray): MealType value each meal was recommended for.
+
+        Returns:
+            tuple:
+                - rewards (np.ndarray): float32 rewards, shape (num_envs,).
+                - components (dict): Unweighted value of each reward component,
+                  shape (num_envs,).
+        """
+        return self.reward_engine.compute(
+            RewardBatch(
+                users=self._user_idx,
+                meals=actions,
+                remaining=remaining,
+                meal_type=meal_type,
+                history=self._history,
+            )
+        )
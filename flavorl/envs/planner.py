@@ -0,0 +1,311 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from flavorl.dataclasses import Day, MealDataset, MealType, UserDataset
+from flavorl.envs.candidates import CandidateIndex
+from flavorl.envs.constraints import ConstraintIndex
+from flavorl.envs.mealrec import MAX_EPISODE_STEPS
+from flavorl.envs.reward import REWARD_COMPONENTS, RewardBatch, RewardEngine
+
+# Components whose value depends on the episode state; every other component
+# is treated as a function of the (user, meal) pair only
+STATEFUL_COMPONENTS = ("nutrient_deviation", "repetition")
+
+
+@dataclass
+class WeeklyPlan:
+    """
+    Weekly plans of a batch of users.
+
+    Attributes:
+        users (np.ndarray): User row indices, shape (B,).
+        meals (np.ndarray): Meal index of every step (3 MealType x 7 Day,
+            in episode order), shape (B, MAX_EPISODE_STEPS).
+        rewards (np.ndarray): float32 reward MealRec gives each step of the
+            plan, shape (B, MAX_EPISODE_STEPS).
+    """
+
+    users: np.ndarray
+    meals: np.ndarray
+    rewards: np.ndarray
+
+    @property
+    def value(self) -> np.ndarray:
+        """
+        Returns the return of each plan, shape (B,).
+        """
+        return self.rewards.sum(axis=1)
+
+
+class WeeklyPlanner:
+    """
+    Near-optimal weekly plans under the MealRec reward and dietary constraints.
+
+    Each user gets `n_candidates` meals per meal type: the meals nearest to a
+    third of their daily targets (see CandidateIndex), feasible first, ranked
+    by their reward at the start of a day. Each day is then planned with a
+    beam search over (breakfast, lunch, dinner), scoring every slot with the
+    nutrient deviation from the remaining needs, the (user, meal) components
+    and the repetition penalty of the days already planned. Users are solved
+    in batches with NumPy, so planning the whole user table is cheap.
+
+    Plans serve as an oracle (`plan(...).value` minus a policy's returns is
+    its regret) and as a baseline agent (`act`). With `beam_width` >=
+    `n_candidates` ** 2 each day is solved exactly over the candidates.
+    """
+
+    def __init__(
+        self,
+        user_dataset: UserDataset,
+        meal_dataset: MealDataset,
+        reward_engine: RewardEngine = None,
+        constraint_index: ConstraintIndex = None,
+        n_candidates: int = 32,
+        beam_width: int = 64,
+        pool: int = 4,
+    ) -> None:
+        """
+        Args:
+            user_dataset (UserDataset): Users.
+            meal_dataset (MealDataset): Meal catalog.
+            reward_engine (RewardEngine, optional): Reward to maximize, e.g. an
+                env's `reward_engine`. Defaults to None (default weights).
+            constraint_index (ConstraintIndex, optional): Dietary constraints.
+                Defaults to the engine's.
+            n_candidates (int): Meals kept per user and meal type.
+            beam_width (int): (breakfast, lunch) pairs kept per day.
+            pool (int): Nearest meals retrieved per kept candidate before ranking.
+        """
+        if reward_engine is None:
+            reward_engine = RewardEngine.from_datasets(meal_dataset, user_dataset, constraint_index)
+        self.user_dataset: UserDataset = user_dataset
+        self.meal_dataset: MealDataset = meal_dataset
+        self.reward_engine: RewardEngine = reward_engine
+        self.constraint_index: ConstraintIndex = constraint_index or reward_engine.constraint_index
+        self.beam_width: int = beam_width
+
+        meal_type = meal_dataset.column("meal_type", np.int64)
+        n_per_type = [int(np.sum(meal_type == t.value)) or len(meal_type) for t in MealType]
+        self.n_candidates: int = min(n_candidates, *n_per_type)
+        self._candidates: CandidateIndex = CandidateIndex(
+            reward_engine.meal_nutr,
+            meal_type,
+            slate_size=min(self.n_candidates * pool, *n_per_type),
+            oversample=1,
+        )
+
+        # Plans of the users acted for, by user row
+        self._plans: dict[int, np.ndarray] = {}
+
+    @classmethod
+    def from_env(cls, env, **kwargs) -> "WeeklyPlanner":
+        """
+        Builds a planner for the reward and constraints of a MealRec or
+        MealRecVec env.
+
+        Args:
+            env: The env (wrappers are removed).
+            **kwargs: Other planner arguments.
+
+        Returns:
+            WeeklyPlanner: Planner sharing the env's datasets and reward engine.
+        """
+        env = getattr(env, "unwrapped", env)
+        if getattr(env, "reward_engine", None) is None:
+            env._load()
+        return cls(env.user_dataset, env.meal_dataset, env.reward_engine, env.constraint_index, **kwargs)
+
+    def plan(self, users: np.ndarray = None, batch_size: int = 1024) -> WeeklyPlan:
+        """
+        Plans the week of every given user.
+
+        Args:
+            users (np.ndarray, optional): User row indices. Defaults to every user.
+            batch_size (int): Users solved at once.
+
+        Returns:
+            WeeklyPlan: Plans, in the order of `users`.
+        """
+        if users is None:
+            users = np.arange(len(self.user_dataset))
+        users = np.asarray(users, dtype=np.int64).reshape(-1)
+        meals = np.empty((len(users), MAX_EPISODE_STEPS), dtype=np.int64)
+        rewards = np.empty((len(users), MAX_EPISODE_STEPS), dtype=np.float32)
+        for start in range(0, len(users), batch_size):
+            rows = slice(start, start + batch_size)
+            meals[rows], rewards[rows] = self._plan_batch(users[rows])
+        return WeeklyPlan(users, meals, rewards)
+
+    def act(self, env) -> int | np.ndarray:
+        """
+        Returns the planned action for the current step of a MealRec env (an
+        int), or of every slot of a MealRecVec env (an array).
+
+        Plans are computed on first use for each user and cached. With a
+        candidate slate, the action is the slate position of the planned meal
+        (0 if the slate does not contain it).
+
+        Args:
+            env: MealRec or MealRecVec env, possibly wrapped.
+
+        Returns:
+            int | np.ndarray: Action(s).
+        """
+        env = getattr(env, "unwrapped", env)
+        if hasattr(env, "num_envs"):
+            users, steps, slates = env._user_idx, env._step, env._slates if env.slate_size else None
+        else:
+            users, steps = np.array([env._user_row]), np.array([env.current_step])
+            slates = env.slate[None] if env.slate_size else None
+
+        missing = np.unique([u for u in users.tolist() if u not in self._plans])
+        if len(missing):
+            plan = self.plan(missing)
+            self._plans.update(zip(missing.tolist(), plan.meals))
+
+        meals = np.array(
+            [self._plans[u][s % MAX_EPISODE_STEPS] for u, s in zip(users.tolist(), steps.tolist())],
+            dtype=np.int64,
+        )
+        if slates is not None:
+            hit = slates == meals[:, None]
+            meals = np.where(hit.any(axis=1), hit.argmax(axis=1), 0)
+        return meals if hasattr(env, "num_envs") else int(meals[0])
+
+    def _plan_batch(self, users: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Plans the week of a batch of users, one day at a time.
+
+        Returns:
+            tuple: Meals and step rewards, shape (B, MAX_EPISODE_STEPS).
+        """
+        engine = self.reward_engine
+        weights = engine.weights
+        w_dev = weights.get("nutrient_deviation", 0.0)
+        w_rep = weights.get("repetition", 0.0)
+        n_types = len(MealType)
+
+        targets = engine.user_targets[users].astype(np.float32)  # (B, 4)
+        share = engine._target_share[users].astype(np.float32)  # (B, 4)
+        cand, static = self._candidate_meals(users, targets, share, w_dev)  # (B, 3, K)
+
+        # Deviations are measured in units of the target share, so scale once.
+        # Nutrients go before candidates so the per-nutrient loops are contiguous
+        nutr = np.ascontiguousarray(
+            (engine.meal_nutr[cand] / share[:, None, None, :]).transpose(0, 1, 3, 2)
+        )  # (B, 3, 4, K)
+
+        counts = np.zeros(cand.shape, dtype=np.float32)
+        meals = np.empty((len(users), MAX_EPISODE_STEPS), dtype=np.int64)
+        rewards = np.empty((len(users), MAX_EPISODE_STEPS), dtype=np.float32)
+        b = np.arange(len(users))
+
+        for day in range(len(Day)):
+            picks, step_rewards = self._plan_day(nutr, static - w_rep * counts, targets / share, w_dev)
+            for t in range(n_types):
+                counts[b, t, picks[:, t]] += 1.0
+            steps = slice(day * n_types, (day + 1) * n_types)
+            meals[:, steps] = cand[b[:, None], np.arange(n_types), picks]
+            rewards[:, steps] = step_rewards
+        return meals, rewards
+
+    def _plan_day(
+        self, nutr: np.ndarray, static: np.ndarray, targets: np.ndarray, w_dev: float
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Beam search over the candidates of (breakfast, lunch, dinner).
+
+        Args:
+            nutr (np.ndarray): Candidate (calories, *NUTRIENTS) over the
+                user's target share, shape (B, 3, 4, K).
+            static (np.ndarray): Reward of each candidate that does not depend
+                on the remaining needs, shape (B, 3, K).
+            targets (np.ndarray): Daily targets over the target share, shape (B, 4).
+            w_dev (float): Weight of the nutrient deviation.
+
+        Returns:
+            tuple: Candidate position and reward of each slot, shape (B, 3).
+        """
+        n, k = static.shape[0], static.shape[2]
+        n_nutr = nutr.shape[2]
+        rows = np.arange(n)[:, None]
+
+        # Beam entries: candidate positions so far, their reward and the remaining needs
+        picks = np.zeros((n, 1, 0), dtype=np.int64)
+        slot_rewards = np.zeros((n, 1, 0), dtype=np.float32)
+        remaining = targets[:, None, :]  # (B, W, 4)
+
+        for t in range(len(MealType)):
+            per_meal = remaining / np.float32(len(MealType) - t)  # (B, W, 4)
+            dev = np.zeros((n, per_meal.shape[1], k), dtype=np.float32)
+            for j in range(n_nutr):
+                dev += np.abs(nutr[:, t, None, j, :] - per_meal[:, :, j, None])
+            r = static[:, t, None, :] - (w_dev / n_nutr) * dev  # (B, W, K)
+            total = slot_rewards.sum(axis=2)[:, :, None] + r
+
+            flat = total.reshape(n, -1)
+            if t == len(MealType) - 1:
+                top = flat.argmax(axis=1)[:, None]
+            else:
+                width = min(self.beam_width, flat.shape[1])
+                top = np.argpartition(-flat, width - 1, axis=1)[:, :width]
+            beam, pos = np.divmod(top, k)
+
+            picks = np.concatenate([picks[rows, beam], pos[:, :, None]], axis=2)
+            slot_rewards = np.concatenate(
+                [slot_rewards[rows, beam], r[rows, beam, pos][:, :, None]], axis=2
+            )
+            remaining = remaining[rows, beam] - nutr[rows, t, :, pos]
+
+        return picks[:, 0], slot_rewards[:, 0]
+
+    def _candidate_meals(
+        self, users: np.ndarray, targets: np.ndarray, share: np.ndarray, w_dev: float
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the candidate meals of each user and meal type, and their
+        weighted (user, meal) reward.
+
+        Returns:
+            tuple: Meal indices and float32 rewards, shape (B, 3, K).
+        """
+        engine = self.reward_engine
+        n_types = len(MealType)
+        user_bits = self.constraint_index.user_bits(users)
+
+        pools = np.stack(
+            [
+                self._candidates.query(
+                    targets * np.float32((n_types - t.value) / n_types), t.value, user_bits
+                )[0]
+                for t in MealType
+            ],
+            axis=1,
+        )  # (B, 3, P)
+        pool_static = self._static_rewards(users, pools, targets)
+
+        # Rank the pool by its reward at a third of the daily targets
+        dev = np.abs(engine.meal_nutr[pools] - targets[:, None, None, :] / np.float32(n_types))
+        score = pool_static - w_dev * (dev / share[:, None, None, :]).mean(axis=3)
+        keep = np.argsort(-score, axis=2, kind="stable")[:, :, : self.n_candidates]
+        return np.take_along_axis(pools, keep, axis=2), np.take_along_axis(pool_static, keep, axis=2)
+
+    def _static_rewards(self, users: np.ndarray, meals: np.ndarray, targets: np.ndarray) -> np.ndarray:
+        """
+        Weighted sum of the components that only depend on the (user, meal)
+        pair, for meals of shape (B, 3, P).
+        """
+        engine = self.reward_engine
+        shape = meals.shape
+        batch = RewardBatch(
+            users=np.repeat(users, shape[1] * shape[2]),
+            meals=meals.reshape(-1),
+            remaining=np.repeat(targets, shape[1] * shape[2], axis=0),
+            meal_type=np.tile(np.repeat(np.arange(shape[1]), shape[2]), shape[0]),
+        )
+        total = np.zeros(len(batch.meals), dtype=np.float32)
+        for name, weight in engine.weights.items():
+            if name not in STATEFUL_COMPONENTS:
+                total += weight * REWARD_COMPONENTS[name](engine, batch)
+        return total.reshape(shape)
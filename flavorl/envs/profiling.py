@@ -0,0 +1,86 @@
+import time
+from typing import Callable, Iterable
+
+
+class PhaseProfiler:
+    """
+    Cumulative wall-clock time (ns) and call counts per env phase.
+
+    Phases are timed by wrapping the env's methods on the instance, so envs
+    created without a profiler run their original methods with no overhead.
+    Times are inclusive: a phase called from another one is also counted in
+    the caller.
+    """
+
+    def __init__(self, phases: Iterable[str]) -> None:
+        """
+        Initializes empty counters.
+
+        Args:
+            phases (Iterable[str]): Phase names.
+        """
+        self.ns: dict[str, int] = {p: 0 for p in phases}
+        self.calls: dict[str, int] = {p: 0 for p in self.ns}
+
+    def wrap(self, phase: str, fn: Callable) -> Callable:
+        """
+        Returns `fn` wrapped so that its calls are timed under `phase`.
+        """
+        ns, calls, clock = self.ns, self.calls, time.perf_counter_ns
+
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                ns[phase] += clock() - start
+                calls[phase] += 1
+
+        return timed
+
+    def instrument(self, obj: object, methods: dict[str, str]) -> None:
+        """
+        Replaces methods of `obj` by timed versions.
+
+        Args:
+            obj (object): Instance to instrument.
+            methods (dict[str, str]): Method name -> phase name.
+        """
+        for method, phase in methods.items():
+            setattr(obj, method, self.wrap(phase, getattr(type(obj), method).__get__(obj)))
+
+    def snapshot(self) -> dict[str, dict[str, int]]:
+        """
+        Returns the current counters.
+
+        Returns:
+            dict[str, dict[str, int]]: {phase: {"ns": total_ns, "calls": n_calls}}.
+        """
+        return {p: {"ns": self.ns[p], "calls": self.calls[p]} for p in self.ns}
+
+    def reset(self) -> None:
+        """
+        Sets every counter back to zero.
+        """
+        for p in self.ns:
+            self.ns[p] = 0
+            self.calls[p] = 0
+
+
+def merge_profiles(profiles: Iterable[dict]) -> dict[str, dict[str, int]]:
+    """
+    Sums profiles from several envs, e.g. `vec_env.call("get_profile")`.
+
+    Args:
+        profiles (Iterable[dict]): Profiles returned by `get_profile()`.
+
+    Returns:
+        dict[str, dict[str, int]]: {phase: {"ns": total_ns, "calls": n_calls}}.
+    """
+    merged: dict[str, dict[str, int]] = {}
+    for profile in profiles:
+        for phase, counts in profile.items():
+            acc = merged.setdefault(phase, {"ns": 0, "calls": 0})
+            acc["ns"] += counts["ns"]
+            acc["calls"] += counts["calls"]
+    return merged
@@ -0,0 +1,368 @@
+from pathlib import Path
+from typing import Callable, Iterator, Sequence
+
+import numpy as np
+import polars as pl
+
+from flavorl.data.interactions import InteractionMatrix
+from flavorl.dataclasses import MealDataset, UserDataset
+from flavorl.envs.mealrec import MAX_EPISODE_STEPS, MealRec
+
+
+def _row_lookup(ids: np.ndarray) -> np.ndarray:
+    """
+    Returns an array mapping each id to its row (-1 for unknown ids).
+    """
+    lookup = np.full(int(ids.max()) + 1 if len(ids) else 0, -1, dtype=np.int64)
+    lookup[ids] = np.arange(len(ids))
+    return lookup
+
+
+def _to_rows(lookup: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    rows = np.full(len(ids), -1, dtype=np.int64)
+    known = (ids >= 0) & (ids < len(lookup))
+    rows[known] = lookup[ids[known]]
+    return rows
+
+
+class LoggedInteractions:
+    """
+    Streams logged (user, meal) interactions from MealRec+ relation files.
+
+    Files are read in chunks of `chunk_size` lines, so a split is never fully
+    loaded. Ids are mapped to dataset rows; pairs whose user or meal is not in
+    the datasets are skipped and counted in `n_skipped` (for the latest pass).
+    """
+
+    def __init__(
+        self,
+        paths: str | Path | Sequence[str | Path],
+        user_dataset: UserDataset,
+        meal_dataset: MealDataset,
+        chunk_size: int = 1_000_000,
+        separator: str = "\t",
+    ) -> None:
+        """
+        Args:
+            paths (str | Path | Sequence): Relation files ("user<TAB>meal"
+                per line), e.g. user_meal_test.txt and user_meal_tune.txt.
+            user_dataset (UserDataset): Users (column "user_idx").
+            meal_dataset (MealDataset): Meals (column "meal_idx").
+            chunk_size (int): Lines read at a time.
+            separator (str): Column separator. Defaults to a tab.
+        """
+        self.paths: list[Path] = [Path(p) for p in ([paths] if isinstance(paths, (str, Path)) else paths)]
+        self.chunk_size: int = chunk_size
+        self.separator: str = separator
+        self.n_skipped: int = 0
+
+        self._user_rows: np.ndarray = _row_lookup(user_dataset.column("user_idx", np.int64))
+        self._meal_rows: np.ndarray = _row_lookup(meal_dataset.column("meal_idx", np.int64))
+
+    def chunks(self) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+        """
+        Yields the logged pairs chunk by chunk.
+
+        Yields:
+            tuple: User rows and meal rows (int64 arrays of equal length).
+        """
+        # Counted per pass, so that repeated passes do not accumulate
+        self.n_skipped = 0
+        for path in self.paths:
+            lf = pl.scan_csv(path, separator=self.separator, has_header=False).select(
+                pl.nth(0).cast(pl.Int64).alias("user"), pl.nth(1).cast(pl.Int64).alias("meal")
+            )
+            for batch in lf.collect_batches(chunk_size=self.chunk_size):
+                users = _to_rows(self._user_rows, batch["user"].to_numpy())
+                meals = _to_rows(self._meal_rows, batch["meal"].to_numpy())
+                known = (users >= 0) & (meals >= 0)
+                self.n_skipped += int((~known).sum())
+                yield users[known], meals[known]
+
+    def episodes(self, max_steps: int = MAX_EPISODE_STEPS) -> Iterator[tuple[int, np.ndarray]]:
+        """
+        Yields the logged meals of each user, in file order.
+
+        Consecutive lines of the same user form one trajectory, split into
+        episodes of at most `max_steps` meals. A user whose lines are not
+        contiguous yields several trajectories.
+
+        Yields:
+            tuple: User row and its logged meal rows.
+        """
+        carry_user, carry_meals = -1, np.empty(0, dtype=np.int64)
+        for users, meals in self.chunks():
+            if len(users) == 0:
+                continue
+            starts = np.flatnonzero(np.diff(users, prepend=users[0] - 1))
+            ends = np.append(starts[1:], len(users))
+            for start, end in zip(starts, ends):
+                user = int(users[start])
+                if user == carry_user:
+                    carry_meals = np.concatenate([carry_meals, meals[start:end]])
+                    continue
+                yield from self._split(carry_user, carry_meals, max_steps)
+                carry_user, carry_meals = user, meals[start:end]
+        yield from self._split(carry_user, carry_meals, max_steps)
+
+    @staticmethod
+    def _split(user: int, meals: np.ndarray, max_steps: int) -> Iterator[tuple[int, np.ndarray]]:
+        if user < 0:
+            return
+        for i in range(0, len(meals), max_steps):
+            yield user, meals[i : i + max_steps]
+
+
+class LoggedReplay(MealRec):
+    """
+    MealRec replaying real user trajectories from logged interactions.
+
+    Each episode is a logged trajectory (see LoggedInteractions.episodes),
+    streamed from disk. The env state follows the logged meals; the agent's
+    action is compared with the logged meal of the step and the reward is
+    observed only when they match (1.0 on a match, 0.0 otherwise), as in
+    replay evaluation of logged bandit feedback. When the stream is exhausted
+    it starts over and `epoch` is increased.
+
+    Actions are catalog meal indices (slates are not supported).
+    """
+
+    def __init__(
+        self,
+        user_csv: str,
+        meal_csv: str,
+        log_paths: str | Path | Sequence[str | Path],
+        chunk_size: int = 1_000_000,
+        **kwargs,
+    ):
+        """
+        Initializes the replay env.
+
+        Args:
+            user_csv (str): Path to the CSV file containing user data.
+            meal_csv (str): Path to the CSV file containing meal data.
+            log_paths (str | Path | Sequence): Logged interaction files
+                (e.g. user_meal_test.txt, user_meal_tune.txt).
+            chunk_size (int): Lines read from disk at a time.
+            **kwargs: Other MealRec arguments.
+        """
+        if kwargs.get("slate_size") is not None:
+            raise ValueError("LoggedReplay does not support slates")
+        super().__init__(user_csv, meal_csv, **kwargs)
+
+        # Built on the first reset, when the datasets are loaded
+        self.log_paths = log_paths
+        self.chunk_size: int = chunk_size
+        self.log: LoggedInteractions = None
+        self.epoch: int = 0
+        self._episodes: Iterator = None
+        self._logged: np.ndarray = None
+
+    def reset(self, seed: int = None, options: dict = None):
+        """
+        Starts the next logged trajectory. Seeding restarts the stream.
+
+        Returns:
+            tuple: Initial observation and info (with "logged_meals" and "epoch").
+        """
+        super(MealRec, self).reset(seed=seed)
+        if self.log is None:
+            self.log = LoggedInteractions(
+                self.log_paths, self.user_dataset, self.meal_dataset, self.chunk_size
+            )
+        if seed is not None or self._episodes is None:
+            self._episodes = self.log.episodes()
+
+        episode = next(self._episodes, None)
+        if episode is None:
+            self.epoch += 1
+            self._episodes = self.log.episodes()
+            episode = next(self._episodes, None)
+            if episode is None:
+                raise RuntimeError("No logged interactions to replay")
+
+        user_row, self._logged = episode
+        obs, info = self._start_episode(user_row)
+        info["logged_meals"] = self._logged
+        info["epoch"] = self.epoch
+        return obs, info
+
+    def step(self, action: int):
+        """
+        Advances with the logged meal and rewards the action if it matches it.
+
+        Returns:
+            tuple: As in MealRec.step. info also has "logged_meal", "matched"
+                and "logged_reward" (the MealRec reward of the logged meal).
+        """
+        logged = int(self._logged[self.current_step])
+        matched = int(action) == logged
+
+        obs, logged_reward, terminated, truncated, info = super().step(logged)
+        truncated = truncated or self.current_step >= len(self._logged)
+
+        info.update(
+            action=int(action),
+            logged_meal=logged,
+            matched=matched,
+            logged_reward=logged_reward,
+            truncated=truncated,
+        )
+        return obs, float(matched), terminated, truncated, info
+
+
+def popularity_propensities(
+    interactions: InteractionMatrix, meal_dataset: MealDataset, smoothing: float = 1.0
+) -> np.ndarray:
+    """
+    Estimates the logging policy as meal popularity in (e.g. train) interactions.
+
+    Args:
+        interactions (InteractionMatrix): User x meal interactions.
+        meal_dataset (MealDataset): Meals (column "meal_idx").
+        smoothing (float): Additive smoothing count per meal.
+
+    Returns:
+        np.ndarray: float64 probability of each meal row, shape (n_meals,).
+    """
+    counts = np.bincount(
+        np.asarray(interactions.indices), weights=np.asarray(interactions.data), minlength=interactions.shape[1]
+    )
+    meal_ids = meal_dataset.column("meal_idx", np.int64)
+    known = meal_ids < len(counts)
+    per_row = np.zeros(len(meal_ids), dtype=np.float64)
+    per_row[known] = counts[meal_ids[known]]
+    per_row += smoothing
+    return per_row / per_row.sum()
+
+
+class OffPolicyEstimator:
+    """
+    Streaming IPS, self-normalized IPS and doubly robust estimates of a
+    target policy's value from logged bandit feedback.
+
+    Every `update` is vectorized over a chunk of logged events and only
+    accumulates sums, so a whole split is evaluated in one pass.
+    """
+
+    def __init__(self, clip: float = None) -> None:
+        """
+        Args:
+            clip (float, optional): Maximum importance weight. Defaults to None.
+        """
+        self.clip: float = clip
+        self.n = 0
+        self._sums = dict.fromkeys(("w", "w2", "ips", "ips2", "dr", "dr2"), 0.0)
+        self._has_dr = True
+
+    def update(
+        self,
+        target_prob: np.ndarray,
+        logging_prob: np.ndarray,
+        rewards: np.ndarray,
+        q_logged: np.ndarray = None,
+        q_target: np.ndarray = None,
+    ) -> None:
+        """
+        Adds a chunk of logged events.
+
+        Args:
+            target_prob (np.ndarray): Probability of the logged meal under the target policy.
+            logging_prob (np.ndarray): Probability of the logged meal under the logging policy.
+            rewards (np.ndarray): Logged rewards.
+            q_logged (np.ndarray, optional): Reward model at the logged meal (for DR).
+            q_target (np.ndarray, optional): Expected reward model value under the
+                target policy, sum_a pi(a|x) q(x, a) (for DR).
+        """
+        w = np.asarray(target_prob, dtype=np.float64) / np.asarray(logging_prob, dtype=np.float64)
+        if self.clip is not None:
+            w = np.minimum(w, self.clip)
+        r = np.asarray(rewards, dtype=np.float64)
+
+        ips = w * r
+        s = self._sums
+        s["w"] += w.sum()
+        s["w2"] += (w**2).sum()
+        s["ips"] += ips.sum()
+        s["ips2"] += (ips**2).sum()
+
+        if q_logged is None or q_target is None:
+            self._has_dr = False
+        else:
+            dr = np.asarray(q_target, dtype=np.float64) + w * (r - np.asarray(q_logged, dtype=np.float64))
+            s["dr"] += dr.sum()
+            s["dr2"] += (dr**2).sum()
+
+        self.n += len(w)
+
+    def result(self) -> dict[str, float]:
+        """
+        Returns the estimates.
+
+        Returns:
+            dict[str, float]: n, ips, ips_se, snips, dr and dr_se (NaN without
+                reward model values), and the effective sample size of the weights.
+        """
+        n, s = self.n, self._sums
+        if n == 0:
+            return {"n": 0}
+
+        def mean_se(total: float, total2: float) -> tuple[float, float]:
+            mean = total / n
+            var = max(total2 / n - mean**2, 0.0)
+            return mean, np.sqrt(var / n)
+
+        ips, ips_se = mean_se(s["ips"], s["ips2"])
+        dr, dr_se = mean_se(s["dr"], s["dr2"]) if self._has_dr else (np.nan, np.nan)
+        return {
+            "n": n,
+            "ips": ips,
+            "ips_se": ips_se,
+            "snips": s["ips"] / s["w"] if s["w"] else np.nan,
+            "dr": dr,
+            "dr_se": dr_se,
+            "ess": s["w"] ** 2 / s["w2"] if s["w2"] else 0.0,
+        }
+
+
+def evaluate_policy(
+    target_prob: Callable,
+    logged: LoggedInteractions,
+    logging_prob: np.ndarray,
+    reward_model: Callable = None,
+    policy_value: Callable = None,
+    clip: float = None,
+) -> dict[str, float]:
+    """
+    Estimates the value of a policy over whole logged splits, chunk by chunk.
+
+    Logged interactions are positive feedback, so every logged event has
+    reward 1.
+
+    Args:
+        target_prob (Callable): fn(user_rows, meal_rows) -> probability of each
+            meal under the target policy.
+        logged (LoggedInteractions): Logged interactions to evaluate on.
+        logging_prob (np.ndarray): Logging policy probability per meal row
+            (e.g. popularity_propensities).
+        reward_model (Callable, optional): fn(user_rows, meal_rows) -> expected
+            reward, for DR. Defaults to None.
+        policy_value (Callable, optional): fn(user_rows) -> expected reward model
+            value under the target policy, for DR. Defaults to None.
+        clip (float, optional): Maximum importance weight. Defaults to None.
+
+    Returns:
+        dict[str, float]: Estimates (see OffPolicyEstimator.result) plus the
+            number of skipped (unknown user/meal) events.
+    """
+    estimator = OffPolicyEstimator(clip)
+    use_dr = reward_model is not None and policy_value is not None
+    for users, meals in logged.chunks():
+        estimator.update(
+            target_prob(users, meals),
+            logging_prob[meals],
+            np.ones(len(users)),
+            reward_model(users, meals) if use_dr else None,
+            policy_value(users) if use_dr else None,
+        )
+    return {**estimator.result(), "skipped": logged.n_skipped}
@@ -0,0 +1,139 @@
+from typing import Sequence
+
+import numpy as np
+
+from flavorl.dataclasses import UserDataset
+
+SCHEDULE_MODES = ("uniform", "stratified", "fixed")
+
+
+class EpisodeSchedule:
+    """
+    Pre-drawn sequence of users consumed across episode resets.
+
+    Users are drawn in blocks with one vectorized call on the env's
+    `np_random`, so rollouts are reproducible from the reset seed and a
+    reset only reads the next entry of the block. Modes:
+
+    - "uniform": users drawn uniformly at random.
+    - "stratified": every diet stratum (combination of the `strata` flags)
+      gets the same share of each block, users being uniform within a stratum.
+    - "fixed": the `users` list in order, cycling (e.g. an evaluation set).
+
+    Each env should own its schedule; a schedule shared by several envs in
+    one process splits its sequence between them.
+    """
+
+    def __init__(
+        self,
+        mode: str = "uniform",
+        block_size: int = 1024,
+        users: Sequence[int] = None,
+        strata: Sequence[str] = ("vegan", "vegetarian"),
+    ) -> None:
+        """
+        Initializes an empty schedule; the first block is drawn on first use.
+
+        Args:
+            mode (str): "uniform", "stratified" or "fixed".
+            block_size (int): Users drawn per block (ignored in "fixed" mode).
+            users (Sequence[int], optional): user_idx values of the "fixed" mode.
+            strata (Sequence[str]): Boolean user columns defining the strata of
+                the "stratified" mode.
+        """
+        if mode not in SCHEDULE_MODES:
+            raise ValueError(f"Invalid schedule mode: {mode}")
+        if mode == "fixed" and not users:
+            raise ValueError("The 'fixed' schedule needs a non-empty list of users")
+
+        self.mode: str = mode
+        self.block_size: int = block_size
+        self.users: np.ndarray = None if users is None else np.asarray(users, dtype=np.int64)
+        self.strata: tuple = tuple(strata)
+
+        self._block: np.ndarray = np.empty(0, dtype=np.int64)
+        self._pos: int = 0
+
+        # Row layout, built on first use: fixed rows, or rows grouped by stratum
+        self._rows: np.ndarray = None
+        self._offsets: np.ndarray = None
+        self._sizes: np.ndarray = None
+
+    def take(self, user_dataset: UserDataset, rng: np.random.Generator, n: int = 1) -> np.ndarray:
+        """
+        Returns the next `n` user rows, drawing new blocks as needed.
+
+        Args:
+            user_dataset (UserDataset): Dataset the rows refer to.
+            rng (np.random.Generator): Generator used to draw new blocks.
+            n (int): Number of users.
+
+        Returns:
+            np.ndarray: User row indices (int64), shape (n,).
+        """
+        out = np.empty(n, dtype=np.int64)
+        filled = 0
+        while filled < n:
+            if self._pos >= len(self._block):
+                self._block = self._draw(user_dataset, rng)
+                self._pos = 0
+            k = min(n - filled, len(self._block) - self._pos)
+            out[filled : filled + k] = self._block[self._pos : self._pos + k]
+            self._pos += k
+            filled += k
+        return out
+
+    def restart(self) -> None:
+        """
+        Drops the pending users, so that the next block is drawn from the
+        current RNG state (and a "fixed" list starts over).
+
+        Called by the envs when reset with a seed.
+        """
+        self._block = np.empty(0, dtype=np.int64)
+        self._pos = 0
+
+    def _draw(self, user_dataset: UserDataset, rng: np.random.Generator) -> np.ndarray:
+        """
+        Draws a new block of user rows.
+        """
+        if self._rows is None:
+            self._build(user_dataset)
+
+        if self.mode == "fixed":
+            return self._rows
+
+        if self.mode == "uniform":
+            return rng.integers(len(user_dataset), size=self.block_size)
+
+        # Balanced stratum per draw, then a uniform user within the stratum
+        groups = rng.permutation(np.resize(np.arange(len(self._sizes)), self.block_size))
+        within = (rng.random(self.block_size) * self._sizes[groups]).astype(np.int64)
+        return self._rows[self._offsets[groups] + within]
+
+    def _build(self, user_dataset: UserDataset) -> None:
+        """
+        Resolves the fixed users to rows, or groups the rows by stratum.
+        """
+        if self.mode == "fixed":
+            ids = user_dataset.column("user_idx", np.int64)
+            order = np.argsort(ids, kind="stable")
+            pos = np.searchsorted(ids, self.users, sorter=order)
+            pos = np.minimum(pos, len(ids) - 1)
+            rows = order[pos]
+            missing = self.users[ids[rows] != self.users]
+            if len(missing):
+                raise ValueError(f"Unknown users in schedule: {missing[:10].tolist()}")
+            self._rows = rows
+            return
+
+        if self.mode == "stratified":
+            codes = np.zeros(len(user_dataset), dtype=np.int64)
+            for bit, col in enumerate(self.strata):
+                codes |= user_dataset.column(col, np.int64).astype(bool) << bit
+        else:
+            codes = np.zeros(len(user_dataset), dtype=np.int64)
+
+        self._rows = np.argsort(codes, kind="stable")
+        _, self._sizes = np.unique(codes, return_counts=True)
+        self._offsets = np.concatenate(([0], np.cumsum(self._sizes)[:-1]))
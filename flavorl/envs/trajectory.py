@@ -0,0 +1,273 @@
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+
+import gymnasium as gym
+from gymnasium import spaces
+
+
+class TrajectoryLogger(gym.Wrapper):
+    """
+    Records every MealRec transition to Parquet files for offline RL.
+
+    Each transition (observation the action was taken on, action, meal_idx,
+    reward and its components, user_idx, day, meal_type, termination flags)
+    is copied into preallocated column buffers. Full chunks are handed to a
+    background thread, which converts them to Arrow columns and writes a
+    Parquet file every `rows_per_file` rows, so the step only pays for a few
+    array assignments.
+
+    Buffers form a ring of `n_buffers` chunks: if the writer falls behind,
+    `step` waits for a free chunk (memory stays bounded); time spent waiting
+    is reported by `overhead()`.
+    """
+
+    def __init__(
+        self,
+        env: gym.Env,
+        out_dir: str | Path,
+        chunk_size: int = 4096,
+        rows_per_file: int = 262_144,
+        n_buffers: int = 3,
+        prefix: str = "trajectories",
+        compression: str = "zstd",
+    ) -> None:
+        """
+        Wraps a MealRec env.
+
+        Args:
+            env (gym.Env): MealRec env (possibly wrapped).
+            out_dir (str | Path): Output directory (created if needed).
+            chunk_size (int): Transitions per buffer chunk.
+            rows_per_file (int): Transitions per Parquet file (rounded up to
+                whole chunks; one row group per chunk).
+            n_buffers (int): Chunks in the ring.
+            prefix (str): File name prefix. Files are named
+                "<prefix>-<pid>-<n>.parquet" so that vector-env workers do not collide.
+            compression (str): Parquet compression codec.
+        """
+        super().__init__(env)
+        self.out_dir = Path(out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.chunk_size = chunk_size
+        self.rows_per_file = rows_per_file
+        self.prefix = prefix
+        self.compression = compression
+
+        # Observations are stored flattened; Dict entries keep their raw
+        # values (no one-hot), in the space's key order
+        space = env.observation_space
+        subspaces = space.spaces.items() if isinstance(space, spaces.Dict) else [(None, space)]
+        self._obs_slices: list[tuple[str, slice]] = []
+        offset = 0
+        for key, sub in subspaces:
+            size = int(np.prod(sub.shape)) if sub.shape else 1
+            self._obs_slices.append((key, slice(offset, offset + size)))
+            offset += size
+        self._obs_dim = offset
+        self._n_buffers = n_buffers
+        self._buffers: list[dict[str, np.ndarray]] = None  # allocated on the first step
+        self._components: tuple[str, ...] = ()
+
+        self._free: queue.Queue = queue.Queue()
+        self._full: queue.Queue = queue.Queue()
+        self._buf: dict[str, np.ndarray] = None
+        self._n = 0
+
+        self._episode = -1
+        self._step = 0
+        self._last_obs: np.ndarray = np.zeros(self._obs_dim, dtype=np.float32)
+
+        self._writer: threading.Thread = None
+        self._error: BaseException = None
+        self.files: list[Path] = []
+
+        self._log_ns = 0
+        self._stall_ns = 0
+        self._steps = 0
+
+    def reset(self, **kwargs):
+        obs, info = self.env.reset(**kwargs)
+        self._episode += 1
+        self._step = 0
+        self._flatten(obs, self._last_obs)
+        return obs, info
+
+    def step(self, action):
+        # Pre-step state of the transition
+        base = self.env.unwrapped
+        user_idx = base.current_user_idx
+        day = base.current_day.value
+        meal_type = base.current_mealtype.value
+        meal_idx = base.slate[action] if getattr(base, "slate_size", None) is not None else action
+
+        obs, reward, terminated, truncated, info = self.env.step(action)
+
+        start = time.perf_counter_ns()
+        if self._buffers is None:
+            self._allocate(info.get("reward_components", {}))
+        if self._error is not None:
+            raise RuntimeError("Trajectory writer failed") from self._error
+
+        buf, i = self._buf, self._n
+        buf["episode"][i] = self._episode
+        buf["step"][i] = self._step
+        buf["user_idx"][i] = user_idx
+        buf["day"][i] = day
+        buf["meal_type"][i] = meal_type
+        buf["action"][i] = action
+        buf["meal_idx"][i] = meal_idx
+        buf["reward"][i] = reward
+        buf["terminated"][i] = terminated
+        buf["truncated"][i] = truncated
+        buf["obs"][i] = self._last_obs
+        components = info.get("reward_components", {})
+        for j, name in enumerate(self._components):
+            buf["reward_components"][i, j] = components.get(name, np.nan)
+
+        self._step += 1
+        self._flatten(obs, self._last_obs)
+        self._n += 1
+        if self._n == self.chunk_size:
+            self._submit()
+
+        self._log_ns += time.perf_counter_ns() - start
+        self._steps += 1
+        return obs, reward, terminated, truncated, info
+
+    def overhead(self) -> dict[str, float]:
+        """
+        Returns the logging cost measured so far.
+
+        Returns:
+            dict[str, float]: Logged steps, mean logging time per step (ns,
+                including stalls) and total time spent waiting for the writer (ns).
+        """
+        return {
+            "steps": self._steps,
+            "mean_ns_per_step": self._log_ns / max(self._steps, 1),
+            "stall_ns": self._stall_ns,
+        }
+
+    def flush(self) -> None:
+        """
+        Writes every recorded transition and waits until the files are on disk.
+        """
+        if self._buffers is None:
+            return
+        if self._n:
+            self._submit()
+        self._full.put(("flush", None))
+        self._full.join()
+        if self._error is not None:
+            raise RuntimeError("Trajectory writer failed") from self._error
+
+    def close(self) -> None:
+        """
+        Flushes pending transitions, stops the writer and closes the env.
+        """
+        try:
+            self.flush()
+        finally:
+            if self._writer is not None:
+                self._full.put(("stop", None))
+                self._writer.join()
+                self._writer = None
+            super().close()
+
+    def _flatten(self, obs, out: np.ndarray) -> None:
+        # Copies, since flat observations are a buffer reused by the env
+        for key, sl in self._obs_slices:
+            out[sl] = np.ravel(obs if key is None else obs[key])
+
+    def _allocate(self, components: dict) -> None:
+        """
+        Preallocates the ring of chunks and starts the writer.
+        """
+        self._components = tuple(components)
+        n = self.chunk_size
+        self._buffers = []
+        for _ in range(self._n_buffers):
+            self._buffers.append(
+                {
+                    "episode": np.zeros(n, dtype=np.int64),
+                    "step": np.zeros(n, dtype=np.int32),
+                    "user_idx": np.zeros(n, dtype=np.int64),
+                    "day": np.zeros(n, dtype=np.int8),
+                    "meal_type": np.zeros(n, dtype=np.int8),
+                    "action": np.zeros(n, dtype=np.int64),
+                    "meal_idx": np.zeros(n, dtype=np.int64),
+                    "reward": np.zeros(n, dtype=np.float32),
+                    "terminated": np.zeros(n, dtype=np.bool_),
+                    "truncated": np.zeros(n, dtype=np.bool_),
+                    "obs": np.zeros((n, self._obs_dim), dtype=np.float32),
+                    "reward_components": np.zeros((n, len(self._components)), dtype=np.float32),
+                }
+            )
+        for k in range(1, self._n_buffers):
+            self._free.put(k)
+        self._buf, self._buf_id, self._n = self._buffers[0], 0, 0
+
+        self._writer = threading.Thread(target=self._write_loop, name="trajectory-writer", daemon=True)
+        self._writer.start()
+
+    def _submit(self) -> None:
+        """
+        Hands the current chunk to the writer and takes the next free one.
+        """
+        self._full.put(("chunk", (self._buf_id, self._n)))
+        start = time.perf_counter_ns()
+        self._buf_id = self._free.get()
+        self._stall_ns += time.perf_counter_ns() - start
+        self._buf, self._n = self._buffers[self._buf_id], 0
+
+    def _to_frame(self, buf: dict[str, np.ndarray], n: int) -> pl.DataFrame:
+        # Copies the rows out of the buffer, which is reused right after
+        columns = {k: v[:n].copy() for k, v in buf.items() if k not in ("obs", "reward_components")}
+        frame = pl.DataFrame(columns).with_columns(pl.Series("obs", buf["obs"][:n].copy()))
+        if self._components:
+            comps = buf["reward_components"][:n]
+            frame = frame.with_columns(
+                pl.Series(f"reward_{name}", comps[:, j].copy()) for j, name in enumerate(self._components)
+            )
+        return frame
+
+    def _write_file(self, frames: list[pl.DataFrame]) -> None:
+        path = self.out_dir / f"{self.prefix}-{os.getpid()}-{len(self.files):05d}.parquet"
+        pl.concat(frames, rechunk=False).write_parquet(
+            path, compression=self.compression, row_group_size=self.chunk_size
+        )
+        self.files.append(path)
+
+    def _write_loop(self) -> None:
+        pending: list[pl.DataFrame] = []
+        pending_rows = 0
+        while True:
+            kind, payload = self._full.get()
+            try:
+                if kind == "chunk":
+                    buf_id, n = payload
+                    try:
+                        if self._error is None:
+                            pending.append(self._to_frame(self._buffers[buf_id], n))
+                            pending_rows += n
+                    finally:
+                        self._free.put(buf_id)
+                    if self._error is None and pending_rows >= self.rows_per_file:
+                        self._write_file(pending)
+                        pending, pending_rows = [], 0
+                elif kind in ("flush", "stop"):
+                    if pending and self._error is None:
+                        self._write_file(pending)
+                    pending, pending_rows = [], 0
+            except BaseException as e:  # surfaced on the next step / flush
+                self._error = e
+            finally:
+                self._full.task_done()
+            if kind == "stop":
+                return
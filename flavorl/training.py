@@ -0,0 +1,507 @@
+import json
+import multiprocessing as mp
+import os
+import time
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Sequence
+
+import numpy as np
+
+import gymnasium as gym
+from gymnasium import spaces
+from stable_baselines3 import A2C, DQN, PPO
+from stable_baselines3.common.base_class import BaseAlgorithm
+from stable_baselines3.common.callbacks import BaseCallback, CallbackList, CheckpointCallback
+from stable_baselines3.common.monitor import Monitor
+from stable_baselines3.common.vec_env import DummyVecEnv, VecEnv
+
+from flavorl.envs.profiling import merge_profiles
+
+ENV_ID = "flavorl/MealRec-v0"
+
+# Supported SB3 algorithms
+ALGOS: dict[str, type[BaseAlgorithm]] = {"ppo": PPO, "a2c": A2C, "dqn": DQN}
+
+# Start methods safe with polars (fork may deadlock on its thread pool)
+START_METHODS = ("spawn", "forkserver")
+
+
+def _n_cores() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count()
+
+
+def make_env(env_id: str = ENV_ID, **env_kwargs: Any) -> gym.Env:
+    """
+    Builds one monitored env (episode returns are reported in info["episode"]).
+    """
+    import flavorl  # noqa: F401 (registers the env ids in spawned workers)
+
+    return Monitor(gym.make(env_id, **env_kwargs))
+
+
+def _worker(remote, parent_remote, env_fns: list[Callable]) -> None:
+    """
+    Worker process: steps a DummyVecEnv of several envs on each command.
+    """
+    parent_remote.close()
+    venv = DummyVecEnv(env_fns)
+    try:
+        while True:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                venv.step_async(data)
+                remote.send(venv.step_wait())
+            elif cmd == "reset":
+                seed, options = data
+                if seed is not None:
+                    venv.seed(seed)
+                if options is not None:
+                    venv.set_options(options)
+                obs = venv.reset()
+                remote.send((obs, venv.reset_infos))
+            elif cmd == "cpu":
+                remote.send(time.process_time())
+            elif cmd == "env_method":
+                name, args, kwargs, indices = data
+                remote.send(venv.env_method(name, *args, indices=indices, **kwargs))
+            elif cmd == "get_attr":
+                name, indices = data
+                remote.send(venv.get_attr(name, indices))
+            elif cmd == "set_attr":
+                name, value, indices = data
+                remote.send(venv.set_attr(name, value, indices))
+            elif cmd == "is_wrapped":
+                wrapper, indices = data
+                remote.send(venv.env_is_wrapped(wrapper, indices))
+            elif cmd == "spaces":
+                remote.send((venv.observation_space, venv.action_space))
+            elif cmd == "close":
+                venv.close()
+                remote.close()
+                break
+            else:
+                raise NotImplementedError(f"Unknown command: {cmd}")
+    except KeyboardInterrupt:
+        pass
+
+
+def _concat_obs(obs: Sequence, space: spaces.Space):
+    if isinstance(space, spaces.Dict):
+        return {k: np.concatenate([o[k] for o in obs]) for k in space.spaces}
+    return np.concatenate(obs)
+
+
+class SubprocGroupVecEnv(VecEnv):
+    """
+    SB3 vector env running `n_procs` worker processes with `envs_per_proc`
+    envs each.
+
+    Unlike SubprocVecEnv (one env per process), every worker steps a
+    DummyVecEnv, so one round-trip per worker moves a whole group of
+    transitions and the process count can match the cores independently of
+    the number of envs. Workers also report their CPU time (see `cpu_times`).
+    """
+
+    def __init__(
+        self,
+        env_fn: Callable[[], gym.Env],
+        n_procs: int,
+        envs_per_proc: int = 1,
+        start_method: str = "spawn",
+    ) -> None:
+        """
+        Starts the workers.
+
+        Args:
+            env_fn (Callable): Picklable env factory (e.g. a partial of make_env).
+            n_procs (int): Number of worker processes.
+            envs_per_proc (int): Envs stepped by each worker.
+            start_method (str): Multiprocessing start method (see START_METHODS).
+        """
+        if start_method not in START_METHODS:
+            raise ValueError(f"Invalid start method: {start_method}")
+
+        self.n_procs: int = n_procs
+        self.envs_per_proc: int = envs_per_proc
+        self.waiting: bool = False
+        self.closed: bool = False
+
+        ctx = mp.get_context(start_method)
+        self.remotes, work_remotes = zip(*[ctx.Pipe() for _ in range(n_procs)])
+        self.processes = []
+        for work_remote, remote in zip(work_remotes, self.remotes):
+            process = ctx.Process(
+                target=_worker, args=(work_remote, remote, [env_fn] * envs_per_proc), daemon=True
+            )
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        self.remotes[0].send(("spaces", None))
+        observation_space, action_space = self.remotes[0].recv()
+        super().__init__(n_procs * envs_per_proc, observation_space, action_space)
+
+    def reset(self):
+        for w, remote in enumerate(self.remotes):
+            first = w * self.envs_per_proc
+            remote.send(("reset", (self._seeds[first], self._options[first])))
+        results = [remote.recv() for remote in self.remotes]
+        obs, infos = zip(*results)
+        self.reset_infos = [info for group in infos for info in group]
+        self._reset_seeds()
+        self._reset_options()
+        return _concat_obs(obs, self.observation_space)
+
+    def step_async(self, actions: np.ndarray) -> None:
+        for remote, group in zip(self.remotes, np.split(np.asarray(actions), self.n_procs)):
+            remote.send(("step", group))
+        self.waiting = True
+
+    def step_wait(self):
+        results = [remote.recv() for remote in self.remotes]
+        self.waiting = False
+        obs, rewards, dones, infos = zip(*results)
+        return (
+            _concat_obs(obs, self.observation_space),
+            np.concatenate(rewards),
+            np.concatenate(dones),
+            [info for group in infos for info in group],
+        )
+
+    def cpu_times(self) -> list[float]:
+        """
+        Returns the CPU time (user + system, s) used so far by each worker.
+        """
+        for remote in self.remotes:
+            remote.send(("cpu", None))
+        return [remote.recv() for remote in self.remotes]
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self.closed = True
+
+    def _groups(self, indices) -> dict[int, list[int]]:
+        """
+        Maps global env indices to {worker: local indices}.
+        """
+        groups: dict[int, list[int]] = {}
+        for i in self._get_indices(indices):
+            groups.setdefault(i // self.envs_per_proc, []).append(i % self.envs_per_proc)
+        return groups
+
+    def _call(self, cmd: str, make_data: Callable, indices) -> list:
+        groups = self._groups(indices)
+        for w, local in groups.items():
+            self.remotes[w].send((cmd, make_data(local)))
+        return [r for w in groups for r in self.remotes[w].recv()]
+
+    def get_attr(self, attr_name: str, indices=None) -> list:
+        return self._call("get_attr", lambda local: (attr_name, local), indices)
+
+    def set_attr(self, attr_name: str, value: Any, indices=None) -> None:
+        groups = self._groups(indices)
+        for w, local in groups.items():
+            self.remotes[w].send(("set_attr", (attr_name, value, local)))
+        for w in groups:
+            self.remotes[w].recv()
+
+    def env_method(self, method_name: str, *method_args, indices=None, **method_kwargs) -> list:
+        return self._call(
+            "env_method", lambda local: (method_name, method_args, method_kwargs, local), indices
+        )
+
+    def env_is_wrapped(self, wrapper_class: type, indices=None) -> list[bool]:
+        return self._call("is_wrapped", lambda local: (wrapper_class, local), indices)
+
+
+class RunMetrics(BaseCallback):
+    """
+    Records wall time, throughput and CPU utilization of every rollout and
+    update phase, one JSON line per training iteration.
+
+    CPU utilization is the CPU time of the trainer plus its workers divided
+    by the wall time and the number of available cores.
+    """
+
+    def __init__(self, path: str | Path, verbose: int = 0) -> None:
+        """
+        Args:
+            path (str | Path): JSON lines output file.
+            verbose (int): Print every iteration if > 0.
+        """
+        super().__init__(verbose)
+        self.path = Path(path)
+        self.n_cores: int = _n_cores()
+        self.records: list[dict] = []
+
+        self._file = None
+        self._record: dict = None
+        self._mark: tuple[float, float, int] = None  # (wall, cpu, timesteps) at the last boundary
+        self._start: tuple[float, float, int] = None
+
+    def _cpu(self) -> float:
+        cpu = time.process_time()
+        if hasattr(self.training_env, "cpu_times"):
+            cpu += sum(self.training_env.cpu_times())
+        return cpu
+
+    def _phase(self) -> dict[str, float]:
+        """
+        Returns the wall time, CPU utilization and steps since the last boundary.
+        """
+        wall, cpu, steps = time.perf_counter(), self._cpu(), self.num_timesteps
+        d_wall, d_cpu = wall - self._mark[0], cpu - self._mark[1]
+        phase = {
+            "s": d_wall,
+            "steps": steps - self._mark[2],
+            "cpu_util": d_cpu / (d_wall * self.n_cores) if d_wall > 0 else 0.0,
+        }
+        self._mark = (wall, cpu, steps)
+        return phase
+
+    def _on_training_start(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a")
+        self._mark = self._start = (time.perf_counter(), self._cpu(), self.num_timesteps)
+
+    def _on_rollout_start(self) -> None:
+        if self._record is not None:
+            self._end_iteration()
+        else:
+            self._phase()  # setup time before the first rollout is not counted
+
+    def _on_step(self) -> bool:
+        return True
+
+    def _on_rollout_end(self) -> None:
+        rollout = self._phase()
+        self._record = {
+            "iteration": len(self.records),
+            "timesteps": self.num_timesteps,
+            "rollout_s": rollout["s"],
+            "rollout_steps_per_s": rollout["steps"] / rollout["s"] if rollout["s"] > 0 else 0.0,
+            "rollout_cpu_util": rollout["cpu_util"],
+        }
+        episodes = self.model.ep_info_buffer
+        if episodes:
+            self._record["ep_rew_mean"] = float(np.mean([ep["r"] for ep in episodes]))
+
+    def _end_iteration(self) -> None:
+        update = self._phase()
+        record = {**self._record, "update_s": update["s"], "update_cpu_util": update["cpu_util"]}
+        self._record = None
+        self.records.append(record)
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        if self.verbose:
+            print(
+                f"[{record['iteration']:>5}] t={record['timesteps']} "
+                f"rollout={record['rollout_s']:.3f}s ({record['rollout_steps_per_s']:.0f} steps/s, "
+                f"cpu {record['rollout_cpu_util']:.0%}) update={record['update_s']:.3f}s "
+                f"(cpu {record['update_cpu_util']:.0%})"
+            )
+
+    def _on_training_end(self) -> None:
+        if self._record is not None:
+            self._end_iteration()
+        self._file.close()
+
+    def summary(self) -> dict[str, float]:
+        """
+        Returns the totals of the run.
+
+        Returns:
+            dict[str, float]: Wall time, timesteps, overall steps/s and CPU
+                utilization, and the total time spent in rollouts and updates.
+        """
+        wall = time.perf_counter() - self._start[0]
+        cpu = self._cpu() - self._start[1]
+        steps = self.num_timesteps - self._start[2]
+        return {
+            "wall_s": wall,
+            "timesteps": steps,
+            "steps_per_s": steps / wall if wall > 0 else 0.0,
+            "cpu_util": cpu / (wall * self.n_cores) if wall > 0 else 0.0,
+            "n_cores": self.n_cores,
+            "rollout_s": sum(r["rollout_s"] for r in self.records),
+            "update_s": sum(r["update_s"] for r in self.records),
+        }
+
+
+def make_vec_env(
+    env_kwargs: dict, n_procs: int, envs_per_proc: int = 1, start_method: str = "spawn", seed: int = None
+) -> SubprocGroupVecEnv:
+    """
+    Builds the training/evaluation vector env over MealRec-v0.
+
+    Args:
+        env_kwargs (dict): MealRec arguments (user_csv, meal_csv, obs_mode, ...).
+        n_procs (int): Worker processes.
+        envs_per_proc (int): Envs per worker.
+        start_method (str): "spawn" or "forkserver".
+        seed (int, optional): Seed of the first env (env i uses seed + i).
+
+    Returns:
+        SubprocGroupVecEnv: Vector env with n_procs * envs_per_proc envs.
+    """
+    venv = SubprocGroupVecEnv(partial(make_env, ENV_ID, **env_kwargs), n_procs, envs_per_proc, start_method)
+    if seed is not None:
+        venv.seed(seed)
+    return venv
+
+
+def train(
+    env_kwargs: dict,
+    out_dir: str | Path,
+    algo: str = "ppo",
+    total_timesteps: int = 100_000,
+    n_procs: int = 1,
+    envs_per_proc: int = 1,
+    start_method: str = "spawn",
+    checkpoint_every: int = 50_000,
+    seed: int = 0,
+    algo_kwargs: dict = None,
+    verbose: int = 1,
+) -> dict:
+    """
+    Trains an SB3 agent on MealRec-v0 across several processes.
+
+    Writes config.json, metrics.jsonl (one record per iteration, see
+    RunMetrics), checkpoints/, model.zip and summary.json to `out_dir`.
+
+    Args:
+        env_kwargs (dict): MealRec arguments (user_csv, meal_csv, obs_mode, ...).
+        out_dir (str | Path): Run directory.
+        algo (str): Algorithm name (see ALGOS). Defaults to "ppo".
+        total_timesteps (int): Training timesteps.
+        n_procs (int): Worker processes.
+        envs_per_proc (int): Envs per worker.
+        start_method (str): "spawn" or "forkserver".
+        checkpoint_every (int): Timesteps between checkpoints (0 disables them).
+        seed (int): Seed of the model and the envs.
+        algo_kwargs (dict, optional): Extra algorithm arguments.
+        verbose (int): Print iteration metrics if > 0.
+
+    Returns:
+        dict: Run summary (see RunMetrics.summary), plus the merged env phase
+            profile when env_kwargs has profile=True.
+    """
+    if algo not in ALGOS:
+        raise ValueError(f"Unknown algorithm: {algo}")
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    config = {
+        "algo": algo,
+        "env_kwargs": env_kwargs,
+        "total_timesteps": total_timesteps,
+        "n_procs": n_procs,
+        "envs_per_proc": envs_per_proc,
+        "start_method": start_method,
+        "seed": seed,
+        "algo_kwargs": algo_kwargs or {},
+    }
+    (out_dir / "config.json").write_text(json.dumps(config, indent=2))
+
+    venv = make_vec_env(env_kwargs, n_procs, envs_per_proc, start_method, seed)
+    try:
+        policy = "MultiInputPolicy" if isinstance(venv.observation_space, spaces.Dict) else "MlpPolicy"
+        model = ALGOS[algo](policy, venv, seed=seed, verbose=0, **(algo_kwargs or {}))
+
+        metrics = RunMetrics(out_dir / "metrics.jsonl", verbose=verbose)
+        callbacks = [metrics]
+        if checkpoint_every:
+            callbacks.append(
+                CheckpointCallback(
+                    save_freq=max(checkpoint_every // venv.num_envs, 1),
+                    save_path=str(out_dir / "checkpoints"),
+                    name_prefix=algo,
+                )
+            )
+        model.learn(total_timesteps, callback=CallbackList(callbacks))
+        model.save(out_dir / "model.zip")
+
+        summary = {**metrics.summary(), "n_envs": venv.num_envs}
+        if env_kwargs.get("profile"):
+            summary["env_profile"] = merge_profiles(venv.env_method("get_profile"))
+    finally:
+        venv.close()
+
+    (out_dir / "summary.json").write_text(json.dumps(summary, indent=2))
+    return summary
+
+
+def evaluate(
+    model_path: str | Path,
+    env_kwargs: dict,
+    algo: str = "ppo",
+    n_episodes: int = 100,
+    n_procs: int = 1,
+    envs_per_proc: int = 1,
+    start_method: str = "spawn",
+    seed: int = 0,
+    deterministic: bool = True,
+) -> dict:
+    """
+    Evaluates a saved SB3 agent on MealRec-v0 across several processes.
+
+    Args:
+        model_path (str | Path): Saved model (.zip).
+        env_kwargs (dict): MealRec arguments.
+        algo (str): Algorithm the model was trained with. Defaults to "ppo".
+        n_episodes (int): Episodes to complete.
+        n_procs (int): Worker processes.
+        envs_per_proc (int): Envs per worker.
+        start_method (str): "spawn" or "forkserver".
+        seed (int): Seed of the envs.
+        deterministic (bool): Whether to take the policy's greedy action.
+
+    Returns:
+        dict: Mean/std episode return, episodes, timesteps, wall time, steps/s
+            and CPU utilization.
+    """
+    if algo not in ALGOS:
+        raise ValueError(f"Unknown algorithm: {algo}")
+
+    venv = make_vec_env(env_kwargs, n_procs, envs_per_proc, start_method, seed)
+    try:
+        model = ALGOS[algo].load(model_path, device="cpu")
+        returns: list[float] = []
+        ep_return = np.zeros(venv.num_envs)
+        steps = 0
+
+        start_wall, start_cpu = time.perf_counter(), time.process_time() + sum(venv.cpu_times())
+        obs = venv.reset()
+        while len(returns) < n_episodes:
+            actions, _ = model.predict(obs, deterministic=deterministic)
+            obs, rewards, dones, _ = venv.step(actions)
+            ep_return += rewards
+            steps += venv.num_envs
+            returns.extend(ep_return[dones].tolist())
+            ep_return[dones] = 0.0
+        wall = time.perf_counter() - start_wall
+        cpu = time.process_time() + sum(venv.cpu_times()) - start_cpu
+    finally:
+        venv.close()
+
+    returns = returns[:n_episodes]
+    return {
+        "mean_return": float(np.mean(returns)),
+        "std_return": float(np.std(returns)),
+        "episodes": len(returns),
+        "timesteps": steps,
+        "wall_s": wall,
+        "steps_per_s": steps / wall,
+        "cpu_util": cpu / (wall * _n_cores()),
+    }